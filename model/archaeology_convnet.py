@@ -27,6 +27,7 @@ sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
 
 from prep.ProgressBar import ProgressBar
 from topoml_util import geom_scaler
+from topoml_util.GeoTensor import GeoTensor
 from topoml_util.slack_send import notify
 
 SCRIPT_VERSION = '2.0.5'
@@ -60,11 +61,12 @@ if not path.exists():
     urlretrieve(TRAIN_DATA_URL, DATA_FOLDER + TRAIN_DATA_FILE)
 
 train_loaded = np.load(DATA_FOLDER + TRAIN_DATA_FILE)
-train_geoms = train_loaded['geoms']
+train_geoms = GeoTensor.from_arrays(train_loaded, 'geoms')
 train_labels = train_loaded['feature_type']
 
 # Determine final test mode or standard
-if len(sys.argv) > 1 and sys.argv[1] in ['-t', '--test']:
+final_test_mode = len(sys.argv) > 1 and sys.argv[1] in ['-t', '--test']
+if final_test_mode:
     print('Training in final test mode')
     path = Path(DATA_FOLDER + TEST_DATA_FILE)
     if not path.exists():
@@ -72,17 +74,28 @@ if len(sys.argv) > 1 and sys.argv[1] in ['-t', '--test']:
         urlretrieve(TEST_DATA_URL, DATA_FOLDER + TEST_DATA_FILE)
 
     test_loaded = np.load(DATA_FOLDER + TEST_DATA_FILE)
-    test_geoms = test_loaded['geoms']
+    test_geoms = GeoTensor.from_arrays(test_loaded, 'geoms')
     test_labels = test_loaded['feature_type']
 else:
     print('Training in standard training mode')
     # Split the training data in random seen/unseen sets
-    train_geoms, test_geoms, train_labels, test_labels = train_test_split(train_geoms, train_labels, test_size=0.1)
-
-# Normalize
-geom_scale = hp['GEOM_SCALE'] or geom_scaler.scale(train_geoms)
-train_geoms = geom_scaler.transform(train_geoms, geom_scale)
-test_geoms = geom_scaler.transform(test_geoms, geom_scale)  # re-use variance from training
+    train_indices, test_indices = train_test_split(np.arange(len(train_geoms)), test_size=0.1)
+    train_geoms, test_geoms = train_geoms[train_indices], train_geoms[test_indices]
+    train_labels, test_labels = train_labels[train_indices], train_labels[test_indices]
+
+# Expand the compact geometries to vectors
+train_geoms, test_geoms = train_geoms.to_geoms(), test_geoms.to_geoms()
+
+# Normalize. In final test mode, the scale is fitted once on the training data file and stored next to it
+if hp['GEOM_SCALE']:
+    scaler = geom_scaler.GeomScaler(hp['GEOM_SCALE'])
+elif final_test_mode:
+    scaler = geom_scaler.GeomScaler.load_or_fit(
+        DATA_FOLDER + TRAIN_DATA_FILE + '.geoms_scaler.npz', train_geoms)
+else:
+    scaler = geom_scaler.GeomScaler().fit(train_geoms)  # without the validation records of this split
+train_geoms = scaler.transform(train_geoms, inplace=True)
+test_geoms = scaler.transform(test_geoms, inplace=True)  # re-use variance from training
 
 # Sort data according to sequence length
 zipped = zip(train_geoms, train_labels)
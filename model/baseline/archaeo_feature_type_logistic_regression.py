@@ -21,6 +21,7 @@ PACKAGE_PARENT = '..'
 SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__))))
 sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
 
+from topoml_util.shape_descriptors import select_descriptors
 from topoml_util.slack_send import notify
 
 SCRIPT_VERSION = '1.0.1'
@@ -35,6 +36,12 @@ TEST_DATA_URL = 'https://dataverse.nl/api/access/datafile/11376'
 EFD_ORDERS = [0, 1, 2, 3, 4, 6, 8, 12, 16, 20, 24]
 SCRIPT_START = time()
 
+# Descriptors to add to the elliptic fourier descriptors, see select_descriptors
+hp = {
+    'CENTROID_DISTANCE_ORDER': int(os.getenv('CENTROID_DISTANCE_ORDER', 0)),  # A positive order adds them
+    'SHAPE_DESCRIPTORS': os.getenv('SHAPE_DESCRIPTORS', ''),  # Comma separated, e.g. 'hu_moments,convexity'
+}
+
 if __name__ == '__main__':  # this is to squelch warnings on scikit-learn multithreaded grid search
     # Load training data
     path = Path(DATA_FOLDER + TRAIN_DATA_FILE)
@@ -43,7 +50,7 @@ if __name__ == '__main__':  # this is to squelch warnings on scikit-learn multit
         urlretrieve(TRAIN_DATA_URL, DATA_FOLDER + TRAIN_DATA_FILE)
 
     train_loaded = np.load(DATA_FOLDER + TRAIN_DATA_FILE)
-    train_fourier_descriptors = train_loaded['elliptic_fourier_descriptors']
+    train_fourier_descriptors, descriptor_columns = select_descriptors(train_loaded, hp, DATA_FOLDER + TRAIN_DATA_FILE)
     train_labels = train_loaded['feature_type']
 
     scaler = StandardScaler().fit(train_fourier_descriptors)
@@ -70,8 +77,8 @@ if __name__ == '__main__':  # this is to squelch warnings on scikit-learn multit
 
     for order in EFD_ORDERS:
         print('Fitting order {} fourier descriptors'.format(order))
-        stop_position = 3 + (order * 8)
-        grid.fit(train_fourier_descriptors[:, :stop_position], train_labels)
+        columns = descriptor_columns(order)
+        grid.fit(train_fourier_descriptors[:, columns], train_labels)
         print("The best parameters for order {} are {} with a score of {}\n".format(
             order, grid.best_params_, grid.best_score_))
         if grid.best_score_ > best_score:
@@ -81,11 +88,11 @@ if __name__ == '__main__':  # this is to squelch warnings on scikit-learn multit
 
     print('Training model on order {} with best parameters {}'.format(
         best_order, best_params))
-    stop_position = 3 + (best_order * 8)
+    columns = descriptor_columns(best_order)
     clf = LogisticRegression(C=best_params['C'])
-    scores = cross_val_score(clf, train_fourier_descriptors[:, :stop_position], train_labels, cv=10, n_jobs=NUM_CPUS)
+    scores = cross_val_score(clf, train_fourier_descriptors[:, columns], train_labels, cv=10, n_jobs=NUM_CPUS)
     print('Cross-validation scores:', scores)
-    clf.fit(train_fourier_descriptors[:, :stop_position], train_labels)
+    clf.fit(train_fourier_descriptors[:, columns], train_labels)
 
     # Run predictions on unseen test data to verify generalization
     path = Path(DATA_FOLDER + TEST_DATA_FILE)
@@ -94,12 +101,12 @@ if __name__ == '__main__':  # this is to squelch warnings on scikit-learn multit
         urlretrieve(TEST_DATA_URL, DATA_FOLDER + TEST_DATA_FILE)
 
     test_loaded = np.load(DATA_FOLDER + TEST_DATA_FILE)
-    test_fourier_descriptors = test_loaded['elliptic_fourier_descriptors']
+    test_fourier_descriptors, _ = select_descriptors(test_loaded, hp, DATA_FOLDER + TEST_DATA_FILE)
     test_labels = np.asarray(test_loaded['feature_type'], dtype=int)
     test_fourier_descriptors = scaler.transform(test_fourier_descriptors)
 
     print('Run on test data...')
-    predictions = clf.predict(test_fourier_descriptors[:, :stop_position])
+    predictions = clf.predict(test_fourier_descriptors[:, columns])
     test_accuracy = accuracy_score(test_labels, predictions)
 
     runtime = time() - SCRIPT_START
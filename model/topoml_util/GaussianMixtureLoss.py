@@ -1,7 +1,7 @@
 from keras import backend as K
 
-from topoml_util.GeoVectorizer import RENDER_LEN, GEOM_TYPE_LEN, ONE_HOT_LEN
-from topoml_util.gaussian_loss import bivariate_gaussian, univariate_gaussian
+from topoml_util.GeoVectorizer import RENDER_LEN
+from topoml_util.gaussian_loss import bivariate_gaussian_nll, univariate_gaussian
 
 
 class GaussianMixtureLoss:
@@ -12,9 +12,13 @@ class GaussianMixtureLoss:
     def geom_gaussian_mixture_loss(self, y_true, y_pred):
         """
         Calculates a loss from a rank 3 sequence, representing a self.num_components * 6 slice (the mixture components)
-        plus one-hot encoded sequences of geometry type (8) and render/stop action type (3)
-        :param y_true: rank 3 of shape(records, points, true_point_features >= 17) truth values tensor
-        :param y_pred: rank 3 of shape(records, points, pred_point_features >= 17) predicted values tensor
+        plus one-hot encoded sequences of geometry type and render/stop action type (3). The geometry type columns are
+        those in between the mixture components and the render/stop action type, and may be absent.
+        The mixture loss is the negative log likelihood from gaussian_loss.bivariate_gaussian_nll per weighted
+        component, see there for its epsilon behaviour.
+        :param y_true: rank 3 of shape(records, points, true_point_features) truth values tensor
+        :param y_pred: rank 3 of shape(records, points, self.num_components * 6 + one-hot features) predicted values
+            tensor
         :return: a summed mixture loss and categorical cross entropy losses for the geometry type and stop bits
         """
         # loss fn based on eq #26 of http://arxiv.org/abs/1308.0850.
@@ -25,28 +29,33 @@ class GaussianMixtureLoss:
         shape = [-1, self.num_points, 1, 2]
         true_coordinates = K.reshape(true_coordinates, tuple(shape))
 
-        y_pred_gmm_components = y_pred[..., :-ONE_HOT_LEN]
+        y_pred_gmm_components = y_pred[..., :self.num_components * 6]
         predicted_components = K.reshape(
             y_pred_gmm_components,
             # (*y_pred.shape[:-1], -1, 6))  # This would be nice
             (-1, self.num_points, self.num_components, 6))
 
         pi_index = 5  # mixture component weight
-        pi_weights = K.softmax(predicted_components[..., pi_index])
-        gmm = bivariate_gaussian(true_coordinates, predicted_components) * pi_weights
-        gmm_loss = K.sum(-K.log(gmm + K.epsilon()))
+        pi_logits = predicted_components[..., pi_index]
+        log_pi_weights = pi_logits - K.logsumexp(pi_logits, axis=-1, keepdims=True)  # log softmax
+        gmm_loss = K.sum(bivariate_gaussian_nll(true_coordinates, predicted_components, log_pi_weights))
 
         render_action = K.softmax(y_true[..., -RENDER_LEN:])
         neg_full_stop_chance = 1 - render_action[..., 2]  # 1 minus the chance of full stop
         gmm_loss = gmm_loss * neg_full_stop_chance
 
-        geom_type_error = K.categorical_crossentropy(
-            K.softmax(y_true[..., -(GEOM_TYPE_LEN + RENDER_LEN - 1):-RENDER_LEN]),
-            K.softmax(y_pred[..., -(GEOM_TYPE_LEN + RENDER_LEN - 1):-RENDER_LEN]))
         render_error = K.categorical_crossentropy(
             K.softmax(y_true[..., -RENDER_LEN:]),
             K.softmax(y_pred[..., -RENDER_LEN:]))
 
+        # The one-hot geometry type columns are in between the components and the render action
+        geom_type_len = K.int_shape(y_pred)[-1] - self.num_components * 6 - RENDER_LEN
+        if geom_type_len == 0:
+            return gmm_loss + render_error
+        geom_type_error = K.categorical_crossentropy(
+            K.softmax(y_true[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN]),
+            K.softmax(y_pred[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN]))
+
         return gmm_loss + geom_type_error + render_error
 
     def univariate_gmm_loss(self, true, pred):
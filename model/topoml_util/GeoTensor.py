@@ -0,0 +1,234 @@
+import numpy as np
+
+from .GeoVectorizer import GeoVectorizer, FULL_STOP_INDEX, GEO_VECTOR_LEN
+
+
+class GeoTensor:
+    """
+    Compact ragged container for a set of vectorized geometries. Instead of a zero-padded (records, points,
+    GEO_VECTOR_LEN) array, it holds one contiguous array of point coordinates, int32 offsets of the first point of
+    every geometry in it and the render/stop/full stop action of every point as a single uint8 code. The one-hot
+    vector representation is only created for the geometries that are requested from it. Multipolygons and dummy
+    records, that GeoVectorizer.vectorize_wkts pads with full stops instead of zeros, are marked as such so that
+    to_padded restores their padding.
+    """
+
+    def __init__(self, coords, actions, offsets, full_stop_padding=None, max_len=None):
+        """
+        :param coords: 2d numpy array of shape (points, 2) with the coordinates of all geometries
+        :param actions: 1d numpy array of length points with the action code per point, see GeoVectorizer.pack_actions
+        :param offsets: 1d numpy array of length records + 1, starting at 0, with the position of the first point of
+            every geometry in coords, followed by the total number of points
+        :param full_stop_padding: optional 1d boolean array marking the geometries padded with full stops
+        :param max_len: optional default size of the second dimension of to_padded, e.g. the max_points the geometries
+            were vectorized with
+        """
+        self.coords = np.asarray(coords)
+        self.actions = np.asarray(actions, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        if full_stop_padding is None:
+            full_stop_padding = np.zeros(len(self.offsets) - 1, dtype=bool)
+        self.full_stop_padding = np.asarray(full_stop_padding, dtype=bool)
+        self.max_len = None if max_len is None else int(max_len)
+
+        if not self.coords.ndim == 2 or not self.coords.shape[1] == 2:
+            raise ValueError('Expected coordinates of shape (points, 2), got {}'.format(self.coords.shape))
+        if not self.offsets[0] == 0 or not len(self.coords) == len(self.actions) == self.offsets[-1]:
+            raise ValueError('The number of coordinates, actions and the offsets do not match')
+        if not len(self.full_stop_padding) == len(self.offsets) - 1:
+            raise ValueError('Expected a full stop padding mask of {} records, got {}'.format(
+                len(self.offsets) - 1, len(self.full_stop_padding)))
+
+    @classmethod
+    def from_lengths(cls, coords, actions, lengths, full_stop_padding=None, max_len=None):
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(coords, actions, offsets, full_stop_padding, max_len)
+
+    @classmethod
+    def from_wkts(cls, wkts, max_points=None, simplify=False, dtype=np.float64):
+        """
+        Vectorize geometries straight into a GeoTensor, without creating a padded array first
+        :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :param max_points: optional maximum number of points per geometry, also the default max_len of to_padded
+        :param simplify: optional, selecting reduction of points if wkt points exceeds max_points
+        :param dtype: optional numpy dtype of the coordinates, e.g. np.float32 or np.float16
+        :return: a GeoTensor instance
+        """
+        coords, actions, lengths, is_multipolygon = GeoVectorizer.vectorize_flat(
+            wkts, max_points, simplify, dtype, return_multipolygons=True)
+        return cls.from_lengths(coords, actions, lengths, is_multipolygon, max_points)
+
+    @classmethod
+    def from_padded(cls, vectors, lengths=None):
+        """
+        Create a GeoTensor from a zero-padded 3d array of vectorized geometries
+        :param vectors: numpy array of shape (records, points, GEO_VECTOR_LEN)
+        :param lengths: optional number of points per geometry. If omitted, a geometry ends one point after its last
+            render point, or after the first point if it has no render points.
+        :return: a GeoTensor instance, with the padded size as max_len
+        """
+        vectors = np.asarray(vectors)
+        if lengths is None:
+            lengths = GeoVectorizer.infer_lengths(vectors)
+
+        mask = np.arange(vectors.shape[1]) < np.asarray(lengths)[:, None]
+        full_stop_padding = np.any((vectors[..., FULL_STOP_INDEX] != 0) & ~mask, axis=1)
+        return cls.from_lengths(*GeoVectorizer.pack_actions(vectors[mask]), lengths, full_stop_padding,
+                                vectors.shape[1])
+
+    @classmethod
+    def from_geoms(cls, geoms):
+        """
+        Create a GeoTensor from a sequence of 2d vectorized geometry matrices of different lengths, such as the 'geoms'
+        entries of numpy archives preprocessed before GeoTensor existed.
+        :param geoms: a list or numpy object array of arrays of shape (points, GEO_VECTOR_LEN)
+        :return: a GeoTensor instance
+        """
+        lengths = [len(geom) for geom in geoms]
+        points = np.concatenate(geoms) if len(geoms) else np.zeros((0, GEO_VECTOR_LEN))
+        return cls.from_lengths(*GeoVectorizer.pack_actions(points), lengths)
+
+    @classmethod
+    def concatenate(cls, tensors):
+        """
+        Join GeoTensors into one, e.g. of geometries vectorized in separate processes
+        :param tensors: a non-empty sequence of GeoTensor instances
+        :return: a GeoTensor instance with the largest max_len of the tensors
+        """
+        max_lens = [tensor.max_len for tensor in tensors if tensor.max_len is not None]
+        return cls.from_lengths(np.concatenate([tensor.coords for tensor in tensors]),
+                                np.concatenate([tensor.actions for tensor in tensors]),
+                                np.concatenate([tensor.lengths for tensor in tensors]),
+                                np.concatenate([tensor.full_stop_padding for tensor in tensors]),
+                                max(max_lens) if max_lens else None)
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=None):
+        """
+        Create a GeoTensor from the arrays of to_arrays, e.g. from a numpy archive with other data. Archives written
+        before GeoTensor existed hold the geometries under the prefix itself, as a zero-padded array or a pickled object
+        array of variable length geometries. Those are read as well, the latter only from archives loaded with
+        allow_pickle=True.
+        :param arrays: a dict-like of arrays, such as the result of np.load
+        :param prefix: optional prefix of the array names, e.g. 'geoms'
+        :return: a GeoTensor instance
+        """
+        if prefix is not None and prefix in arrays:
+            vectors = arrays[prefix]
+            return cls.from_geoms(vectors) if vectors.dtype == object else cls.from_padded(vectors)
+
+        name = cls._array_name
+        max_len = int(arrays[name(prefix, 'max_len')]) if name(prefix, 'max_len') in arrays else None
+        return cls(arrays[name(prefix, 'coords')], arrays[name(prefix, 'actions')], arrays[name(prefix, 'offsets')],
+                   arrays[name(prefix, 'full_stop_padding')], max_len)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        """
+        Retrieves a single geometry as a 2d vector matrix, or a subset of geometries as GeoTensor. Contiguous slices
+        share the coordinate and action buffers with this instance.
+        :param index: integer, slice or array of integer indices or boolean mask
+        :return: a numpy array of shape (points, GEO_VECTOR_LEN) for an integer index, otherwise a GeoTensor
+        """
+        if np.issubdtype(type(index), np.integer):
+            if index < 0:
+                index += len(self)
+            start, stop = self.offsets[index], self.offsets[index + 1]
+            return GeoVectorizer.unpack_actions(self.coords[start:stop], self.actions[start:stop])
+
+        if isinstance(index, slice) and index.step in [None, 1]:
+            start, stop, _ = index.indices(len(self))
+            stop = max(start, stop)
+            offsets = self.offsets[start:stop + 1]
+            first, last = offsets[0], offsets[-1]
+            return GeoTensor(self.coords[first:last], self.actions[first:last], offsets - first,
+                             self.full_stop_padding[start:stop], self.max_len)
+
+        records = np.arange(len(self))[index]
+        lengths = self.lengths[records]
+        points = np.repeat(self.offsets[records] - np.cumsum(lengths) + lengths, lengths)
+        points += np.arange(np.sum(lengths))
+        return GeoTensor.from_lengths(self.coords[points], self.actions[points], lengths,
+                                      self.full_stop_padding[records], self.max_len)
+
+    def to_padded(self, max_len=None, dtype=None):
+        """
+        Expand the geometries to a zero-padded 3d array of one-hot encoded vectors, e.g. for a training batch
+        :param max_len: optional size of the second dimension, defaults to the max_len of this instance or else the
+            longest geometry
+        :param dtype: optional numpy dtype of the output, defaults to the dtype of the coordinates
+        :return: a numpy array of shape (records, max_len, GEO_VECTOR_LEN)
+        """
+        lengths = self.lengths
+        if max_len is None:
+            max_len = self.max_len
+        if max_len is None:
+            max_len = int(np.max(lengths)) if len(lengths) else 0
+        if np.any(lengths > max_len):
+            raise ValueError('Geometries of up to {} points do not fit max_len {}'.format(np.max(lengths), max_len))
+
+        # noinspection PyUnresolvedReferences
+        padded = np.zeros((len(self), max_len, GEO_VECTOR_LEN), dtype=dtype or self.coords.dtype)
+        is_point = np.arange(max_len) < lengths[:, None]
+        padded[is_point] = GeoVectorizer.unpack_actions(self.coords, self.actions, dtype)
+        padded[..., FULL_STOP_INDEX][self.full_stop_padding[:, None] & ~is_point] = 1
+        return padded
+
+    def to_geoms(self):
+        """
+        Expand the geometries to a list of 2d vector matrices of their own length
+        :return: a list of numpy arrays of shape (points, GEO_VECTOR_LEN)
+        """
+        return list(self)
+
+    def to_arrays(self, prefix=None):
+        """
+        The arrays to store in a numpy archive without pickled objects, possibly together with other data:
+
+            np.savez_compressed(file, **tensor.to_arrays('geoms'), labels=labels)
+
+        :param prefix: optional prefix of the array names, to store several GeoTensors in one archive
+        :return: a dict of arrays, see from_arrays
+        """
+        name = self._array_name
+        arrays = {
+            name(prefix, 'coords'): self.coords,
+            name(prefix, 'actions'): self.actions,
+            name(prefix, 'offsets'): self.offsets,
+            name(prefix, 'full_stop_padding'): self.full_stop_padding,
+        }
+        if self.max_len is not None:
+            arrays[name(prefix, 'max_len')] = np.array(self.max_len)
+        return arrays
+
+    def save(self, file):
+        """
+        Save to a compressed numpy archive without pickled objects
+        :param file: file name or file object
+        """
+        np.savez_compressed(file, **self.to_arrays())
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load a GeoTensor saved with GeoTensor.save
+        :param file: file name or file object
+        :return: a GeoTensor instance
+        """
+        with np.load(file, allow_pickle=False) as loaded:
+            return cls.from_arrays(loaded)
+
+    @staticmethod
+    def _array_name(prefix, name):
+        return name if prefix is None else '{}_{}'.format(prefix, name)
@@ -1,8 +1,9 @@
-import re
+import heapq
+import math
 
+import shapely
 from shapely.wkt import loads
 import numpy as np
-import math
 
 # TODO: refactor GEOMETRY_TYPES to use shapely.geometry.base.GEOMETRY_TYPE
 GEOMETRY_TYPES = ["GeometryCollection", "Point", "LineString", "Polygon", "MultiPoint", "MultiLineString",
@@ -15,6 +16,7 @@ ONE_HOT_LEN = 2 + RENDER_LEN  # Length of the one-hot encoded part
 STOP_INDEX = RENDER_INDEX + 1  # Stop index for the first geometry. A second one follows
 FULL_STOP_INDEX = STOP_INDEX + 1  # Full stop index. No more points to follow
 GEO_VECTOR_LEN = FULL_STOP_INDEX + 1  # The length needed to describe the features of a geometry point
+SIMPLIFY_VERSION = 1  # Increment on every change to the output of GeoVectorizer.simplify
 
 action_types = ["render", "stop", "full stop"]
 wkt_start = {
@@ -46,106 +48,587 @@ class GeoVectorizer:
         :param wkt_sets: arbitrary length array of 1d arrays containing well-known-text geometry entries
         :return: scalar integer representing the longest set of points length
         """
-        max_points = 0
+        if not len(wkt_sets) or not len(wkt_sets[0]):
+            return 0
 
-        for wkts in zip(*wkt_sets):
-            number_of_points = sum([GeoVectorizer.num_points_from_wkt(wkt) for wkt in wkts])
-            if number_of_points > max_points:
-                max_points = number_of_points
+        number_of_points = sum([GeoVectorizer.num_points(wkts) for wkts in wkt_sets])
+        return int(np.max(number_of_points))
 
-        return max_points
+    @staticmethod
+    def num_points(wkts):
+        """
+        Counts the number of points (vertices) of every geometry in a 1d array in bulk, from the parsed geometry rather
+        than from its text representation. A point with a z coordinate counts as one point.
+        :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :return: a 1d numpy integer array with the number of points per geometry
+        """
+        shapes = GeoVectorizer.to_shapes(wkts)
+        return shapely.get_num_coordinates(shapes)
 
     @staticmethod
     def num_points_from_wkt(wkt):
-        # A 2D point in WKT is a set of two numerical values, separated by a space:
-        # marked by two decimal values on either side
-        shape = loads(wkt)
-        pattern = '\d \d'
-
-        if shape.has_z:
-            pattern += ' \d'
-
-        number_of_points = len(re.findall(pattern, shape.wkt))
-        return number_of_points
+        """
+        Counts the number of points (vertices) of a single well-known-text geometry
+        :param wkt: the geometry as wkt string
+        :return: the number of points as integer
+        """
+        return int(shapely.get_num_coordinates(loads(wkt)))
 
     @staticmethod
-    def vectorize_wkt(wkt, max_points, simplify=False, fixed_size=False):
+    def vectorize_wkt(wkt, max_points, simplify=False, fixed_size=False, dtype=np.float64):
         """
         Convert wkt geometry to a numpy array of real values. The size of the vector is equal to:
             if fixed_size=False: p where p is the size of the set of points in the geometry;
             is fixed_size=True: max_points, padded with zeros.
-        :param wkt: the geometry as wkt string
+        :param wkt: the geometry as wkt string, wkb bytes, shapely geometry or (n, 2) coordinate array
         :param max_points: the maximum size of the first output dimension: the maximum number of points
-        :param simplify: optional, selecting reduction of points if wkt points exceeds max_points
+        :param simplify: optional, selecting reduction of points if wkt points exceeds max_points. Besides True, this
+            can be a function with the signature of GeoVectorizer.simplify, such as SimplifyCache.simplify
         :param fixed_size: If set to True, the function returns a matrix of size max_points
+        :param dtype: optional numpy dtype of the output, e.g. np.float32 or np.float16
         :return vectors: a 2d numpy array as vectorized representation of the input geometry
         """
-        shape = loads(wkt)
-        total_points = GeoVectorizer.num_points_from_wkt(shape.wkt)  # use the shapely wkt form for consistency
+        shapes = GeoVectorizer._fit_to_max_points(GeoVectorizer.to_shapes([wkt]), max_points, simplify)
+        vectors, lengths = GeoVectorizer.vectorize_wkts(shapes, max_points, dtype=dtype)
 
-        if total_points > max_points:
-            if not simplify:
-                raise ValueError('The number of points in the geometry exceeds the max_points but the reduce_points '
-                                 'parameter was set to False. Please set the reduce_points parameter to True to reduce '
-                                 'the number of points, or increase max_points parameter.')
-            else:
-                shape = GeoVectorizer.recursive_simplify(max_points, shape)
-                total_points = GeoVectorizer.num_points_from_wkt(shape.wkt)
+        # Multipolygons are padded with full stop bits up to max_points
+        if fixed_size or shapes[0].geom_type == 'MultiPolygon':
+            return vectors[0]
+        return vectors[0, :lengths[0]]
 
-        if shape.geom_type == 'Polygon':
-            geom_matrix = GeoVectorizer._vectorize_polygon(shape)
-        elif shape.geom_type == 'MultiPolygon':
-            # noinspection PyUnresolvedReferences
-            geom_matrix = np.concatenate(
-                [GeoVectorizer._vectorize_polygon(geom) for geom in shape.geoms], axis=0)
-            geom_matrix[total_points - 1, STOP_INDEX] = 0
-            # noinspection PyUnresolvedReferences
-            geom_matrix = np.append(geom_matrix, np.zeros((max_points - total_points, GEO_VECTOR_LEN)), axis=0)
-            geom_matrix[total_points - 1:, FULL_STOP_INDEX] = 1  # Manually set full stop bits
-        elif shape.geom_type == 'GeometryCollection':
-            if len(shape.geoms) > 0:  # not GEOMETRYCOLLECTION EMPTY
-                raise ValueError("Don't know how to process non-empty GeometryCollection type")
-            # noinspection PyUnresolvedReferences
-            geom_matrix = np.zeros((1, GEO_VECTOR_LEN))
-            geom_matrix[:, FULL_STOP_INDEX] = 1  # Manually set full stop bits
-        elif shape.geom_type == 'Point':
-            geom_matrix = GeoVectorizer._vectorize_points(shape.coords, is_last=True)
-        else:
-            raise ValueError("Don't know how to get the number of points from geometry type {}".format(shape.geom_type))
+    @staticmethod
+    def vectorize_wkts(wkts, max_points, simplify=False, out=None, errors='raise', dtype=np.float64,
+                       return_dummies=False):
+        """
+        Convert an iterable of wkt geometries to one zero-padded 3d numpy array in a single bulk operation. Each record
+        in the output is equal to the output of vectorize_wkt with fixed_size=True.
+        :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :param max_points: the size of the second output dimension: the maximum number of points per geometry
+        :param simplify: optional, selecting reduction of points if wkt points exceeds max_points. Besides True, this
+            can be a function with the signature of GeoVectorizer.simplify, such as SimplifyCache.simplify
+        :param out: optional preallocated array of shape (len(wkts), max_points, GEO_VECTOR_LEN) to write the vectors
+            to. Any existing content is overwritten.
+        :param errors: optional, 'raise' to raise an exception on the first geometry that cannot be vectorized, or
+            'dummy' to write it as a dummy record with the full stop bit set on all points and a length of 0
+        :param dtype: optional numpy dtype of the output if no out array is given, e.g. np.float32 or np.float16
+        :param return_dummies: optional, set to True to also return a 1d boolean array marking the dummy records. An
+            empty geometry has a length of 0 as well, but is not a dummy.
+        :return vectors, lengths: the 3d numpy array of vectorized geometries and a 1d integer array with the number of
+            points per geometry, followed by the dummy mask if return_dummies is True
+        """
+        shapes, is_dummy = GeoVectorizer._prepare(wkts, max_points, simplify, errors)
+        coords, actions, lengths = GeoVectorizer._flatten(shapes)
+        out = GeoVectorizer._output(out, len(shapes), max_points, dtype)
+        GeoVectorizer._scatter(out, coords, actions, lengths, np.zeros(len(shapes), dtype=int))
+
+        # Multipolygons get their full stop bits set up to max_points
+        is_multipolygon = shapely.get_type_id(shapes) == shapely.GeometryType.MULTIPOLYGON
+        full_stop_padding = is_multipolygon[:, None] & (np.arange(max_points) >= lengths[:, None] - 1)
+        out[..., FULL_STOP_INDEX][full_stop_padding] = 1
+
+        GeoVectorizer._set_dummies(out, lengths, is_dummy)
+        if return_dummies:
+            return out, lengths, is_dummy
+        return out, lengths
 
+    @staticmethod
+    def vectorize_two_wkts(wkt1, wkt2, max_points, fixed_size=False, dtype=np.float64):
+        """
+        Convert two wkt geometries to one numpy array of real values, with the points of the second geometry following
+        the first. The last point of every part of the first geometry has the stop bit set instead of the full stop.
+        :param wkt1: the first geometry as wkt string, wkb bytes, shapely geometry or (n, 2) coordinate array
+        :param wkt2: the second geometry as wkt string, wkb bytes, shapely geometry or (n, 2) coordinate array
+        :param max_points: the maximum summed number of points of both geometries
+        :param fixed_size: If set to True, the function returns a matrix of size max_points
+        :param dtype: optional numpy dtype of the output, e.g. np.float32 or np.float16
+        :return vectors: a 2d numpy array as vectorized representation of the input geometries
+        """
+        vectors, lengths = GeoVectorizer.vectorize_wkt_pairs([wkt1], [wkt2], max_points, dtype=dtype)
         if fixed_size:
-            pad_shape = ((0, max_points - len(geom_matrix)), (0, 0))
-            geom_matrix = np.pad(geom_matrix, pad_shape, mode='constant')
-        return geom_matrix
+            return vectors[0]
+        return vectors[0, :lengths[0]]
+
+    @staticmethod
+    def vectorize_wkt_pairs(wkts1, wkts2, max_points, out=None, errors='raise', dtype=np.float64, return_dummies=False):
+        """
+        Convert two iterables of wkt geometries to one zero-padded 3d numpy array of pairs in a single bulk operation.
+        Each record in the output is equal to the output of vectorize_two_wkts with fixed_size=True.
+        :param wkts1: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :param wkts2: an iterable of the same length of geometries to follow the ones in wkts1
+        :param max_points: the size of the second output dimension: the maximum summed number of points of a pair
+        :param out: optional preallocated array of shape (len(wkts1), max_points, GEO_VECTOR_LEN) to write the vectors
+            to. Any existing content is overwritten.
+        :param errors: optional, 'raise' to raise an exception on the first pair that cannot be vectorized, or 'dummy'
+            to write it as a dummy record with the full stop bit set on all points and a length of 0
+        :param dtype: optional numpy dtype of the output if no out array is given, e.g. np.float32 or np.float16
+        :param return_dummies: optional, set to True to also return a 1d boolean array marking the dummy records
+        :return vectors, lengths: the 3d numpy array of vectorized pairs and a 1d integer array with the summed number
+            of points per pair, followed by the dummy mask if return_dummies is True
+        """
+        shapes1, is_dummy1 = GeoVectorizer._prepare(wkts1, None, False, errors)
+        shapes2, is_dummy2 = GeoVectorizer._prepare(wkts2, None, False, errors)
+        if not len(shapes1) == len(shapes2):
+            raise ValueError('Expected two sets of geometries of equal length, got {} and {}'.format(
+                len(shapes1), len(shapes2)))
+
+        coords1, actions1, lengths1 = GeoVectorizer._flatten(shapes1)
+        coords2, actions2, lengths2 = GeoVectorizer._flatten(shapes2)
+        actions1[actions1 == action_types.index('full stop')] = action_types.index('stop')
+
+        is_dummy = is_dummy1 | is_dummy2
+        exceeds_max_points = lengths1 + lengths2 > max_points
+        if errors == 'raise' and np.any(exceeds_max_points):
+            raise ValueError('The summed number of points of the geometry pair {} exceeds the max_points {}'.format(
+                np.flatnonzero(exceeds_max_points)[0], max_points))
+        is_dummy |= exceeds_max_points
+
+        # Leave out the points of pairs that do not fit
+        fits1 = np.repeat(~exceeds_max_points, lengths1)
+        fits2 = np.repeat(~exceeds_max_points, lengths2)
+        coords1, actions1, coords2, actions2 = coords1[fits1], actions1[fits1], coords2[fits2], actions2[fits2]
+        lengths1[exceeds_max_points], lengths2[exceeds_max_points] = 0, 0
+
+        out = GeoVectorizer._output(out, len(shapes1), max_points, dtype)
+        GeoVectorizer._scatter(out, coords1, actions1, lengths1, np.zeros(len(shapes1), dtype=int))
+        GeoVectorizer._scatter(out, coords2, actions2, lengths2, lengths1)
+
+        lengths = lengths1 + lengths2
+        GeoVectorizer._set_dummies(out, lengths, is_dummy)
+        if return_dummies:
+            return out, lengths, is_dummy
+        return out, lengths
+
+    @staticmethod
+    def vectorize_flat(wkts, max_points=None, simplify=False, dtype=np.float64, return_multipolygons=False):
+        """
+        Convert an iterable of wkt geometries to a ragged representation in a single bulk operation: one contiguous
+        array of point coordinates for all geometries, the action per point and the number of points per geometry.
+        :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :param max_points: optional maximum number of points per geometry
+        :param simplify: optional, selecting reduction of points if wkt points exceeds max_points. Besides True, this
+            can be a function with the signature of GeoVectorizer.simplify, such as SimplifyCache.simplify
+        :param dtype: optional numpy dtype of the coordinates, e.g. np.float32 or np.float16
+        :param return_multipolygons: optional, set to True to also return a 1d boolean array marking the multipolygons,
+            which vectorize_wkts pads with full stops
+        :return coords, actions, lengths: a 2d numpy array of x, y coordinates, a 1d uint8 array of the index of the
+            action per point in action_types and a 1d integer array with the number of points per geometry, followed
+            by the multipolygon mask if return_multipolygons is True
+        """
+        shapes = GeoVectorizer.to_shapes(wkts)
+        if max_points is not None:
+            shapes = GeoVectorizer._fit_to_max_points(shapes, max_points, simplify)
+        coords, actions, lengths = GeoVectorizer._flatten(shapes)
+        if return_multipolygons:
+            is_multipolygon = shapely.get_type_id(shapes) == shapely.GeometryType.MULTIPOLYGON
+            return coords.astype(dtype, copy=False), actions, lengths, is_multipolygon
+        return coords.astype(dtype, copy=False), actions, lengths
 
     @staticmethod
-    def _vectorize_polygon(shape):
-        return GeoVectorizer._vectorize_points(shape.exterior.coords, is_last=True)
+    def pack_actions(vectors, dtype=None):
+        """
+        Compact an array of vectorized points by replacing the one-hot render/stop/full stop columns with a single
+        uint8 code: the index of the action in action_types, or len(action_types) for padding points without action.
+        The action columns may also hold the soft scores of a model prediction: the action is the highest scoring one,
+        and only points with all action columns exactly zero are padding.
+        :param vectors: numpy array of shape (..., GEO_VECTOR_LEN)
+        :param dtype: optional numpy dtype of the coordinates, e.g. np.float32 or np.float16
+        :return coords, actions: a numpy array of shape (..., 2) and a uint8 numpy array of shape (...)
+        """
+        vectors = np.asarray(vectors)
+        scores = vectors[..., RENDER_INDEX:RENDER_INDEX + RENDER_LEN]
+        actions = np.where(np.any(scores != 0, axis=-1), np.argmax(scores, axis=-1), RENDER_LEN).astype(np.uint8)
+        return vectors[..., X_INDEX:Y_INDEX + 1].astype(dtype or vectors.dtype), actions
 
     @staticmethod
-    def _vectorize_points(points, is_last=False):
+    def unpack_actions(coords, actions, dtype=None):
         """
-        Fill an array of vectors out of an array of points from a geometry
-        :param points: the array of input points
-        :param is_last: extra offset for the last point in a geometry, to indicate a full stop.
-        :return matrix: a matrix representation of the points.
+        Expand compacted points from pack_actions to the one-hot vector representation, e.g. at batch time
+        :param coords: numpy array of shape (..., 2)
+        :param actions: uint8 numpy array of shape (...) with the action codes
+        :param dtype: optional numpy dtype of the output, defaults to the dtype of the coordinates
+        :return vectors: numpy array of shape (..., GEO_VECTOR_LEN)
         """
+        coords = np.asarray(coords)
         # noinspection PyUnresolvedReferences
-        matrix = np.zeros((len(points), GEO_VECTOR_LEN))
+        vectors = np.zeros(coords.shape[:-1] + (GEO_VECTOR_LEN,), dtype=dtype or coords.dtype)
+        vectors[..., X_INDEX:Y_INDEX + 1] = coords
+        vectors[..., RENDER_INDEX:RENDER_INDEX + RENDER_LEN] = np.eye(RENDER_LEN + 1, RENDER_LEN)[actions]
+        return vectors
+
+    @staticmethod
+    def _flatten(shapes):
+        """
+        Flatten the points of an array of shapes to one array of coordinates. Every polygon part is vectorized as its
+        exterior ring ending in a full stop, every point as itself and an empty geometry collection as a full stop.
+        :param shapes: a 1d numpy object array of shapely shapes
+        :return coords, actions, lengths: see vectorize_flat
+        """
+        type_ids = shapely.get_type_id(shapes)
+        is_collection = type_ids == shapely.GeometryType.GEOMETRYCOLLECTION
+        is_supported = np.isin(type_ids, [shapely.GeometryType.POINT, shapely.GeometryType.POLYGON,
+                                          shapely.GeometryType.MULTIPOLYGON])
+        if np.any(is_collection & ~shapely.is_empty(shapes)):  # not GEOMETRYCOLLECTION EMPTY
+            raise ValueError("Don't know how to process non-empty GeometryCollection type")
+        if not np.all(is_supported | is_collection):
+            geom_type = shapes[np.flatnonzero(~(is_supported | is_collection))[0]].geom_type
+            raise ValueError("Don't know how to get the number of points from geometry type {}".format(geom_type))
+
+        shapes = np.where(is_collection, shapely.Point(0, 0), shapes)  # encoded as a single full stop point
+        parts, part_records = shapely.get_parts(shapes, return_index=True)
+        is_polygon = shapely.get_type_id(parts) == shapely.GeometryType.POLYGON
+        parts[is_polygon] = shapely.get_exterior_ring(parts[is_polygon])
+        coords, coord_parts = shapely.get_coordinates(parts, return_index=True)
+
+        is_part_end = np.append(coord_parts[1:] != coord_parts[:-1], True)[:len(coords)]
+        actions = np.where(is_part_end, action_types.index('full stop'), action_types.index('render')).astype(np.uint8)
+        lengths = np.bincount(part_records[coord_parts], minlength=len(shapes))
+        return coords, actions, lengths
+
+    @staticmethod
+    def decypher(vectors):
+        """
+        Decode a single vectorized geometry back to well-known-text, see decypher_all
+        :param vectors: a 2d numpy array of shape (points, GEO_VECTOR_LEN)
+        :return: the geometry as wkt string
+        """
+        return GeoVectorizer.decypher_all(np.asarray(vectors)[np.newaxis], as_wkt=True)[0]
+
+    @staticmethod
+    def decypher_all(vectors, as_wkt=False):
+        """
+        Decode a 3d array of vectorized geometries back to shapely geometries in bulk. Rings end at every stop or full
+        stop point, points with all action columns zero are skipped as padding. The action of other points is the
+        highest scoring one, so soft model predictions decode as well. Rings of less than 3 distinct points are
+        dropped, except for a record with a single point only, which decodes to a point. A single point at (0, 0) is the
+        encoding of an empty geometry collection. One ring decodes to a polygon, more rings to a multipolygon and a
+        record without rings to an empty geometry collection.
+        :param vectors: numpy array of shape (records, points, GEO_VECTOR_LEN)
+        :param as_wkt: optional, set to True to return well-known-text strings instead of shapely geometries
+        :return: a 1d numpy object array of shapely geometries or wkt strings
+        """
+        vectors = np.asarray(vectors)
+        coords, actions = GeoVectorizer.pack_actions(vectors)
+        is_point = actions < RENDER_LEN
+        records = np.nonzero(is_point)[0]
+        coords, actions = coords[is_point], actions[is_point]
+
+        # Close a ring at every stop or full stop, and at the last point of a record
+        is_ring_end = (actions > action_types.index('render')) | np.append(records[1:] != records[:-1], True)
+        rings = np.cumsum(is_ring_end) - is_ring_end
+        ring_sizes = np.bincount(rings, minlength=np.sum(is_ring_end))
+        ring_starts = np.cumsum(ring_sizes) - ring_sizes
+        ring_records = records[is_ring_end]
+        is_closed = np.all(coords[ring_starts] == coords[is_ring_end], axis=1)
+        is_polygon = ring_sizes + ~is_closed >= 4
+
+        polygons = shapely.polygons(shapely.linearrings(
+            coords[is_polygon[rings]], indices=np.repeat(np.arange(np.sum(is_polygon)), ring_sizes[is_polygon])))
+        polygon_records = ring_records[is_polygon]
+        polygon_counts = np.bincount(polygon_records, minlength=len(vectors))
+
+        geoms = np.full(len(vectors), shapely.GeometryCollection(), dtype=object)
+        is_single = polygon_counts[polygon_records] == 1
+        geoms[polygon_records[is_single]] = polygons[is_single]
+        is_multi = polygon_counts > 1
+        geoms[is_multi] = shapely.multipolygons(
+            polygons[~is_single], indices=np.searchsorted(np.flatnonzero(is_multi), polygon_records[~is_single]))
+
+        # Records that hold a single point only decode to a point, except for the encoding of an empty geometry
+        point_counts = np.bincount(records, minlength=len(vectors))
+        point_records = np.flatnonzero(point_counts == 1)
+        points = coords[np.searchsorted(records, point_records)]
+        point_records, points = point_records[np.any(points != 0, axis=1)], points[np.any(points != 0, axis=1)]
+        geoms[point_records] = shapely.points(points)
+
+        if as_wkt:
+            return shapely.to_wkt(geoms, rounding_precision=-1)
+        return geoms
+
+    @staticmethod
+    def interpolate(vectors, points_per_ring, lengths=None):
+        """
+        Resample the rings of vectorized geometries to a fixed number of points, equally spaced along the length of
+        each ring. This gives fixed-size geometries without having to simplify them to max_points.
+        :param vectors: a 2d numpy array of a single vectorized geometry or a 3d numpy array of shape (records, points,
+            GEO_VECTOR_LEN)
+        :param points_per_ring: the number of points to resample every ring to, including the closing point
+        :param lengths: optional number of points per geometry, inferred from the vectors if omitted
+        :return: a numpy array of shape (rings * points_per_ring, GEO_VECTOR_LEN) for a single geometry, or of shape
+            (records, max_rings * points_per_ring, GEO_VECTOR_LEN) where the rings of each record follow each other and
+            records with fewer rings are zero-padded
+        """
+        if points_per_ring < 2:
+            raise ValueError('Cannot resample rings to less than 2 points, got {}'.format(points_per_ring))
+
+        vectors = np.asarray(vectors)
+        single = vectors.ndim == 2
+        if single:
+            vectors = vectors[np.newaxis]
+        if lengths is None:
+            lengths = GeoVectorizer.infer_lengths(vectors)
+        lengths = np.asarray(lengths)
+
+        coords, actions = GeoVectorizer.pack_actions(vectors[np.arange(vectors.shape[1]) < lengths[:, None]])
+        records = np.repeat(np.arange(len(vectors)), lengths)
+
+        # A ring ends on a stop or full stop point, or on the last point of a geometry
+        is_ring_end = (actions == action_types.index('stop')) | (actions == action_types.index('full stop'))
+        is_ring_end[np.cumsum(lengths)[lengths > 0] - 1] = True
+        ring_ends = np.flatnonzero(is_ring_end)
+        ring_starts = np.concatenate([[0], ring_ends[:-1] + 1]).astype(int)
+        ring_records = records[ring_ends]
+        rings_per_record = np.bincount(ring_records, minlength=len(vectors))
+        ring_ranks = np.arange(len(ring_ends)) - np.repeat(np.cumsum(rings_per_record) - rings_per_record,
+                                                           rings_per_record)
+
+        # Cumulative arc length over all points, with a unit gap between rings so they are never interpolated across
+        segment_lengths = np.ones(len(coords))
+        segment_lengths[1:] = np.hypot(*np.diff(coords.astype(np.float64), axis=0).T)
+        segment_lengths[ring_starts] = 1.
+        distance = np.cumsum(segment_lengths)
+
+        start, end = distance[ring_starts, np.newaxis], distance[ring_ends, np.newaxis]
+        samples = start + np.linspace(0, 1, points_per_ring) * (end - start)
+        samples[:, -1] = end[:, 0]
+        samples = samples.ravel()
+
+        max_rings = np.max(rings_per_record) if len(rings_per_record) else 0
+        # noinspection PyUnresolvedReferences
+        resampled = np.zeros((len(vectors), max_rings * points_per_ring, GEO_VECTOR_LEN), dtype=vectors.dtype)
+        sample_records = np.repeat(ring_records, points_per_ring)
+        positions = (ring_ranks[:, np.newaxis] * points_per_ring + np.arange(points_per_ring)).ravel()
+        resampled[sample_records, positions, X_INDEX] = np.interp(samples, distance, coords[:, 0])
+        resampled[sample_records, positions, Y_INDEX] = np.interp(samples, distance, coords[:, 1])
+
+        # All points render, except the closing point of each ring that keeps the action of the original ring end
+        sample_actions = np.zeros((len(ring_ends), points_per_ring), dtype=np.uint8)
+        sample_actions[:, -1] = actions[ring_ends]
+        sample_actions = sample_actions.ravel()
+        has_action = sample_actions < RENDER_LEN
+        resampled[sample_records[has_action], positions[has_action], RENDER_INDEX + sample_actions[has_action]] = 1
+
+        return resampled[0] if single else resampled
+
+    @staticmethod
+    def infer_lengths(vectors):
+        """
+        Infer the number of points of zero-padded vectorized geometries: a geometry ends one point after its last
+        render point, or after the first point if it has no render points.
+        :param vectors: numpy array of shape (records, points, GEO_VECTOR_LEN)
+        :return: a 1d integer array with the number of points per geometry
+        """
+        actions = GeoVectorizer.pack_actions(vectors)[1]
+        render = actions == action_types.index('render')
+        last_render = actions.shape[1] - 1 - np.argmax(render[:, ::-1], axis=1)
+        has_action = actions[:, 0] < RENDER_LEN
+        lengths = np.where(np.any(render, axis=1), last_render + 2, has_action.astype(int))
+        return np.minimum(lengths, actions.shape[1])
+
+    @staticmethod
+    def _prepare(wkts, max_points, simplify, errors):
+        """
+        Parse and simplify an iterable of geometries for vectorization
+        :param wkts: an iterable of geometry entries, see to_shapes
+        :param max_points: the maximum number of points per geometry, or None
+        :param simplify: selecting reduction of points if the geometry points exceed max_points
+        :param errors: 'raise' to raise an exception on the first geometry that cannot be vectorized, or 'dummy' to
+            replace it with an empty geometry and mark it as dummy
+        :return shapes, is_dummy: a 1d numpy object array of shapely shapes and a 1d boolean array marking dummies
+        """
+        if errors not in ['raise', 'dummy']:
+            raise ValueError("Expected errors to be either 'raise' or 'dummy', got {}".format(errors))
+
+        shapes = GeoVectorizer.to_shapes(wkts, on_invalid='raise' if errors == 'raise' else 'ignore')
+        is_dummy = np.zeros(len(shapes), dtype=bool)
+        if errors == 'dummy':
+            type_ids = shapely.get_type_id(shapes)
+            is_dummy = ~(np.isin(type_ids, [shapely.GeometryType.POINT, shapely.GeometryType.POLYGON,
+                                            shapely.GeometryType.MULTIPOLYGON]) | shapely.is_empty(shapes))
+            if max_points is not None and not simplify:
+                is_dummy |= shapely.get_num_coordinates(shapes) > max_points
+            shapes[is_dummy] = shapely.GeometryCollection()
+
+        if max_points is not None:
+            shapes = GeoVectorizer._fit_to_max_points(shapes, max_points, simplify)
+        return shapes, is_dummy
+
+    @staticmethod
+    def _output(out, records, max_points, dtype):
+        if out is None:
+            # noinspection PyUnresolvedReferences
+            return np.zeros((records, max_points, GEO_VECTOR_LEN), dtype=dtype)
+
+        if out.shape != (records, max_points, GEO_VECTOR_LEN):
+            raise ValueError('Expected an output array of shape {}, got {}'.format(
+                (records, max_points, GEO_VECTOR_LEN), out.shape))
+        out[...] = 0
+        return out
+
+    @staticmethod
+    def _scatter(out, coords, actions, lengths, first_positions):
+        """
+        Write flattened points into a 3d output array of vectors
+        :param out: numpy array of shape (records, max_points, GEO_VECTOR_LEN)
+        :param coords: 2d numpy array of x, y coordinates of all points
+        :param actions: 1d numpy array of action codes of all points
+        :param lengths: 1d integer array with the number of points per record
+        :param first_positions: 1d integer array with the position in out of the first point per record
+        """
+        records = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.arange(len(coords)) - np.repeat(np.cumsum(lengths) - lengths - first_positions, lengths)
+        out[records, positions, X_INDEX] = coords[:, 0]
+        out[records, positions, Y_INDEX] = coords[:, 1]
+        out[records, positions, RENDER_INDEX + actions] = 1
+
+    @staticmethod
+    def _set_dummies(out, lengths, is_dummy):
+        out[is_dummy] = 0
+        out[is_dummy, :, FULL_STOP_INDEX] = 1
+        lengths[is_dummy] = 0
+
+    @staticmethod
+    def to_shapes(wkts, on_invalid='raise'):
+        """
+        Parse an iterable of geometries in bulk, so that every geometry is parsed exactly once. Entries can be
+        well-known-text strings, well-known-binary bytes, shapely geometries (kept as-is) or coordinate arrays of shape
+        (n, 2) or (n, 3). Coordinate arrays are read as a point if n is 1 and as a polygon exterior otherwise.
+        :param wkts: an iterable of geometry entries
+        :param on_invalid: optional, 'raise' to raise an exception on unreadable text or binary entries or 'ignore' to
+            return None for them
+        :return shapes: a 1d numpy object array of shapely shapes
+        """
+        wkts = list(wkts)
+        shapes = np.empty(len(wkts), dtype=object)
+        for index, wkt in enumerate(wkts):  # element-wise, to keep numpy from broadcasting coordinate arrays
+            shapes[index] = wkt
+
+        is_text = np.array([isinstance(shape, str) for shape in shapes], dtype=bool)
+        is_binary = np.array([isinstance(shape, (bytes, bytearray)) for shape in shapes], dtype=bool)
+        is_coords = np.array([isinstance(shape, (np.ndarray, list, tuple)) for shape in shapes], dtype=bool)
+        shapes[is_text] = shapely.from_wkt(shapes[is_text].astype(str), on_invalid=on_invalid)
+        shapes[is_binary] = shapely.from_wkb(shapes[is_binary], on_invalid=on_invalid)
+
+        if np.any(is_coords):
+            coords = [np.asarray(shape, dtype=float) for shape in shapes[is_coords]]
+            sizes = np.array([len(shape) for shape in coords])
+            flat_coords = np.concatenate(coords)
+            geoms = np.empty(len(coords), dtype=object)
+            geoms[sizes == 1] = shapely.points(flat_coords[np.repeat(sizes == 1, sizes)])
+            is_ring = sizes > 1
+            rings = shapely.linearrings(flat_coords[np.repeat(is_ring, sizes)],
+                                        indices=np.repeat(np.arange(np.sum(is_ring)), sizes[is_ring]))
+            geoms[is_ring] = shapely.polygons(rings)
+            shapes[is_coords] = geoms
+
+        return shapes
+
+    @staticmethod
+    def _fit_to_max_points(shapes, max_points, simplify):
+        """
+        Simplify the geometries in an array of shapes that exceed max_points. Interior rings are not vectorized, so
+        they are dropped first and only the exterior rings are simplified if they still exceed max_points.
+        :param shapes: a 1d numpy object array of shapely shapes, simplified shapes are replaced in place
+        :param max_points: the maximum number of points per geometry
+        :param simplify: selecting reduction of points if the geometry points exceed max_points, either True to use
+            GeoVectorizer.simplify or a function with the same signature, such as SimplifyCache.simplify
+        :return shapes: the array of shapes
+        """
+        simplifier = simplify if callable(simplify) else GeoVectorizer.simplify
+        num_points = shapely.get_num_coordinates(shapes)
+        for index in np.flatnonzero(num_points > max_points):
+            if not simplify:
+                raise ValueError('The number of points in the geometry exceeds the max_points but the reduce_points '
+                                 'parameter was set to False. Please set the reduce_points parameter to True to reduce '
+                                 'the number of points, or increase max_points parameter.')
+            shape = GeoVectorizer._exteriors(shapes[index])
+            shapes[index] = shape if shapely.get_num_coordinates(shape) <= max_points else simplifier(max_points, shape)
+        return shapes
+
+    @staticmethod
+    def _exteriors(shape):
+        """
+        :param shape: a shapely shape
+        :return: the shape without interior rings if it is a (multi)polygon, otherwise the shape itself
+        """
+        if shape.geom_type == 'Polygon':
+            return shapely.Polygon(shape.exterior)
+        if shape.geom_type == 'MultiPolygon':
+            return shapely.MultiPolygon([shapely.Polygon(polygon.exterior) for polygon in shape.geoms])
+        return shape
+
+    @staticmethod
+    def simplify(max_points, shape):
+        """
+        Reduce the number of points of a (multi)polygon to exactly max_points in a single pass, by repeatedly removing
+        the point with the smallest effective triangle area over all rings (Visvalingam-Whyatt). If the geometry has
+        more rings than max_points allows at 4 points per ring, interior rings and then the smallest parts are dropped.
+        Other geometry types are simplified using recursive_simplify.
+        :param max_points: the number of points of the simplified shape
+        :param shape: A shapely shape
+        :return: the simplified shapely shape
+        """
+        if shapely.get_num_coordinates(shape) <= max_points:
+            return shape
+        if shape.geom_type not in ['Polygon', 'MultiPolygon']:
+            return GeoVectorizer.recursive_simplify(max_points, shape)
+        if max_points < 4:
+            raise ValueError('Unable to simplify a polygon to less than 4 points, got max_points {}'.format(max_points))
+
+        polygons = list(shape.geoms) if shape.geom_type == 'MultiPolygon' else [shape]
+
+        # Keep as many rings as fit in max_points: exteriors before interiors, largest area first
+        rings = []  # tuples of (polygon index, is interior, ring)
+        for polygon_index, polygon in enumerate(polygons):
+            rings.append((polygon_index, False, polygon.exterior))
+            rings.extend([(polygon_index, True, interior) for interior in polygon.interiors])
+        rings = sorted(rings, key=lambda ring: (ring[1], -shapely.Polygon(ring[2]).area))[:max_points // 4]
+        rings = sorted(rings, key=lambda ring: (ring[0], ring[1]))  # restore the original order
+
+        # Rings are cyclic sequences of their unique points, without the closing point
+        ring_coords = [np.asarray(ring.coords)[:-1] for _, _, ring in rings]
+        sizes = np.array([len(coords) for coords in ring_coords])
+        coords = np.concatenate(ring_coords)
+        ring_indices = np.repeat(np.arange(len(rings)), sizes)
+        starts = np.cumsum(sizes) - sizes
+        local = np.arange(len(coords)) - starts[ring_indices]
+        prevs = (starts[ring_indices] + (local - 1) % sizes[ring_indices]).tolist()
+        nexts = (starts[ring_indices] + (local + 1) % sizes[ring_indices]).tolist()
+        xs, ys = coords[:, X_INDEX].tolist(), coords[:, Y_INDEX].tolist()
+
+        def effective_area(i):
+            p, n = prevs[i], nexts[i]
+            return abs((xs[p] - xs[i]) * (ys[n] - ys[i]) - (xs[n] - xs[i]) * (ys[p] - ys[i])) / 2
+
+        areas = [effective_area(i) for i in range(len(coords))]
+        heap = [(area, i) for i, area in enumerate(areas)]
+        heapq.heapify(heap)
+        removed = np.zeros(len(coords), dtype=bool)
+        remaining = sizes.tolist()
+        to_remove = len(coords) + len(rings) - max_points  # every ring has an additional closing point
+
+        while to_remove > 0:
+            area, i = heapq.heappop(heap)
+            ring_index = ring_indices[i]
+            if removed[i] or area != areas[i] or remaining[ring_index] <= 3:
+                continue  # outdated heap entry or ring at its minimum size
 
-        for point_index, point in enumerate(points):
-            matrix[point_index, X_INDEX] = point[0]
-            matrix[point_index, Y_INDEX] = point[1]
+            removed[i] = True
+            remaining[ring_index] -= 1
+            to_remove -= 1
+            nexts[prevs[i]] = nexts[i]
+            prevs[nexts[i]] = prevs[i]
+            for neighbour in [prevs[i], nexts[i]]:
+                areas[neighbour] = effective_area(neighbour)
+                heapq.heappush(heap, (areas[neighbour], neighbour))
 
-            if point_index == len(points) - 1:
-                if is_last:
-                    matrix[point_index, FULL_STOP_INDEX] = True
-                else:
-                    matrix[point_index, STOP_INDEX] = True
-            else:
-                matrix[point_index, RENDER_INDEX] = True
+        simplified = [[] for _ in polygons]
+        for (polygon_index, _, _), start, size in zip(rings, starts, sizes):
+            kept = coords[start:start + size][~removed[start:start + size]]
+            simplified[polygon_index].append(np.append(kept, kept[:1], axis=0))
 
-        return matrix
+        polygons = [shapely.Polygon(polygon_rings[0], polygon_rings[1:])
+                    for polygon_rings in simplified if polygon_rings]
+        return shapely.MultiPolygon(polygons) if shape.geom_type == 'MultiPolygon' else polygons[0]
 
     @staticmethod
     def recursive_simplify(max_points, shape):
@@ -158,7 +641,7 @@ class GeoVectorizer:
         log_tolerance = -10  # Log scale
         tolerance = math.pow(10, log_tolerance)
         shape = shape.simplify(tolerance)
-        while len(re.findall('\d \d', shape.wkt)) > max_points:
+        while shapely.get_num_coordinates(shape) > max_points:
             log_tolerance += 0.5
             tolerance = math.pow(10, log_tolerance)
             shape = shape.simplify(tolerance)
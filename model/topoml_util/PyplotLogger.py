@@ -68,11 +68,14 @@ class DecypherAll(Callback):
                 pp.pprint(prediction_vectors)
 
             if self.save_plots:
-                input_polys = [GeoVectorizer.decypher(poly) for poly in input_vectors]
+                input_polys = list(GeoVectorizer.decypher_all(input_vectors, as_wkt=True))
                 target_polys = [GeoVectorizer.decypher(target_vectors[0])]
+
+                # Plot the mean of the most likely mixture component for every predicted point
+                components = np.reshape(prediction_vectors[0][..., :self.gmm_size * 6], (-1, self.gmm_size, 6))
+                most_likely = np.argmax(components[..., 5], axis=-1)
                 prediction_points = [
-                    Point(point).wkt for point in
-                    GeoVectorizer(gmm_size=self.gmm_size).decypher_gmm_geom(prediction_vectors[0], 500)
+                    Point(point).wkt for point in components[np.arange(len(components)), most_likely, :2]
                 ]
 
                 geoms = input_polys, target_polys, prediction_points
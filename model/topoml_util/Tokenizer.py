@@ -14,6 +14,75 @@ class Tokenize(Tokenizer):
                          char_level=True)
         self.fit_on_texts(texts)
 
+    def fit_on_texts(self, texts):
+        super().fit_on_texts(texts)
+        # The lookup tables are derived from the word index on first use
+        self._lookup_table = None
+        self._inverse_table = None
+
+    @property
+    def lookup_table(self):
+        """
+        :return: a numpy array of the word index by character code point, 0 for characters without index. If the
+            tokenizer lowercases, characters without index of their own get the index of their lowercase character,
+            like texts_to_sequences on keras versions that lowercase char level texts.
+        """
+        if self._lookup_table is None:
+            chars = [char for char in self.word_index if len(char) == 1]
+            code_points = np.array([ord(char) for char in chars], dtype=np.int64)
+            table = np.zeros(max(256, np.max(code_points, initial=0) + 1),
+                             dtype=np.min_scalar_type(max(self.word_index.values(), default=0)))
+            table[code_points] = [self.word_index[char] for char in chars]
+            if self.lower:
+                lowered = [ord(char.lower()) if len(char.lower()) == 1 else ord(char)
+                           for char in map(chr, range(len(table)))]
+                lowered = np.where(np.array(lowered) < len(table), lowered, np.arange(len(table)))
+                table = np.where(table == 0, table[lowered], table)
+            self._lookup_table = table
+        return self._lookup_table
+
+    @property
+    def inverse_table(self):
+        """
+        :return: a numpy array of the character code point by word index, a space for indices without a character
+        """
+        if self._inverse_table is None:
+            table = np.full(max(self.word_index.values(), default=0) + 1, ord(' '), dtype=np.uint32)
+            for char, index in self.word_index.items():
+                if len(char) == 1:
+                    table[index] = ord(char)
+            self._inverse_table = table
+        return self._inverse_table
+
+    @staticmethod
+    def code_points(texts):
+        """
+        Converts texts to one flat array of character code points, one byte per character for latin-1 texts
+        :param texts: a list of strings or sequences of characters
+        :return code_points, lengths: a 1d numpy array of the concatenated code points and the number of characters per
+            text
+        """
+        texts = [text if isinstance(text, str) else ''.join(text) for text in texts]
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        joined = ''.join(texts)
+        try:
+            return np.frombuffer(joined.encode('latin-1'), dtype=np.uint8), lengths
+        except UnicodeEncodeError:
+            return np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32), lengths
+
+    def lookup(self, code_points):
+        """
+        :param code_points: a numpy array of character code points
+        :return: a numpy array of the word index per code point, 0 for characters without index
+        """
+        table = self.lookup_table
+        if code_points.dtype == np.uint8:
+            return table[code_points]
+        indices = np.zeros(code_points.shape, dtype=table.dtype)
+        in_table = code_points < len(table)
+        indices[in_table] = table[code_points[in_table]]
+        return indices
+
     @staticmethod
     def truncate(max_len, untruncated_training_set, untruncated_target_set):
         """
@@ -24,15 +93,10 @@ class Tokenize(Tokenizer):
         :param untruncated_target_set: untruncated list of target output sequences
         :return: training_set, target_set: a tuple of truncated training and target sets
         """
-        training_set = []
-        target_set = []
-
-        # Restrict input to be of less or equal length as the maximum length.
-        for index, record in enumerate(untruncated_training_set):
-            if len(record) <= max_len:
-                training_set.append(record)
-                target_set.append(untruncated_target_set[index])
-
+        lengths = [len(record) for record in untruncated_training_set]
+        selected = np.flatnonzero(Tokenize.truncate_mask(lengths, max_len)).tolist()
+        training_set = [untruncated_training_set[index] for index in selected]
+        target_set = [untruncated_target_set[index] for index in selected]
         return training_set, target_set
 
     @staticmethod
@@ -47,26 +111,58 @@ class Tokenize(Tokenizer):
         :param untruncated_target_set: untruncated list of target output sequences
         :return: training_set, target_set: a tuple of truncated training and target sets
         """
-        training_set = []
-        target_set = []
+        lengths = [len(record) for record in untruncated_training_set]
+        selected = np.flatnonzero(Tokenize.batch_truncate_mask(lengths, batch_size, max_len, validation_split))
+        training_set = [untruncated_training_set[index] for index in selected.tolist()]
+        target_set = [untruncated_target_set[index] for index in selected.tolist()]
+        return training_set, target_set
+
+    @staticmethod
+    def truncate_mask(lengths, max_len):
+        """
+        :param lengths: the number of characters per sequence, for flat sequences np.diff(offsets)
+        :param max_len: maximum length of characters per sequence/sentence
+        :return: a boolean numpy array of the sequences of at most max_len characters
+        """
+        return np.asarray(lengths) <= max_len
 
+    @staticmethod
+    def batch_truncate_mask(lengths, batch_size, max_len, validation_split):
+        """
+        Like truncate_mask, additionally truncating the selection to fit the batch and validation set size
+        :param lengths: the number of characters per sequence, for flat sequences np.diff(offsets)
+        :param batch_size: size of the epoch batch size
+        :param max_len: maximum length of characters per sequence/sentence
+        :param validation_split: ratio of the training/validation split
+        :return: a boolean numpy array of the selected sequences
+        """
         # Restrict input to be of less or equal length as the maximum length.
-        for index, record in enumerate(untruncated_training_set):
-            if len(record) <= max_len:
-                training_set.append(record)
-                target_set.append(untruncated_target_set[index])
+        mask = Tokenize.truncate_mask(lengths, max_len)
+        selected = np.flatnonzero(mask)
 
         # Truncate the array to the batch size, accounting for the validation set
         # The validation sample size must be a multiple of the batch size
         # Say the truncated length is 27,000 and the split ratio is 0.1, the validation sample size is 2700
-        validation_size = int(len(training_set) * validation_split)
+        validation_size = int(len(selected) * validation_split)
         # We need to get it down to 2000
         validation_size = validation_size - validation_size % batch_size
         # The truncated length must be a multiple of the validation sample size
-        truncated_size = len(training_set) - len(training_set) % int(validation_size / validation_split)
-        training_set = training_set[0:truncated_size]
-        target_set = target_set[0:truncated_size]
-        return training_set, target_set
+        truncated_size = len(selected) - len(selected) % int(validation_size / validation_split)
+        mask[selected[truncated_size:]] = False
+        return mask
+
+    @staticmethod
+    def select(sequences, offsets, mask):
+        """
+        Select sequences from flat sequences, for instance with a truncate_mask
+        :param sequences: a 1d numpy array of concatenated sequences
+        :param offsets: a numpy array of the start of every sequence, followed by the end of the last
+        :param mask: a boolean numpy array of the sequences to select
+        :return sequences, offsets: the selected flat sequences and their offsets
+        """
+        lengths = np.diff(offsets)
+        selected_lengths = lengths[mask]
+        return sequences[np.repeat(mask, lengths)], np.concatenate([[0], np.cumsum(selected_lengths)])
 
     @staticmethod
     def max_sample(predictions):
@@ -77,32 +173,88 @@ class Tokenize(Tokenizer):
         sequences = self.texts_to_sequences(texts)
         return sequences
 
+    def flat_tokenize(self, texts):
+        """
+        Bulk alternative to char_level_tokenize that encodes all texts through the lookup table at once, into one flat
+        array instead of a list of lists. Characters without word index are skipped, as in char_level_tokenize.
+        :param texts: a list, numpy array or pandas series of strings
+        :return sequences, offsets: a 1d numpy array of the concatenated word indices, uint8 for word indices up to 255,
+            and a numpy array of the start of every sequence, followed by the end of the last, so that sequence i is
+            sequences[offsets[i]:offsets[i + 1]]
+        """
+        code_points, lengths = Tokenize.code_points(texts)
+        indices = self.lookup(code_points)
+        known = indices > 0
+        if not np.all(known):
+            # Count the remaining characters per text, reduceat does not handle empty texts
+            non_empty = lengths > 0
+            starts = np.cumsum(lengths) - lengths
+            lengths = np.zeros(len(lengths), dtype=np.int64)
+            if np.any(non_empty):
+                lengths[non_empty] = np.add.reduceat(known, starts[non_empty], dtype=np.int64)
+            indices = indices[known]
+        return indices, np.concatenate([[0], np.cumsum(lengths)])
+
     def decypher(self, sequences):
         """
-        Decyphers a encoded 3D array of one-hot vectors back to a 2D array of sentences
-        :param sequences:
-        :return:
-        """
-        # sampled = [Tokenize.max_sample(token) for token in prediction]
-        # sequence.append(sampled)
-        inv_cipher = {v: k for k, v in self.word_index.items()}
-        decyphered = []
-        for sequence in sequences:
-            decyphered_sequence = []
-            for num in sequence:
-                if num in inv_cipher:
-                    decyphered_sequence.append(inv_cipher[num])
-                else:
-                    decyphered_sequence.append(' ')
-            decyphered.append(''.join([char for char in decyphered_sequence]))
-        return decyphered
+        Decyphers a 2D array or list of sequences of word indices back to a list of sentences
+        :param sequences: a 2D numpy array or list of sequences of word indices
+        :return: a list of strings, with a space for every index without a character
+        """
+        if isinstance(sequences, np.ndarray) and sequences.ndim == 2:
+            lengths = np.full(len(sequences), sequences.shape[1])
+            indices = sequences.ravel()
+        else:
+            lengths = [len(sequence) for sequence in sequences]
+            indices = np.concatenate([np.asarray(sequence).ravel() for sequence in sequences] + [np.zeros(0)])
+
+        table = self.inverse_table
+        in_table = (indices >= 0) & (indices < len(table)) & (indices == np.round(indices))
+        code_points = np.full(len(indices), ord(' '), dtype=np.uint32)
+        code_points[in_table] = table[indices[in_table].astype(np.int64)]
+
+        text = code_points.tobytes().decode('utf-32-le')
+        ends = np.cumsum(lengths, dtype=np.int64)
+        return [text[end - length:end] for end, length in zip(ends.tolist(), lengths)]
 
     def one_hot(self, input_sequences, maxlen):
+        """
+        One-hot encodes sentences into a 3D boolean array
+        :param input_sequences: a list of strings or sequences of characters, of at most maxlen characters
+        :param maxlen: the length of the second axis of the array
+        :return: a boolean numpy array of shape (len(input_sequences), maxlen, len(word_index) + 1)
+        """
         # The third dimension of the matrix is equal to the length of the word index plus one:
         # There is no '0' index in the word index.
-        x = np.zeros((len(input_sequences), maxlen, len(self.word_index) + 1), dtype=np.bool)
-        for i, sentence in enumerate(input_sequences):
-            for t, char in enumerate(sentence):
-                x[i, t, self.word_index[char]] = True
+        indices, lengths = self.index_sequences(input_sequences)
+        x = np.zeros((len(lengths), maxlen, len(self.word_index) + 1), dtype=bool)
+        x[np.repeat(np.arange(len(lengths)), lengths), Tokenize._positions(lengths), indices] = True
+        return x
+
+    def one_hot_indices(self, input_sequences, maxlen):
+        """
+        Compact alternative to one_hot, with the word index of every character instead of its one-hot vector
+        :param input_sequences: a list of strings or sequences of characters, of at most maxlen characters
+        :param maxlen: the length of the second axis of the array
+        :return: an integer numpy array of shape (len(input_sequences), maxlen), padded with 0
+        """
+        indices, lengths = self.index_sequences(input_sequences)
+        x = np.zeros((len(lengths), maxlen), dtype=np.min_scalar_type(len(self.word_index)))
+        x[np.repeat(np.arange(len(lengths)), lengths), Tokenize._positions(lengths)] = indices
         return x
 
+    def index_sequences(self, input_sequences):
+        """
+        :param input_sequences: a list of strings or sequences of characters
+        :return indices, lengths: a 1d numpy array of the concatenated word indices and the number of characters per
+            sequence
+        """
+        code_points, lengths = Tokenize.code_points(input_sequences)
+        indices = self.lookup(code_points)
+        if not np.all(indices):
+            raise KeyError(chr(code_points[np.argmin(indices)]))
+        return indices, lengths
+
+    @staticmethod
+    def _positions(lengths):
+        return np.arange(np.sum(lengths)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
@@ -0,0 +1,112 @@
+import numpy as np
+import shapely
+
+from .GeoTensor import GeoTensor
+from .GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN
+from .geom_fourier_descriptors import create_geom_fourier_descriptor, geom_fourier_descriptors
+from .parallel import parallel_map
+
+
+class RecordFeaturizer:
+    """
+    Creates all geometry features of the preprocessed data sets from one parse per record: the fixed size geometry
+    vector, the variable length geometry vector and the elliptic fourier descriptors of the largest polygon.
+    """
+
+    def __init__(self, fixed_points, sane_points, efd_order, simplify=True, efd_samples=None):
+        """
+        :param fixed_points: the number of points of the fixed size geometry vectors
+        :param sane_points: the maximum number of points of the variable length geometry vectors
+        :param efd_order: the elliptic fourier descriptor order
+        :param simplify: optional, True or a simplify function such as SimplifyCache.simplify
+        :param efd_samples: optional power of two number of points to resample the boundaries to for approximate
+            elliptic fourier descriptors, see fft_efd_coefficients
+        """
+        self.fixed_points = fixed_points
+        self.sane_points = sane_points
+        self.efd_order = efd_order
+        self.simplify = simplify
+        self.efd_samples = efd_samples
+
+    @property
+    def efd_len(self):
+        return 3 + self.efd_order * 8
+
+    def featurize(self, wkt):
+        """
+        Create the features of a single geometry
+        :param wkt: the geometry as wkt string, wkb bytes, shapely geometry or (n, 2) coordinate array
+        :return geom, fixed_size_geom, efds, simplified: the variable length geometry vector, the fixed size geometry
+            vector, the elliptic fourier descriptors and whether the geometry was simplified to sane_points
+        """
+        geom, fixed_size_geom, largest, simplified = self._featurize_geometry(wkt)
+        efds = create_geom_fourier_descriptor(largest, self.efd_order, self.efd_samples)
+        return geom, fixed_size_geom.to_padded()[0], efds, simplified
+
+    def _featurize_geometry(self, wkt):
+        shape = GeoVectorizer.to_shapes([wkt])[0]
+        if shape is None or shape.geom_type not in ['Polygon', 'MultiPolygon']:
+            raise ValueError('no (multi)polygon entry')
+
+        # Compacted in the worker already, so the padding is not sent back to the main process
+        fixed_size_geom = GeoTensor.from_padded(*GeoVectorizer.vectorize_wkts([shape], self.fixed_points,
+                                                                              simplify=self.simplify))
+        geom_len = min(shapely.get_num_coordinates(shape), self.sane_points)
+        geom = GeoVectorizer.vectorize_wkt(shape, geom_len, simplify=self.simplify)
+
+        # If multipart multipolygon: select the largest, but it will throw off the accuracy a bit.
+        parts = shapely.get_parts(shape)
+        areas = shapely.area(parts)
+        largest = parts[len(parts) - 1 - np.argmax(areas[::-1])]
+        return geom, fixed_size_geom, largest, geom_len == self.sane_points
+
+    def featurize_all(self, wkts, workers=None, progress=None):
+        """
+        Create the features of a set of geometries in parallel into columnar buffers. The elliptic fourier descriptors
+        are computed afterwards in one batch.
+        :param wkts: a sized iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+        :param workers: optional number of processes, see parallel_map
+        :param progress: optional progress callback, see parallel_map
+        :return columns, errors: a dict of the columns 'geoms' (a GeoTensor of variable length geometry vectors),
+            'fixed_size_geoms' (a GeoTensor with fixed_points as max_len), 'elliptic_fourier_descriptors', 'simplified'
+            and 'valid', a boolean mask of the records that were featurized without errors, and a list of
+            (index, exception) tuples of the other records. Records that could not be vectorized are empty.
+        """
+        results, errors = parallel_map(self._featurize_geometry, wkts, workers=workers, progress=progress)
+
+        columns = {
+            'elliptic_fourier_descriptors': np.zeros((len(results), self.efd_len)),
+            'simplified': np.zeros(len(results), dtype=bool),
+            'valid': np.zeros(len(results), dtype=bool),
+        }
+        empty_geom = np.zeros((0, GEO_VECTOR_LEN))
+        empty_fixed_size_geom = GeoTensor.from_geoms([empty_geom])
+        geoms = [empty_geom] * len(results)
+        fixed_size_geoms = [empty_fixed_size_geom] * len(results)
+        largest = np.empty(len(results), dtype=object)
+        for index, result in enumerate(results):
+            if result is None:
+                continue
+            geoms[index], fixed_size_geoms[index], largest[index], columns['simplified'][index] = result
+            columns['valid'][index] = True
+        columns['geoms'] = GeoTensor.from_geoms(geoms)
+        columns['fixed_size_geoms'] = GeoTensor.concatenate(fixed_size_geoms) if fixed_size_geoms else \
+            GeoTensor.from_geoms([])
+        columns['fixed_size_geoms'].max_len = self.fixed_points  # also for an empty or all invalid set of records
+
+        valid = np.flatnonzero(columns['valid'])
+        try:
+            columns['elliptic_fourier_descriptors'][valid] = geom_fourier_descriptors(
+                largest[valid], self.efd_order, samples=self.efd_samples)
+        except (ValueError, FloatingPointError):
+            # A degenerate polygon fails the whole batch, so find it and the other failing records one by one
+            for index in valid.tolist():
+                try:
+                    columns['elliptic_fourier_descriptors'][index] = create_geom_fourier_descriptor(
+                        largest[index], self.efd_order, self.efd_samples)
+                except (ValueError, FloatingPointError) as e:
+                    columns['valid'][index] = False
+                    errors.append((index, e))
+            errors.sort(key=lambda error: error[0])
+
+        return columns, errors
@@ -3,16 +3,30 @@ from keras import backend as K
 from keras.backend import epsilon
 from keras.losses import mse, categorical_crossentropy
 
-from .GeoVectorizer import GEOM_TYPE_INDEX, RENDER_INDEX
+from .GeoVectorizer import RENDER_LEN
+
+GAUSSIAN_PARAMS_LEN = 5  # mu1, mu2, sigma1, sigma2, rho
 
 
 def geom_gaussian_loss(y_true, y_pred):
+    """
+    Loss of a rank 3 sequence of a single bivariate gaussian (5) per point, plus one-hot encoded sequences of geometry
+    type and render/stop action type (3). The geometry type columns are those in between the gaussian and the
+    render/stop action type, and may be absent.
+    The gaussian loss is the negative log likelihood from bivariate_gaussian_nll.
+    :param y_true: rank 3 of shape(records, points, true_point_features) truth values tensor
+    :param y_pred: rank 3 of shape(records, points, 5 + one-hot features) predicted values tensor
+    :return: the summed gaussian loss and categorical cross entropy losses for the geometry type and stop bits
+    """
     # loss fn based on eq #26 of http://arxiv.org/abs/1308.0850.
     gaussian_loss = bivariate_gaussian_loss(y_true, y_pred)
-    geom_type_error = categorical_crossentropy(K.softmax(y_true[..., GEOM_TYPE_INDEX:RENDER_INDEX]),
-                                               K.softmax(y_pred[..., GEOM_TYPE_INDEX:RENDER_INDEX]))
-    render_error = categorical_crossentropy(K.softmax(y_true[..., RENDER_INDEX:]),
-                                            K.softmax(y_pred[..., RENDER_INDEX:]))
+    render_error = categorical_crossentropy(K.softmax(y_true[..., -RENDER_LEN:]),
+                                            K.softmax(y_pred[..., -RENDER_LEN:]))
+    geom_type_len = K.int_shape(y_pred)[-1] - GAUSSIAN_PARAMS_LEN - RENDER_LEN
+    if geom_type_len == 0:
+        return gaussian_loss + render_error
+    geom_type_error = categorical_crossentropy(K.softmax(y_true[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN]),
+                                               K.softmax(y_pred[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN]))
     return gaussian_loss + geom_type_error + render_error
 
 
@@ -53,6 +67,27 @@ def bivariate_gaussian(true, pred):
     return pdf
 
 
+def bivariate_gaussian_nll(true, pred, log_weight=0.):
+    """
+    Fused negative log likelihood of bivariate_gaussian, computed in log space without the intermediate pdf.
+    It keeps the epsilons of the former -log(pdf * weight + epsilon): the log of sigma = exp(abs(x)) + epsilon is taken
+    as abs(x) + log(1 + epsilon * exp(-abs(x))), which does not overflow, and the result is clamped at -log(epsilon).
+    The loss of a point far off the gaussian therefore still saturates there, with a vanishing gradient.
+    Rho is fixed at 0 in bivariate_gaussian, so the correlation terms drop out.
+    :param true: truth values with at least [mu1, mu2]
+    :param pred: values predicted with at least [mu1, mu2, sigma1, sigma2, rho]
+    :param log_weight: optional log of the mixture component weight of the gaussian, applied before the clamp
+    :return: negative log of the (weighted) probability density function
+    """
+    log_sigma_x = K.abs(pred[..., 2]) + K.log(1 + epsilon() * K.exp(-K.abs(pred[..., 2])))
+    log_sigma_y = K.abs(pred[..., 3]) + K.log(1 + epsilon() * K.exp(-K.abs(pred[..., 3])))
+    norm1 = K.log(1 + K.abs(true[..., 0] - pred[..., 0])) * K.exp(-log_sigma_x)  # normalized by sigma_x
+    norm2 = K.log(1 + K.abs(true[..., 1] - pred[..., 1])) * K.exp(-log_sigma_y)  # normalized by sigma_y
+    # eq 25 of http://arxiv.org/abs/1308.0850 over 2, plus the log of the denominator of bivariate_gaussian
+    nll = 0.5 * (K.square(norm1) + K.square(norm2)) + log_sigma_x + log_sigma_y + np.log(2 * np.pi) - log_weight
+    return K.minimum(nll, -np.log(epsilon()))
+
+
 # Adapted to Keras from https://github.com/tensorflow/magenta/blob/master/magenta/models/sketch_rnn/model.py#L268
 # Adapted version of the probability density function of
 # https://en.wikipedia.org/wiki/Multivariate_normal_distribution#Bivariate_case
@@ -63,10 +98,9 @@ def bivariate_gaussian_loss(true, pred):
     Returns results of eq # 24 of http://arxiv.org/abs/1308.0850
     :param true: truth values with at least [mu1, mu2]
     :param pred: values predicted with at least [mu1, mu2, sigma1, sigma2, rho]
-    :return: the log of the summed max likelihood
+    :return: the summed negative log likelihood
     """
-    pdf = bivariate_gaussian(true, pred)
-    return K.sum(-K.log(pdf + epsilon()))  # → -∞ if pdf → ∞
+    return K.sum(bivariate_gaussian_nll(true, pred))
 
 
 def univariate_gaussian(true, pred):
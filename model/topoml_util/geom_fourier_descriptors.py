@@ -1,45 +1,337 @@
+from functools import partial
+
 import numpy as np
-from pyefd import elliptic_fourier_descriptors
+import shapely
+
+from .GeoVectorizer import FULL_STOP_INDEX, STOP_INDEX
 
 np.seterr(all='raise')
 
+CHUNK_SIZE = 2 ** 16  # The number of contour points to compute the harmonics of at once
+FFT_SAMPLES = 2 ** 14  # The default number of points to resample contours to for approximate descriptors
+CENTROID_DISTANCE_SAMPLES = 2 ** 7  # The default number of centroid distances per contour
+
+
+def geom_fourier_descriptors(shapes, order, out=None, samples=None):
+    """
+    Creates a matrix of different variations of fourier descriptors: normalized, non-normalized, in one pass over the
+    exterior rings of the first polygon of all shapes
+    :param shapes: a list or array of shapely (multi)polygons
+    :param order: the fourier descriptor order
+    :param out: optional preallocated array of shape (len(shapes), 3 + 8 * order) to write the descriptors to
+    :param samples: optional power of two number of points to resample the boundaries to, to approximate the
+        coefficients with a fast fourier transform instead, see fft_efd_coefficients
+    :return: a 2d array with per shape its area, boundary length, number of boundary points and per harmonic the four
+        non-normalized coefficients followed by the four normalized coefficients
+    """
+    shapes = np.asarray(shapes, dtype=object)
+    if out is None:
+        out = np.empty((len(shapes), 3 + 8 * order))
+    elif not out.shape == (len(shapes), 3 + 8 * order):
+        raise ValueError('Expected an output array of shape {}, got {}'.format((len(shapes), 3 + 8 * order),
+                                                                                out.shape))
+
+    # The first ring of a (multi)polygon boundary is the exterior ring of its first polygon
+    boundaries = shapely.get_exterior_ring(shapely.get_geometry(shapes, 0))
+    lengths = shapely.get_num_coordinates(boundaries)
+    out[:, 0] = shapely.area(shapes)
+    out[:, 1] = shapely.length(boundaries)
+    out[:, 2] = lengths
+
+    coeffs = out[:, 3:].reshape(len(shapes), order, 2, 4)
+    coeffs[:, :, 0] = _efd_coefficients(shapely.get_coordinates(boundaries), lengths, order,
+                                        samples=_check_samples(samples, order))
+    coeffs[:, :, 1] = normalize_efd_coefficients(coeffs[:, :, 0])
+    return out
+
 
-def geom_fourier_descriptors(shapes, order):
+def create_geom_fourier_descriptor(shape, order, samples=None):
+    return geom_fourier_descriptors([shape], order, samples=samples)[0]
+
+
+def efd_coefficients(contours, order, chunk_size=CHUNK_SIZE):
     """
-    Creates a stacked array of different variations of fourier descriptors: normalized, non-normalized
-    :param shapes: a list of shapely shapes
-    :param order: the fourier descriptor order (the size of the returned array along the 0-axis)
-    :return: a 2d array with shape ((order * 2) + 3, 4)
+    Computes the elliptic fourier descriptors of many contours at once, equal to those of
+    pyefd.elliptic_fourier_descriptors with normalize=False
+    :param contours: a list of (n, 2) coordinate arrays
+    :param order: the fourier descriptor order
+    :param chunk_size: optional number of contour points to compute the harmonics of at once, to bound memory
+    :return: a 3d array of shape (len(contours), order, 4)
     """
-    fourier_descriptors = []
-    for index, shape in enumerate(shapes):
-        coeffs = create_geom_fourier_descriptor(shape, order)
-        fourier_descriptors.append(coeffs)
+    lengths = np.array([len(contour) for contour in contours], dtype=int)
+    flat = np.concatenate(list(contours)) if len(contours) else np.zeros((0, 2))
+    return _efd_coefficients(np.asarray(flat, dtype=float), lengths, order, chunk_size)
+
 
-    return fourier_descriptors
+def fft_efd_coefficients(contours, order, samples=FFT_SAMPLES, chunk_size=CHUNK_SIZE):
+    """
+    Approximates the elliptic fourier descriptors of many contours at once with a batched fast fourier transform of
+    the contours resampled to a number of points equally spaced along their length. For contours with many more points
+    than samples / order this is much faster than efd_coefficients, contours with fewer points are computed exactly.
+    The resampling is exact, so the only error is aliasing of the harmonics above samples / 2. For a contour of length
+    T, the error of every coefficient of x is at most V * T / (3 * samples ** 2), where V is the summed absolute change
+    in dx / dt over the corners of the contour, and likewise for y. V is at most twice the number of points, so for
+    3000 points and the default 2 ** 14 samples the error is below 1e-5 * T, which for jagged contours is in the order
+    of 1e-5 relative to the first harmonic. normalize_efd_coefficients divides by the first harmonic and rotates every
+    harmonic by multiples of its phase, which amplifies this error, most for nearly circular contours.
+    :param contours: a list of (n, 2) coordinate arrays
+    :param order: the fourier descriptor order, less than samples / 2
+    :param samples: optional power of two number of points to resample every contour to
+    :param chunk_size: optional number of contour points and samples to compute at once, to bound memory
+    :return: a 3d array of shape (len(contours), order, 4)
+    """
+    lengths = np.array([len(contour) for contour in contours], dtype=int)
+    flat = np.concatenate(list(contours)) if len(contours) else np.zeros((0, 2))
+    return _efd_coefficients(np.asarray(flat, dtype=float), lengths, order, chunk_size, _check_samples(samples, order))
 
 
-def create_geom_fourier_descriptor(shape, order):
-    boundary = shape.boundary
-    while boundary.geom_type == "MultiLineString":
-        boundary = boundary.geoms[0]
-    # Set normalize to false to retain size information.
-    non_normalized_coeffs = elliptic_fourier_descriptors(
-        boundary.coords, order=order, normalize=False)
-    # normalized Fouriers
-    normalized_coeffs = elliptic_fourier_descriptors(
-        boundary.coords, order=order, normalize=True)
+def _check_samples(samples, order):
+    if samples is not None and (samples & (samples - 1) or not order < samples // 2):
+        raise ValueError('Expected a power of two number of samples over twice the order {}, got {}'.format(
+            order, samples))
+    return samples
 
-    # TODO: create centroid distance fourier descriptors
-    # See https://doi-org.vu-nl.idm.oclc.org/10.1016/j.image.2009.04.001
-    # coords = np.array(boundary.coords)
-    # centroid_distances = [boundary.centroid.distance(Point(point)) for point in coords]
-    # centroid_fourier_descriptors = elliptic_fourier_descriptors(centroid_distances, normalize=True)
 
-    # Stack 'em all
-    coeffs = [shape.area, boundary.length, len(boundary.coords)]
-    for nn, n in zip(non_normalized_coeffs, normalized_coeffs):
-        coeffs = np.append(coeffs, nn)  # without axis this will just create an array
-        coeffs = np.append(coeffs, n)
+def _efd_coefficients(flat, lengths, order, chunk_size=CHUNK_SIZE, samples=None):
+    coeffs = np.empty((len(lengths), order, 4))
+    if samples is not None and np.any(lengths * order < samples):
+        # The exact coefficients of small contours are faster to compute than their resampled transform
+        exact = lengths * order < samples
+        exact_points = np.repeat(exact, lengths)
+        coeffs[exact] = _efd_coefficients(flat[exact_points], lengths[exact], order, chunk_size)
+        coeffs[~exact] = _efd_coefficients(flat[~exact_points], lengths[~exact], order, chunk_size, samples)
+        return coeffs
 
+    if samples is None:
+        return _chunked(partial(_efd_chunk, order=order), flat, lengths, (order, 4), chunk_size)
+    return _chunked(partial(_fft_efd_chunk, order=order, samples=samples), flat, lengths, (order, 4), chunk_size,
+                    samples)
+
+
+def _chunked(chunk_function, flat, lengths, shape, chunk_size, samples=0):
+    """
+    Apply a function to consecutive chunks of contours
+    :param chunk_function: function of the concatenated points and the lengths of a chunk of contours
+    :param flat: the concatenated points of the contours
+    :param lengths: the number of points per contour
+    :param shape: the shape of the result per contour
+    :param chunk_size: the number of contour points, plus samples per contour, in a chunk
+    :param samples: optional number of points every contour is resampled to, to count towards the chunk size
+    :return: numpy array of the results per contour
+    """
+    result = np.empty((len(lengths),) + shape)
+    ends = np.cumsum(lengths + samples)
+    point_ends = np.cumsum(lengths)
+    start = 0
+    while start < len(lengths):
+        # At least one contour per chunk, however long
+        stop = max(int(np.searchsorted(ends, ends[start] - lengths[start] - samples + chunk_size, side='right')),
+                   start + 1)
+        first, last = point_ends[start] - lengths[start], point_ends[stop - 1]
+        with np.errstate(all='raise'):
+            result[start:stop] = chunk_function(flat[first:last], lengths[start:stop])
+        start = stop
+    return result
+
+
+def _arc_lengths(flat, lengths):
+    """
+    :param flat: the concatenated points of the contours
+    :param lengths: the number of points per contour
+    :return starts, dxy, dt, non_zero, t_ends, T: the index of the first point of every contour, the segments from
+        every point to the next, closing the contour from its last point to its first, their lengths, a mask of the
+        segments that are not zero-length, the arc length at the end of every segment and the total length of every
+        contour
+    """
+    starts = np.cumsum(lengths) - lengths
+    point_indices = np.arange(len(flat)) - np.repeat(starts, lengths)
+
+    next_points = np.arange(1, len(flat) + 1)
+    next_points[starts + lengths - 1] = starts
+    dxy = flat[next_points] - flat
+    dt = np.sqrt((dxy ** 2).sum(axis=1))
+    non_zero = dt > np.finfo(dt.dtype).eps  # Zero-length segments are skipped, as in pyefd
+    dt[~non_zero] = 0
+
+    # Summed per contour in a padded matrix to keep the summation order
+    contour_indices = np.repeat(np.arange(len(lengths)), lengths)
+    padded = np.zeros((len(lengths), np.max(lengths, initial=0)))
+    padded[contour_indices, point_indices] = dt
+    t_ends = np.cumsum(padded, axis=1)
+    T = t_ends[:, -1] if t_ends.size else np.zeros(len(lengths))
+    if np.any(T <= 0):
+        raise ValueError('Contour {} does not contain a non-zero-length segment'.format(np.argmax(T <= 0)))
+    return starts, dxy, dt, non_zero, t_ends[contour_indices, point_indices], T
+
+
+def _efd_chunk(flat, lengths, order):
+    starts, dxy, dt, non_zero, t_ends, T = _arc_lengths(flat, lengths)
+
+    orders = np.arange(1, order + 1)
+    phi = (2 * np.pi * t_ends / np.repeat(T, lengths))[:, None] * orders
+    cos_ends, sin_ends = np.cos(phi), np.sin(phi)
+    # The harmonics at the start of each segment are those at the end of the previous one, or at phi 0 for the first
+    cos_starts, sin_starts = np.roll(cos_ends, 1, axis=0), np.roll(sin_ends, 1, axis=0)
+    cos_starts[starts], sin_starts[starts] = 1, 0
+
+    derivatives = np.zeros(dxy.shape)
+    np.divide(dxy, dt[:, None], out=derivatives, where=non_zero[:, None])
+    coeffs = np.empty((len(lengths), order, 4))
+    d_cos_phi, d_sin_phi = cos_ends - cos_starts, sin_ends - sin_starts
+    for index, (derivative, d_phi) in enumerate([(0, d_cos_phi), (0, d_sin_phi), (1, d_cos_phi), (1, d_sin_phi)]):
+        coeffs[..., index] = np.add.reduceat(derivatives[:, derivative, None] * d_phi, starts, axis=0)
+
+    consts = T[:, None] / (2 * orders * orders * np.pi * np.pi)
+    coeffs *= consts[..., None]
+    return coeffs
+
+
+def _fft_efd_chunk(flat, lengths, order, samples):
+    starts, _, dt, _, t_ends, T = _arc_lengths(flat, lengths)
+    resampled = _resample(flat, lengths, samples, starts, dt, t_ends, T)
+
+    # The n-th complex fourier coefficient c_n = (a_n - i * b_n) / 2 for x and c_n = (c_n - i * d_n) / 2 for y
+    harmonics = np.fft.rfft(resampled, axis=1)[:, 1:order + 1] * (2 / samples)
+    coeffs = np.empty((len(lengths), order, 4))
+    coeffs[..., 0], coeffs[..., 1] = harmonics[..., 0].real, -harmonics[..., 0].imag
+    coeffs[..., 2], coeffs[..., 3] = harmonics[..., 1].real, -harmonics[..., 1].imag
     return coeffs
+
+
+def _resample(flat, lengths, samples, starts, dt, t_ends, T):
+    """
+    Resample contours to a number of points equally spaced along their length, starting at their first point
+    :return: a 3d array of shape (len(lengths), samples, 2)
+    """
+    # Lay out the contours, closed by their first point, one after another on a single arc length axis
+    offsets = np.cumsum(T + 1) - (T + 1)
+    closing = np.cumsum(lengths) + np.arange(len(lengths))
+    is_point = np.ones(len(flat) + len(lengths), dtype=bool)
+    is_point[closing] = False
+    distance = np.empty(len(is_point))
+    distance[is_point] = t_ends - dt + np.repeat(offsets, lengths)
+    distance[closing] = offsets + T
+    coords = np.empty((len(is_point), 2))
+    coords[is_point] = flat
+    coords[closing] = flat[starts]
+
+    positions = (offsets[:, None] + T[:, None] * (np.arange(samples) / samples)).ravel()
+    return np.stack([np.interp(positions, distance, coords[:, 0]),
+                     np.interp(positions, distance, coords[:, 1])], axis=1).reshape(len(lengths), samples, 2)
+
+
+def centroid_distance_descriptors(contours, order, samples=CENTROID_DISTANCE_SAMPLES, chunk_size=CHUNK_SIZE):
+    """
+    Computes centroid distance fourier descriptors of many contours at once: the magnitudes of the first harmonics of
+    the distances from the centroid of the contour to its points, resampled equally spaced along its length, divided by
+    the summed distance. These are invariant to translation, rotation, scale and starting point.
+    See https://doi.org/10.1016/j.image.2009.04.001
+    :param contours: a list of (n, 2) coordinate arrays
+    :param order: the number of harmonics, less than samples / 2
+    :param samples: optional power of two number of distances per contour
+    :param chunk_size: optional number of contour points and samples to compute at once, to bound memory
+    :return: a 2d array of shape (len(contours), order)
+    """
+    lengths = np.array([len(contour) for contour in contours], dtype=int)
+    flat = np.concatenate(list(contours)) if len(contours) else np.zeros((0, 2))
+    return _chunked(partial(_centroid_distance_chunk, order=order, samples=_check_samples(samples, order)),
+                    np.asarray(flat, dtype=float), lengths, (order,), chunk_size, samples)
+
+
+def geom_centroid_distance_descriptors(vectors, order, samples=CENTROID_DISTANCE_SAMPLES, chunk_size=CHUNK_SIZE):
+    """
+    Computes centroid distance fourier descriptors of the first ring of vectorized geometries, see
+    centroid_distance_descriptors
+    :param vectors: the vectorized geometries as padded 3d array or ragged (object) array of 2d matrices
+    :param order: the number of harmonics, less than samples / 2
+    :param samples: optional power of two number of distances per contour
+    :param chunk_size: optional number of contour points and samples to compute at once, to bound memory
+    :return: a 2d array of shape (len(vectors), order)
+    """
+    flat, lengths = first_rings(vectors)
+    return _chunked(partial(_centroid_distance_chunk, order=order, samples=_check_samples(samples, order)),
+                    flat, lengths, (order,), chunk_size, samples)
+
+
+def first_rings(vectors):
+    """
+    :param vectors: the vectorized geometries as padded 3d array or ragged (object) array of 2d matrices
+    :return flat, lengths: the concatenated coordinates of the first ring of every geometry, up to and including the
+        first stop or full stop point, and the number of points per ring
+    """
+    if isinstance(vectors, np.ndarray) and not vectors.dtype == object:
+        lengths = np.full(len(vectors), vectors.shape[1])
+        flat = vectors.reshape(-1, vectors.shape[-1])
+    else:
+        lengths = np.array([len(data_point) for data_point in vectors], dtype=int)
+        flat = np.concatenate(list(vectors))
+
+    starts = np.cumsum(lengths) - lengths
+    point_indices = np.arange(len(flat)) - np.repeat(starts, lengths)
+    ring_ends = np.where((flat[:, STOP_INDEX] == 1) | (flat[:, FULL_STOP_INDEX] == 1), point_indices, len(flat))
+    ring_lengths = np.minimum.reduceat(ring_ends, starts) + 1 if np.all(lengths > 0) else lengths + 1
+    if np.any(ring_lengths > lengths):
+        raise ValueError('Vectorized geometry {} does not contain a stop or full stop point'.format(
+            np.argmax(ring_lengths > lengths)))
+    in_first_ring = point_indices < np.repeat(ring_lengths, lengths)
+    return flat[in_first_ring, :2].astype(float), ring_lengths
+
+
+def _centroid_distance_chunk(flat, lengths, order, samples):
+    starts, dxy, dt, _, t_ends, T = _arc_lengths(flat, lengths)
+    resampled = _resample(flat, lengths, samples, starts, dt, t_ends, T)
+
+    # The centroid of the contour line, the length weighted mean of the segment midpoints
+    centroids = np.add.reduceat((flat + dxy / 2) * dt[:, None], starts, axis=0) / T[:, None]
+    distances = np.hypot(*(resampled - centroids[:, None]).transpose(2, 0, 1))
+    harmonics = np.abs(np.fft.rfft(distances, axis=1))
+    return harmonics[:, 1:order + 1] / harmonics[:, :1]
+
+
+def normalize_efd_coefficients(coeffs):
+    """
+    Normalizes elliptic fourier descriptors for rotation, phase, orientation and size, equal to pyefd.normalize_efd
+    applied to every set of coefficients
+    :param coeffs: a 3d array of shape (n, order, 4) of non-normalized coefficients
+    :return: a 3d array of shape (n, order, 4) of normalized coefficients
+    """
+    with np.errstate(all='raise'):
+        return _normalize_efd_coefficients(coeffs)
+
+
+def _normalize_efd_coefficients(coeffs):
+    a, b, c, d = coeffs[:, 0, 0], coeffs[:, 0, 1], coeffs[:, 0, 2], coeffs[:, 0, 3]
+
+    # Rotate the harmonics by a multiple of the phase shift from the first major axis
+    theta_1 = 0.5 * np.arctan2(2 * ((a * b) + (c * d)), ((a ** 2) - (b ** 2) + (c ** 2) - (d ** 2)))
+    angles = np.arange(1, coeffs.shape[1] + 1) * theta_1[:, None]
+    cos, sin = np.cos(angles), np.sin(angles)
+    theta_rotations = np.stack([np.stack([cos, -sin], axis=-1), np.stack([sin, cos], axis=-1)], axis=-2)
+    coeffs = np.matmul(coeffs.reshape(coeffs.shape[:2] + (2, 2)), theta_rotations).reshape(coeffs.shape)
+
+    # Rotate the semi-major axis parallel to the x-axis, with the starting point in the first quadrant
+    psi_1 = np.arctan2(coeffs[:, 0, 2], coeffs[:, 0, 0])
+    psi_1[psi_1 < 0] += np.pi
+    psi_rotations = np.stack([np.stack([np.cos(psi_1), np.sin(psi_1)], axis=-1),
+                              np.stack([-np.sin(psi_1), np.cos(psi_1)], axis=-1)], axis=-2)
+    coeffs = np.matmul(psi_rotations[:, None], coeffs.reshape(coeffs.shape[:2] + (2, 2))).reshape(coeffs.shape)
+
+    # Ensure a counter-clockwise orientation
+    clockwise = (coeffs[:, 0, 0] * coeffs[:, 0, 3] - coeffs[:, 0, 1] * coeffs[:, 0, 2]) < 0
+    coeffs[clockwise, :, 1] *= -1
+    coeffs[clockwise, :, 3] *= -1
+
+    coeffs /= np.abs(coeffs[:, 0, 0])[:, None, None]
+    return coeffs
+
+
+def descriptor_columns(descriptors, efd_order, additional_columns=0):
+    """
+    :param descriptors: a 2d array of elliptic fourier descriptors, optionally followed by other descriptors
+    :param efd_order: the elliptic fourier descriptor order to select
+    :param additional_columns: the number of other descriptors after the elliptic fourier descriptors
+    :return: the column indices of the area, length, number of points, the elliptic fourier descriptors up to efd_order
+        and the other descriptors
+    """
+    num_columns = descriptors.shape[1]
+    return np.r_[:3 + efd_order * 8, num_columns - additional_columns:num_columns]
@@ -1,59 +1,323 @@
+import os
+
 import numpy as np
 from .GeoVectorizer import FULL_STOP_INDEX
 
+CHUNK_SIZE = 4096  # The number of geometries to transform at once
+
 
 def scale(vectors):
-    means = localized_mean(vectors)
-    min_maxs = []
+    return np.std(_min_maxs(vectors))
+
+
+def _min_maxs(vectors):
+    """
+    :param vectors: the vectorized geometries
+    :return: a 2d numpy array of the minimum and maximum localized coordinate per geometry, [0, 0] for geometries
+        without full stop. Empty geometries, that start with a full stop like dummy records, are skipped.
+    """
+    padded = _padded(vectors)
+    if padded is None:
+        return _ragged_min_maxs(vectors)
+
+    means = localized_mean(padded)[:, 0]
+    full_stop_indices, has_full_stop = _full_stop_indices(padded)
+    before_full_stop = np.arange(padded.shape[1])[None, :, None] < full_stop_indices[:, None, None]
 
-    for index, data_point in enumerate(vectors):
-        full_stop_point = data_point[:, FULL_STOP_INDEX].tolist()
+    # Subtracting the mean does not change the order, so the extremes of the coordinates can be localized instead
+    coords = padded[..., :2]
+    mins = np.min(np.min(coords, axis=1, where=before_full_stop, initial=np.inf) - means, axis=1)
+    maxs = np.max(np.max(coords, axis=1, where=before_full_stop, initial=-np.inf) - means, axis=1)
+    min_maxs = np.stack([mins, maxs], axis=1)
+    min_maxs[~has_full_stop] = 0  # if a dummy point is encountered
+    return min_maxs[~has_full_stop | (full_stop_indices > 0)]
 
-        try:
-            full_stop_point_index = full_stop_point.index(1)
-        except Exception as e:  # if a dummy point is encountered
-            min_maxs.append([0, 0])
-            continue
 
-        min_maxs.append([
-            np.min(data_point[..., :full_stop_point_index, :2] - means[index]),
-            np.max(data_point[..., :full_stop_point_index, :2] - means[index])
-        ])
+def transform(vectors, scale=None, dtype=None, inplace=False, out=None, chunk_size=CHUNK_SIZE, means=None):
+    """
+    Localize the geometries to their mean and divide them by the scale
+    :param vectors: the vectorized geometries as padded 3d array or ragged (object) array of 2d matrices
+    :param scale: the scale to divide the localized coordinates by
+    :param dtype: optional numpy dtype of the output, e.g. np.float32 or np.float16
+    :param inplace: optional, transform the vectors in place instead of returning a transformed copy
+    :param out: optional preallocated array of the shape of the padded vectors to write the transformed vectors to
+    :param chunk_size: optional number of geometries transformed at once, to bound temporary memory
+    :param means: optional means to localize to instead of those of the geometries themselves, as from localized_mean
+        of related geometries
+    :return: the transformed vectors
+    """
+    if inplace and (out is not None or dtype is not None):
+        raise ValueError('An in place transform cannot write to a different output or dtype')
 
-    return np.std(min_maxs)
+    padded = _padded(vectors)
+    if padded is None:
+        if out is not None:
+            raise ValueError('An out array is only supported for padded vectors')
+        return _ragged_transform(vectors, scale, dtype, inplace, chunk_size, means)
 
+    if inplace:
+        out = padded
+    elif out is None:
+        # noinspection PyUnresolvedReferences
+        out = np.empty(padded.shape, dtype=dtype or padded.dtype)
+    elif not out.shape == padded.shape:
+        raise ValueError('Expected an output array of shape {}, got {}'.format(padded.shape, out.shape))
 
-def transform(vectors, scale=None):
-    localized = np.copy(vectors)
-    means = localized_mean(vectors)
+    for start in range(0, len(padded), chunk_size):
+        _transform_chunk(padded[start:start + chunk_size], out[start:start + chunk_size], scale,
+                         None if means is None else means[start:start + chunk_size])
 
-    for index, data_point in enumerate(localized):
-        full_stop_point = data_point[:, FULL_STOP_INDEX].tolist()
+    return out
 
-        try:
-            full_stop_point_index = full_stop_point.index(1)
-        except Exception as e:  # if a dummy point is encountered
-            continue
 
-        data_point[..., :full_stop_point_index + 1, :2] -= means[index]
-        data_point[..., :full_stop_point_index + 1, :2] /= scale
+def _transform_chunk(padded, out, scale, means=None):
+    means = localized_mean(padded) if means is None else means
+    full_stop_indices, has_full_stop = _full_stop_indices(padded)
+    if out is not padded:
+        out[...] = padded
 
-    return localized
+    # Localize and scale up to and including the full stop point, in the same order of operations as per record
+    up_to_full_stop = (np.arange(padded.shape[1]) <= full_stop_indices[:, None]) & has_full_stop[:, None]
+    points = out[..., :2][up_to_full_stop]
+    points -= np.repeat(means[:, 0], np.sum(up_to_full_stop, axis=1), axis=0)
+    points /= scale
+    out[..., :2][up_to_full_stop] = points
 
 
 def localized_mean(vectors):
-    geom_means = []
-    for data_point in vectors:
-        full_stop_point = data_point[:, FULL_STOP_INDEX].tolist()
+    padded = _padded(vectors)
+    if padded is None:
+        return _ragged_localized_mean(vectors)
+
+    full_stop_indices, has_full_stop = _full_stop_indices(padded)
+    before_full_stop = np.arange(padded.shape[1])[None, :, None] < full_stop_indices[:, None, None]
+
+    # Take the mean of all non-null points for localized origin, dummy and empty records get a [0, 0] origin
+    dtype = padded.dtype if np.issubdtype(padded.dtype, np.floating) else np.float64
+    sums = np.sum(padded[..., 0:2], axis=1, where=before_full_stop, dtype=dtype)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        geom_means = sums / full_stop_indices[:, None].astype(dtype)
+    geom_means[~has_full_stop | (full_stop_indices == 0)] = 0
+
+    return geom_means[:, None, :]
+
+
+def _padded(vectors):
+    """
+    :param vectors: the vectorized geometries
+    :return: the vectors as padded 3d numpy array, or None if they are a ragged (object) array of 2d matrices
+    """
+    if isinstance(vectors, np.ndarray):
+        return None if vectors.dtype == object else vectors
+    try:
+        vectors = np.asarray(vectors)
+    except ValueError:  # a list of differently shaped matrices
+        return None
+    return None if vectors.dtype == object else vectors
+
+
+def _full_stop_indices(padded):
+    """
+    :param padded: a padded 3d numpy array of vectorized geometries
+    :return full_stop_indices, has_full_stop: the index of the first full stop point per geometry and a boolean mask
+        of the geometries that have one
+    """
+    full_stop = padded[..., FULL_STOP_INDEX] == 1
+    return np.argmax(full_stop, axis=1), np.any(full_stop, axis=1)
+
+
+def _ragged_chunks(vectors, chunk_size):
+    """
+    Concatenate consecutive chunks of a ragged array of 2d geometry matrices, to bound the temporary memory
+    :param vectors: an object array or list of 2d geometry matrices
+    :param chunk_size: the number of geometries per chunk
+    :return: a generator of the start index and the geometries of every chunk, followed by the output of _ragged
+    """
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        yield (start, chunk) + _ragged(chunk)
+
+
+def _ragged(vectors):
+    """
+    Concatenate a ragged array of 2d geometry matrices into one array of points for segment operations
+    :param vectors: an object array or list of 2d geometry matrices
+    :return flat, lengths, before_full_stop, up_to_full_stop, has_full_stop: the concatenated points, the number of
+        points per geometry, boolean masks of the points before and up to and including the first full stop of their
+        geometry, and a boolean mask of the geometries that have a full stop
+    """
+    lengths = np.array([len(data_point) for data_point in vectors], dtype=int)
+    flat = np.concatenate(list(vectors)) if len(vectors) else np.zeros((0, FULL_STOP_INDEX + 1))
+    starts = np.cumsum(lengths) - lengths
+    point_indices = np.arange(len(flat)) - np.repeat(starts, lengths)
+
+    no_full_stop = np.iinfo(int).max
+    full_stop_points = np.where(flat[:, FULL_STOP_INDEX] == 1, point_indices, no_full_stop)
+    full_stop_indices = _segment_reduce(np.minimum, full_stop_points, lengths, no_full_stop)
+    has_full_stop = full_stop_indices < no_full_stop
+
+    full_stop_indices = np.repeat(full_stop_indices, lengths)
+    before_full_stop = point_indices < full_stop_indices
+    up_to_full_stop = point_indices <= full_stop_indices
+    return flat, lengths, before_full_stop, up_to_full_stop, has_full_stop
+
+
+def _segment_reduce(ufunc, values, lengths, initial):
+    """
+    Reduce consecutive segments of values with a numpy ufunc
+    :param ufunc: the numpy ufunc, e.g. np.add or np.minimum
+    :param values: numpy array of the concatenated segments along the first axis
+    :param lengths: the number of values per segment
+    :param initial: the result for empty segments
+    :return: numpy array of the reduced values per segment
+    """
+    reduced = np.full((len(lengths),) + values.shape[1:], initial, dtype=values.dtype)
+    non_empty = lengths > 0
+    if np.any(non_empty):
+        starts = np.cumsum(lengths) - lengths
+        reduced[non_empty] = ufunc.reduceat(values, starts[non_empty], axis=0)
+    return reduced
+
+
+def _ragged_means(flat, lengths, before_full_stop, has_full_stop):
+    dtype = flat.dtype if np.issubdtype(flat.dtype, np.floating) else np.float64
+    coords = np.where(before_full_stop[:, None], flat[:, :2], 0).astype(dtype, copy=False)
+    sums = _segment_reduce(np.add, coords, lengths, 0)
+    counts = _segment_reduce(np.add, before_full_stop.astype(int), lengths, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts[:, None].astype(dtype)
+    means[~has_full_stop | (counts == 0)] = 0  # if a dummy point or an empty geometry is encountered
+    return means, counts
+
+
+def _ragged_min_maxs(vectors, chunk_size=CHUNK_SIZE):
+    min_maxs = [np.zeros((0, 2))]
+    for _, _, flat, lengths, before_full_stop, _, has_full_stop in _ragged_chunks(vectors, chunk_size):
+        means, counts = _ragged_means(flat, lengths, before_full_stop, has_full_stop)
+
+        # Subtracting the mean does not change the order, so the extremes of the coordinates can be localized instead
+        mins = _segment_reduce(np.minimum, np.where(before_full_stop[:, None], flat[:, :2], np.inf), lengths, np.inf)
+        maxs = _segment_reduce(np.maximum, np.where(before_full_stop[:, None], flat[:, :2], -np.inf), lengths,
+                               -np.inf)
+        chunk_min_maxs = np.stack([np.min(mins - means, axis=1), np.max(maxs - means, axis=1)], axis=1)
+        chunk_min_maxs[~has_full_stop] = 0  # if a dummy point is encountered
+        min_maxs.append(chunk_min_maxs[~has_full_stop | (counts > 0)])  # skip empty geometries
+    return np.concatenate(min_maxs)
+
+
+def _ragged_transform(vectors, scale=None, dtype=None, inplace=False, chunk_size=CHUNK_SIZE, means=None):
+    transformed = np.empty(len(vectors), dtype=object)
+    for start, chunk, flat, lengths, before_full_stop, up_to_full_stop, has_full_stop in _ragged_chunks(vectors,
+                                                                                                         chunk_size):
+        if means is None:
+            chunk_means, _ = _ragged_means(flat, lengths, before_full_stop, has_full_stop)
+        else:
+            chunk_means = means[start:start + chunk_size, 0]
+        localized = flat if dtype is None else flat.astype(dtype)
+
+        up_to_full_stop &= np.repeat(has_full_stop, lengths)
+        points = localized[:, :2][up_to_full_stop]
+        points -= np.repeat(chunk_means, _segment_reduce(np.add, up_to_full_stop.astype(int), lengths, 0), axis=0)
+        points /= scale
+        localized[:, :2][up_to_full_stop] = points
+
+        # Split into views on the transformed points of the chunk
+        for index, data_point in enumerate(np.split(localized, np.cumsum(lengths)[:-1])):
+            if inplace:
+                chunk[index][...] = data_point
+            else:
+                transformed[start + index] = data_point
+    return vectors if inplace else transformed
+
+
+def _ragged_localized_mean(vectors, chunk_size=CHUNK_SIZE):
+    means = [np.zeros((0, 2))]
+    for _, _, flat, lengths, before_full_stop, _, has_full_stop in _ragged_chunks(vectors, chunk_size):
+        means.append(_ragged_means(flat, lengths, before_full_stop, has_full_stop)[0])
+    return np.concatenate(means)[:, None, :]
+
+
+class GeomScaler:
+    """
+    Geometry scaler that is fitted once and can be saved and loaded, e.g. next to the data set it was fitted on. The
+    scale is the standard deviation of the localized minimum and maximum coordinates of the geometries, equal to
+    geom_scaler.scale. It can be fitted in chunks with partial_fit, using exact streaming mean and variance updates.
+    """
+
+    def __init__(self, scale=None):
+        """
+        :param scale: optional known scale, for instance from a GEOM_SCALE hyperparameter
+        """
+        self.scale = scale
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.  # The summed squared differences from the mean
+
+    def fit(self, vectors):
+        self.count, self.mean, self.m2 = 0, 0., 0.
+        return self.partial_fit(vectors)
+
+    def partial_fit(self, vectors):
+        """
+        Update the scale with a chunk of geometries
+        :param vectors: the vectorized geometries of the chunk
+        :return: self
+        """
+        values = _min_maxs(vectors).ravel().astype(np.float64)
+        if not len(values):
+            return self
+
+        # Merge the chunk statistics with the running ones, see Chan et al. (1979)
+        count = self.count + len(values)
+        chunk_mean = np.mean(values)
+        delta = chunk_mean - self.mean
+        self.m2 += np.sum((values - chunk_mean) ** 2) + delta ** 2 * self.count * len(values) / count
+        self.mean += delta * len(values) / count
+        self.count = count
+        self.scale = float(np.sqrt(self.m2 / self.count))
+        return self
+
+    def transform(self, vectors, dtype=None, inplace=False, out=None):
+        """
+        Localize and scale the geometries, see geom_scaler.transform
+        """
+        if self.scale is None:
+            raise ValueError('The GeomScaler needs to be fitted before it can transform geometries')
+        return transform(vectors, self.scale, dtype, inplace, out)
+
+    def fit_transform(self, vectors, dtype=None, inplace=False, out=None):
+        return self.fit(vectors).transform(vectors, dtype, inplace, out)
 
-        try:
-            full_stop_point_index = full_stop_point.index(1)
-        except Exception as e:  # if a dummy point is encountered
-            geom_means.append([[[0, 0]]])
-            continue
+    def save(self, file):
+        """
+        Save the fitted statistics to a numpy archive
+        :param file: file name or file object
+        """
+        np.savez(file, scale=np.nan if self.scale is None else self.scale, count=self.count, mean=self.mean,
+                 m2=self.m2)
 
-        # Take the mean of all non-null points for localized origin
-        geom_mean = np.mean(data_point[0:full_stop_point_index, 0:2], axis=0, keepdims=True)
-        geom_means.append(geom_mean)
+    @classmethod
+    def load(cls, file):
+        """
+        Load a GeomScaler saved with GeomScaler.save
+        :param file: file name or file object
+        :return: a GeomScaler instance
+        """
+        with np.load(file, allow_pickle=False) as loaded:
+            scaler = cls(None if np.isnan(loaded['scale']) else float(loaded['scale']))
+            scaler.count, scaler.mean, scaler.m2 = int(loaded['count']), float(loaded['mean']), float(loaded['m2'])
+        return scaler
 
-    return np.array(geom_means)
+    @classmethod
+    def load_or_fit(cls, file, vectors):
+        """
+        Load a saved GeomScaler, or fit one on the geometries and save it if the file does not exist yet
+        :param file: file name of the saved scaler
+        :param vectors: the vectorized geometries to fit on
+        :return: a GeomScaler instance
+        """
+        if os.path.isfile(file):
+            return cls.load(file)
+        scaler = cls().fit(vectors)
+        scaler.save(file)
+        return scaler
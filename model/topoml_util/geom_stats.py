@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .GeoVectorizer import GeoVectorizer
+from .npz_cache import load_cache, save_cache
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99, 0.999]
+CHUNK_SIZE = 8192
+
+
+def geom_stats(wkts, source_file=None, column='geometry', quantiles=None, bins=20, workers=None):
+    """
+    Gathers vertex count statistics of a column of geometries in a single pass over all cores. The per-record counts
+    are cached next to the source file, so a next run with an unchanged source file does not need to parse the
+    geometries again.
+    :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+    :param source_file: optional path of the file the geometries were read from, to cache the counts next to
+    :param column: optional name of the geometry column in the source file, to distinguish caches of the same file
+    :param quantiles: optional list of quantiles between 0 and 1 to compute, defaults to QUANTILES
+    :param bins: optional number of histogram bins or a sequence of bin edges, as in np.histogram
+    :param workers: optional number of threads, defaults to the number of cores
+    :return: a dict with the per-record 'num_points', the 'max', a dict of 'quantiles', the 'histogram' counts and its
+        'bin_edges'
+    """
+    num_points = None
+    cache_file = None if source_file is None else stats_cache_file(source_file, column)
+    if cache_file is not None:
+        num_points = load_cache(cache_file, source_file, len(wkts), key='num_points')
+
+    if num_points is None:
+        num_points = num_points_parallel(wkts, workers)
+        if cache_file is not None:
+            save_cache(cache_file, source_file, num_points, key='num_points')
+
+    quantiles = QUANTILES if quantiles is None else quantiles
+    quantile_values = np.quantile(num_points, quantiles) if len(num_points) else np.zeros(len(quantiles))
+    histogram, bin_edges = np.histogram(num_points, bins=bins)
+    return {
+        'num_points': num_points,
+        'max': int(np.max(num_points)) if len(num_points) else 0,
+        'quantiles': dict(zip(quantiles, quantile_values.tolist())),
+        'histogram': histogram,
+        'bin_edges': bin_edges,
+    }
+
+
+def num_points_parallel(wkts, workers=None):
+    """
+    Counts the number of points of every geometry like GeoVectorizer.num_points, in chunks over a thread pool. Shapely
+    releases the GIL while parsing and counting, so the chunks run on all cores.
+    :param wkts: an iterable of wkt strings, wkb bytes, shapely geometries or (n, 2) coordinate arrays
+    :param workers: optional number of threads, defaults to the number of cores
+    :return: a 1d numpy integer array with the number of points per geometry
+    """
+    if not isinstance(wkts, np.ndarray):
+        wkts = list(wkts)
+    if len(wkts) <= CHUNK_SIZE:
+        return GeoVectorizer.num_points(wkts)
+
+    chunks = [wkts[start:start + CHUNK_SIZE] for start in range(0, len(wkts), CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return np.concatenate(list(executor.map(GeoVectorizer.num_points, chunks)))
+
+
+def stats_cache_file(source_file, column='geometry'):
+    """
+    :param source_file: path of the file the geometries were read from
+    :param column: name of the geometry column in the source file
+    :return: the path of the vertex count cache next to the source file
+    """
+    return '{}.{}.num_points.npz'.format(source_file, column)
+
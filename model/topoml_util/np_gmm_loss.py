@@ -1,39 +1,119 @@
-from topoml_util.gaussian_loss import r4_bivariate_gaussian
 import numpy as np
 
+from topoml_util.GeoVectorizer import RENDER_LEN
+
+CHUNK_SIZE = 1024  # records per chunk in record_losses
+
+
+def log_softmax(x, axis=-1):
+    """Compute the log of the softmax values along an axis of x, stable for large values"""
+    shifted = x - np.max(x, axis=axis, keepdims=True)
+    return shifted - np.log(np.sum(np.exp(shifted), axis=axis, keepdims=True))
+
+
 class GaussianMixtureLoss:
-    def __init__(self, num_components):
+    """
+    Numpy implementation of topoml_util.GaussianMixtureLoss, to evaluate the geometry loss of predictions offline.
+    Operates on many records at once by broadcasting over the records, points and components.
+    """
+    def __init__(self, num_components, epsilon=1e-7):
         self.num_components = num_components
-        
-    @staticmethod
-    def softmax(x):
-        """Compute softmax values for each sets of scores in x."""
-        return np.exp(x) / np.sum(np.exp(x), axis=0)
+        self.epsilon = epsilon  # the keras backend default
 
-    @staticmethod
-    def epsilon():
-        return 1e-16
+    def bivariate_gaussian_log_pdf(self, true, pred):
+        """
+        Log of the stabilized bivariate gaussian probability density function, as gaussian_loss.bivariate_gaussian_nll
+        :param true: truth values with at least [mu1, mu2]
+        :param pred: values predicted with at least [mu1, mu2, sigma1, sigma2, rho]
+        :return: log of the probability density function
+        """
+        log_sigma_x = np.abs(pred[..., 2]) + np.log1p(self.epsilon * np.exp(-np.abs(pred[..., 2])))
+        log_sigma_y = np.abs(pred[..., 3]) + np.log1p(self.epsilon * np.exp(-np.abs(pred[..., 3])))
+        norm1 = np.log1p(np.abs(true[..., 0] - pred[..., 0])) * np.exp(-log_sigma_x)
+        norm2 = np.log1p(np.abs(true[..., 1] - pred[..., 1])) * np.exp(-log_sigma_y)
+        return -0.5 * (np.square(norm1) + np.square(norm2)) - log_sigma_x - log_sigma_y - np.log(2 * np.pi)
 
-    def geom_gaussian_mixture_loss(self, y_true, y_pred):
-        # loss fn based on eq #26 of http://arxiv.org/abs/1308.0850.
-        (data_points, points, features) = y_pred.shape
-        geom_type_index = 6 * self.num_components  # Calculate offset from parameters times components
-        render_index = geom_type_index + 8
-        pi_index = 5
+    def component_log_likelihoods(self, y_true, y_pred):
+        """
+        :param y_true: rank 3 of shape (records, points, features) truth values
+        :param y_pred: rank 3 of shape (records, points, num_components * 6 + one-hot features) predicted values
+        :return: rank 3 of shape (records, points, num_components) of the log of the weighted component densities
+        """
+        true_coordinates = y_true[..., np.newaxis, :2]  # broadcast over the components
+        predicted_components = np.reshape(y_pred[..., :self.num_components * 6],
+                                          y_pred.shape[:-1] + (self.num_components, 6))
+        pi_index = 5  # mixture component weight
+        log_pi_weights = log_softmax(predicted_components[..., pi_index])
+        return self.bivariate_gaussian_log_pdf(true_coordinates, predicted_components) + log_pi_weights
 
-        predicted_components = np.reshape(y_pred[:geom_type_index], (-1, points.value, self.num_components, 6))
-        pi = self.softmax(predicted_components[:, :, :, pi_index])
+    def mixture_negative_log_likelihood(self, y_true, y_pred):
+        """
+        Negative log likelihood of the true coordinates under the full mixture, through log-sum-exp over the components
+        :param y_true: rank 3 of shape (records, points, features) truth values
+        :param y_pred: rank 3 of shape (records, points, num_components * 6 + one-hot features) predicted values
+        :return: rank 2 of shape (records, points) of the negative log likelihoods
+        """
+        log_likelihoods = self.component_log_likelihoods(y_true, y_pred)
+        max_log_likelihood = np.max(log_likelihoods, axis=-1)
+        return -(max_log_likelihood +
+                 np.log(np.sum(np.exp(log_likelihoods - max_log_likelihood[..., np.newaxis]), axis=-1)))
 
-        true_components = np.reshape(y_true[:geom_type_index], (-1, points.value, self.num_components, 6))
+    def geom_gaussian_mixture_loss(self, y_true, y_pred):
+        """
+        Calculates the loss of GaussianMixtureLoss.geom_gaussian_mixture_loss, summing the mixture loss over the
+        whole batch like the keras implementation
+        :param y_true: rank 3 of shape (records, points, features) truth values
+        :param y_pred: rank 3 of shape (records, points, num_components * 6 + one-hot features) predicted values
+        :return: rank 2 of shape (records, points) of the summed mixture loss and categorical cross entropy losses for
+            the geometry type and stop bits
+        """
+        gmm_loss, neg_full_stop_chance, categorical_error = self._loss_terms(y_true, y_pred)
+        return np.sum(gmm_loss) * neg_full_stop_chance + categorical_error
 
-        gmm = r4_bivariate_gaussian(true_components, predicted_components) * pi
-        gmm_loss = np.sum(-np.log(gmm + self.epsilon()))
+    def record_losses(self, y_true, y_pred, chunk_size=CHUNK_SIZE):
+        """
+        The loss per record, as the mean of geom_gaussian_mixture_loss with a batch of that single record. Evaluates
+        chunks of records at once, so saved predictions can be scored from memory-mapped files, as from
+        np.load(prediction_file, mmap_mode='r').
+        :param y_true: rank 3 of shape (records, points, features) truth values
+        :param y_pred: rank 3 of shape (records, points, num_components * 6 + one-hot features) predicted values
+        :param chunk_size: optional number of records to evaluate at once, to bound memory
+        :return: a 1d numpy array of the loss per record
+        """
+        losses = np.zeros(len(y_pred))
+        for start in range(0, len(y_pred), chunk_size):
+            stop = start + chunk_size
+            gmm_loss, neg_full_stop_chance, categorical_error = self._loss_terms(
+                np.asarray(y_true[start:stop], dtype=float), np.asarray(y_pred[start:stop], dtype=float))
+            losses[start:stop] = np.mean(
+                np.sum(gmm_loss, axis=1, keepdims=True) * neg_full_stop_chance + categorical_error, axis=1)
+        return losses
 
-        # Zero out loss terms beyond N_s, the last actual stroke
-        render = 1 - np.mean(y_pred[:, :, render_index:render_index + 2])  # RENDER and STOP values
+    def _loss_terms(self, y_true, y_pred):
+        """
+        :return gmm_loss, neg_full_stop_chance, categorical_error: rank 2 arrays of shape (records, points) of the
+            mixture loss summed over the components, one minus the chance of full stop and the summed categorical
+            cross entropy
+        """
+        # loss fn based on eq #26 of http://arxiv.org/abs/1308.0850.
+        # clamped at -log(epsilon) per component, as gaussian_loss.bivariate_gaussian_nll
+        gmm_loss = np.sum(np.minimum(-self.component_log_likelihoods(y_true, y_pred), -np.log(self.epsilon)), axis=-1)
 
-        gmm_loss = gmm_loss * render
+        render_action = np.exp(log_softmax(y_true[..., -RENDER_LEN:]))
+        neg_full_stop_chance = 1 - render_action[..., 2]  # 1 minus the chance of full stop
 
-        return gmm_loss
+        render_error = self._categorical_crossentropy(y_true[..., -RENDER_LEN:], y_pred[..., -RENDER_LEN:])
 
+        # The one-hot geometry type columns are in between the components and the render action
+        geom_type_len = y_pred.shape[-1] - self.num_components * 6 - RENDER_LEN
+        if geom_type_len == 0:
+            return gmm_loss, neg_full_stop_chance, render_error
+        geom_type_error = self._categorical_crossentropy(y_true[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN],
+                                                         y_pred[..., -(geom_type_len + RENDER_LEN):-RENDER_LEN])
+        return gmm_loss, neg_full_stop_chance, geom_type_error + render_error
 
+    def _categorical_crossentropy(self, true_logits, pred_logits):
+        """Categorical cross entropy between the softmax of both logits, clipped like the keras backend"""
+        target = np.exp(log_softmax(true_logits))
+        output = np.clip(np.exp(log_softmax(pred_logits)), self.epsilon, 1 - self.epsilon)
+        return -np.sum(target * np.log(output), axis=-1)
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+
+
+def load_cache(cache_file, source_file, records, key):
+    """
+    Loads an array cached next to a source file by save_cache, if the source file did not change since
+    :param cache_file: path of the npz cache file
+    :param source_file: path of the file the cached values were computed from
+    :param records: the expected number of records of the cached array
+    :param key: the name of the cached array in the cache file
+    :return: the cached array, or None if there is no cache or the source file modification time or size or the number
+        of records differ
+    """
+    if not os.path.isfile(cache_file):
+        return None
+
+    source_stat = os.stat(source_file)
+    with np.load(cache_file, allow_pickle=False) as cache:
+        if not (cache['source_mtime'] == source_stat.st_mtime and cache['source_size'] == source_stat.st_size and
+                len(cache[key]) == records):
+            return None
+        return cache[key]
+
+
+def save_cache(cache_file, source_file, values, key):
+    """
+    Caches an array computed from a source file, together with the modification time and size of the source file
+    :param cache_file: path of the npz cache file
+    :param source_file: path of the file the values were computed from
+    :param values: the array to cache
+    :param key: the name of the array in the cache file
+    """
+    source_stat = os.stat(source_file)
+    np.savez(cache_file, source_mtime=source_stat.st_mtime, source_size=source_stat.st_size, **{key: values})
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+CHUNK_SIZE = 256
+
+
+def parallel_map(function, records, workers=None, chunk_size=CHUNK_SIZE, threads=False, progress=None):
+    """
+    Applies a function to every record in chunks over a pool of processes or threads. The results are returned in the
+    order of the input records and are equal to those of the serial path with workers=1. A record that raises an
+    exception does not abort the other records: its exception is collected instead.
+    :param function: a function taking a single record. For a process pool it needs to be defined at module level.
+        Where available, processes are forked so functions defined in a script without a __main__ guard work as well.
+    :param records: a sized iterable of records, e.g. a list or a 1d numpy array of wkt strings
+    :param workers: optional number of processes or threads, defaults to the number of cores. With workers=1 the
+        records are processed serially in the calling process.
+    :param chunk_size: optional number of records per task sent to a worker
+    :param threads: optional, use a thread pool instead of a process pool. Only worth it if the function spends most of
+        its time in code that releases the GIL, such as the shapely vectorized functions.
+    :param progress: optional callback taking the number of processed records and the total number of records, called
+        after every chunk
+    :return results, errors: a list of results with None for records that raised an exception, and a list of
+        (index, exception) tuples for those records
+    """
+    records = list(records)
+    chunks = [records[start:start + chunk_size] for start in range(0, len(records), chunk_size)]
+    workers = workers or os.cpu_count()
+
+    if workers == 1:
+        chunk_results = map(_map_chunk, [function] * len(chunks), chunks)
+        return _collect(chunk_results, len(records), progress)
+
+    if threads:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        context = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(context))
+
+    with executor:
+        chunk_results = executor.map(_map_chunk, [function] * len(chunks), chunks)
+        return _collect(chunk_results, len(records), progress)
+
+
+def _map_chunk(function, chunk):
+    results = []
+    for record in chunk:
+        try:
+            results.append((function(record), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def _collect(chunk_results, total, progress):
+    results = []
+    errors = []
+    for chunk in chunk_results:
+        for result, error in chunk:
+            if error is not None:
+                errors.append((len(results), error))
+            results.append(result)
+        if progress is not None:
+            progress(len(results), total)
+    return results, errors
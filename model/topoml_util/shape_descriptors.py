@@ -0,0 +1,262 @@
+from functools import partial
+
+import numpy as np
+import shapely
+
+from .GeoTensor import GeoTensor
+from .geom_fourier_descriptors import descriptor_columns, first_rings, geom_centroid_distance_descriptors
+from .npz_cache import load_cache, save_cache
+
+TURNING_FUNCTION_SAMPLES = 32
+
+# Registered descriptor families by name: a function of the concatenated contour coordinates and the number of
+# points per contour that returns a 2d array of descriptors per contour, and a version to increment on every change
+# of its output so cached descriptors are recomputed
+DESCRIPTOR_FAMILIES = {}
+
+
+def descriptor_family(name, version=1):
+    """
+    Decorator to register a descriptor family function, making it available to shape_descriptors
+    :param name: the name of the family
+    :param version: optional version of the family, part of the cache file name
+    """
+
+    def register(function):
+        DESCRIPTOR_FAMILIES[name] = (function, version)
+        return function
+
+    return register
+
+
+def shape_descriptors(vectors, families):
+    """
+    Computes descriptor families of the first ring of vectorized geometries
+    :param vectors: the vectorized geometries as padded 3d array or ragged (object) array of 2d matrices
+    :param families: a list of names of registered descriptor families
+    :return: a 2d array with the descriptors of all families side by side, in the order of families
+    """
+    flat, lengths = first_rings(vectors)
+    return np.concatenate([DESCRIPTOR_FAMILIES[name][0](flat, lengths) for name in families], axis=1)
+
+
+def cached_shape_descriptors(vectors, families, data_file, column='fixed_size_geoms'):
+    """
+    Computes descriptor families of the first ring of vectorized geometries, like shape_descriptors, with every family
+    cached as a separate column block next to the data file. A next run with the same data file only computes the
+    families that were not cached yet.
+    :param vectors: the vectorized geometries as padded 3d array or ragged (object) array of 2d matrices
+    :param families: a list of names of registered descriptor families
+    :param data_file: path of the data file the vectors were read from, to cache the descriptors next to
+    :param column: optional name of the vectors in the data file, to distinguish caches of the same file
+    :return: a 2d array with the descriptors of all families side by side, in the order of families
+    """
+    rings = None
+    blocks = []
+    for name in families:
+        function, version = DESCRIPTOR_FAMILIES[name]
+        cache_file = descriptor_cache_file(data_file, column, name, version)
+        block = load_cache(cache_file, data_file, len(vectors), key='descriptors')
+        if block is None:
+            rings = first_rings(vectors) if rings is None else rings
+            block = function(*rings)
+            save_cache(cache_file, data_file, block, key='descriptors')
+        blocks.append(block)
+    return np.concatenate(blocks, axis=1)
+
+
+def select_descriptors(loaded, hp, data_file):
+    """
+    Gathers the descriptors of a preprocessed data archive that the shallow baseline models are fitted on: the
+    elliptic fourier descriptors, followed by the centroid distance fourier descriptors up to
+    hp['CENTROID_DISTANCE_ORDER'] if it is positive, and the descriptor families named in hp['SHAPE_DESCRIPTORS'],
+    cached next to the data file
+    :param loaded: the loaded data archive, with 'elliptic_fourier_descriptors' and 'fixed_size_geoms'
+    :param hp: the hyperparameters of the model. SHAPE_DESCRIPTORS is a list of family names or a comma separated
+        string of them, as set through the environment.
+    :param data_file: path of the data archive, to cache the shape descriptors next to
+    :return descriptors, columns: a 2d array of the descriptors and a function of an elliptic fourier descriptor order
+        that returns the indices of the columns to fit on, see descriptor_columns
+    """
+    efds = loaded['elliptic_fourier_descriptors']
+    centroid_distance_order = int(hp.get('CENTROID_DISTANCE_ORDER') or 0)
+    families = hp.get('SHAPE_DESCRIPTORS') or []
+    if isinstance(families, str):
+        families = [name.strip() for name in families.split(',') if name.strip()]
+
+    descriptors = [efds]
+    if centroid_distance_order or families:
+        vectors = GeoTensor.from_arrays(loaded, 'fixed_size_geoms').to_padded()
+        if centroid_distance_order:
+            descriptors.append(geom_centroid_distance_descriptors(vectors, centroid_distance_order))
+        if families:
+            descriptors.append(cached_shape_descriptors(vectors, families, data_file))
+
+    descriptors = np.concatenate(descriptors, axis=1)
+    additional_columns = descriptors.shape[1] - efds.shape[1]
+    return descriptors, partial(descriptor_columns, descriptors, additional_columns=additional_columns)
+
+
+def descriptor_cache_file(data_file, column, name, version):
+    """
+    :param data_file: path of the data file the geometries were read from
+    :param column: name of the geometry column in the data file
+    :param name: name of the descriptor family
+    :param version: version of the descriptor family
+    :return: the path of the descriptor cache next to the data file
+    """
+    return '{}.{}.{}_v{}.npz'.format(data_file, column, name, version)
+
+
+def _polygons(flat, lengths):
+    return shapely.polygons(shapely.linearrings(flat, indices=np.repeat(np.arange(len(lengths)), lengths)))
+
+
+@descriptor_family('hu_moments')
+def hu_moments(flat, lengths):
+    """
+    The seven Hu moment invariants of the area enclosed by the contours, computed exactly from the polygon vertices
+    :param flat: the concatenated coordinates of the contours
+    :param lengths: the number of points per contour
+    :return: a 2d array of shape (len(lengths), 7)
+    """
+    starts = np.cumsum(lengths) - lengths
+    # Localize to the mean vertex first, to keep precision for large coordinates
+    flat = flat - np.repeat(np.add.reduceat(flat, starts, axis=0) / lengths[:, None], lengths, axis=0)
+    next_points = np.arange(1, len(flat) + 1)
+    next_points[starts + lengths - 1] = starts
+    x0, y0 = flat[:, 0], flat[:, 1]
+    x1, y1 = flat[next_points, 0], flat[next_points, 1]
+    cross = x0 * y1 - x1 * y0
+
+    # Raw moments of the polygon area through Green's theorem, summed over the edges of every contour
+    def moment(terms, divisor):
+        return np.add.reduceat(cross * terms, starts) / divisor
+
+    m00 = moment(1, 2)
+    m10, m01 = moment(x0 + x1, 6), moment(y0 + y1, 6)
+    m20, m02 = moment(x0 ** 2 + x0 * x1 + x1 ** 2, 12), moment(y0 ** 2 + y0 * y1 + y1 ** 2, 12)
+    m11 = moment(x0 * y1 + 2 * x0 * y0 + 2 * x1 * y1 + x1 * y0, 24)
+    m30 = moment(x0 ** 3 + x0 ** 2 * x1 + x0 * x1 ** 2 + x1 ** 3, 20)
+    m03 = moment(y0 ** 3 + y0 ** 2 * y1 + y0 * y1 ** 2 + y1 ** 3, 20)
+    m21 = moment(x0 ** 2 * (3 * y0 + y1) + 2 * x0 * x1 * (y0 + y1) + x1 ** 2 * (y0 + 3 * y1), 60)
+    m12 = moment(y0 ** 2 * (3 * x0 + x1) + 2 * y0 * y1 * (x0 + x1) + y1 ** 2 * (x0 + 3 * x1), 60)
+
+    # Clockwise contours have negative moments
+    sign = np.sign(m00)
+    m00, m10, m01, m20, m02, m11, m30, m03, m21, m12 = \
+        [m * sign for m in [m00, m10, m01, m20, m02, m11, m30, m03, m21, m12]]
+
+    cx, cy = m10 / m00, m01 / m00
+    mu20, mu02, mu11 = m20 - cx * m10, m02 - cy * m01, m11 - cx * m01
+    mu30 = m30 - 3 * cx * m20 + 2 * cx ** 2 * m10
+    mu03 = m03 - 3 * cy * m02 + 2 * cy ** 2 * m01
+    mu21 = m21 - 2 * cx * m11 - cy * m20 + 2 * cx ** 2 * m01
+    mu12 = m12 - 2 * cy * m11 - cx * m02 + 2 * cy ** 2 * m10
+
+    # Scale invariant normalized central moments
+    n20, n02, n11 = mu20 / m00 ** 2, mu02 / m00 ** 2, mu11 / m00 ** 2
+    n30, n03, n21, n12 = mu30 / m00 ** 2.5, mu03 / m00 ** 2.5, mu21 / m00 ** 2.5, mu12 / m00 ** 2.5
+
+    a, b = n30 + n12, n21 + n03
+    c, d = n30 - 3 * n12, 3 * n21 - n03
+    return np.stack([
+        n20 + n02,
+        (n20 - n02) ** 2 + 4 * n11 ** 2,
+        c ** 2 + d ** 2,
+        a ** 2 + b ** 2,
+        c * a * (a ** 2 - 3 * b ** 2) + d * b * (3 * a ** 2 - b ** 2),
+        (n20 - n02) * (a ** 2 - b ** 2) + 4 * n11 * a * b,
+        d * a * (a ** 2 - 3 * b ** 2) - c * b * (3 * a ** 2 - b ** 2),
+    ], axis=1)
+
+
+@descriptor_family('turning_function')
+def turning_function(flat, lengths, samples=TURNING_FUNCTION_SAMPLES):
+    """
+    The turning function of the contours: the cumulative turning angle relative to the first segment, at a number of
+    positions equally spaced along the contour length. The angles of clockwise contours are negated, so every turning
+    function ends at 2 pi.
+    :param flat: the concatenated coordinates of the contours
+    :param lengths: the number of points per contour
+    :param samples: optional number of positions to sample
+    :return: a 2d array of shape (len(lengths), samples)
+    """
+    starts = np.cumsum(lengths) - lengths
+    next_points = np.arange(1, len(flat) + 1)
+    next_points[starts + lengths - 1] = starts
+    segments = flat[next_points] - flat
+    segment_lengths = np.hypot(segments[:, 0], segments[:, 1])
+    contours = np.repeat(np.arange(len(lengths)), lengths)
+
+    # Skip zero-length segments, they have no direction
+    non_zero = segment_lengths > 0
+    segments, segment_lengths, contours = segments[non_zero], segment_lengths[non_zero], contours[non_zero]
+    first_segments = np.searchsorted(contours, np.arange(len(lengths)))
+    if np.any(np.bincount(contours, minlength=len(lengths)) == 0):
+        raise ValueError('Every contour needs to contain a non-zero-length segment')
+
+    angles = np.arctan2(segments[:, 1], segments[:, 0])
+    turns = np.angle(np.exp(1j * np.diff(angles, prepend=0)))  # wrapped to [-pi, pi]
+    turns[first_segments] = 0
+    turning = np.cumsum(turns)
+    turning -= np.repeat(turning[first_segments], np.diff(np.append(first_segments, len(turning))))
+
+    # Contours are laid out one after another on a single arc length axis with a unit gap in between
+    totals = np.bincount(contours, weights=segment_lengths, minlength=len(lengths))
+    offsets = np.cumsum(totals + 1) - (totals + 1)
+    segment_starts = np.cumsum(segment_lengths) - segment_lengths
+    segment_starts += np.repeat(offsets - segment_starts[first_segments],
+                                np.diff(np.append(first_segments, len(segment_starts))))
+    positions = offsets[:, None] + totals[:, None] * ((np.arange(samples) + 0.5) / samples)
+    sampled = turning[np.searchsorted(segment_starts, positions, side='right') - 1]
+
+    counter_clockwise = shapely.is_ccw(shapely.linearrings(flat, indices=np.repeat(np.arange(len(lengths)), lengths)))
+    return np.where(counter_clockwise[:, None], sampled, -sampled)
+
+
+@descriptor_family('convexity')
+def convexity(flat, lengths):
+    """
+    :param flat: the concatenated coordinates of the contours
+    :param lengths: the number of points per contour
+    :return: a 2d array of shape (len(lengths), 2) of the solidity, the area divided by the convex hull area, and the
+        convex hull perimeter divided by the perimeter
+    """
+    polygons = _polygons(flat, lengths)
+    hulls = shapely.convex_hull(polygons)
+    return np.stack([shapely.area(polygons) / shapely.area(hulls),
+                     shapely.length(hulls) / shapely.length(polygons)], axis=1)
+
+
+@descriptor_family('compactness')
+def compactness(flat, lengths):
+    """
+    :param flat: the concatenated coordinates of the contours
+    :param lengths: the number of points per contour
+    :return: a 2d array of shape (len(lengths), 2) of the Polsby-Popper score, the area relative to that of a circle
+        with the same perimeter, and the Reock score, the area relative to that of the minimum bounding circle
+    """
+    polygons = _polygons(flat, lengths)
+    areas = shapely.area(polygons)
+    return np.stack([4 * np.pi * areas / shapely.length(polygons) ** 2,
+                     areas / (np.pi * shapely.minimum_bounding_radius(polygons) ** 2)], axis=1)
+
+
+@descriptor_family('rectangle_ratios')
+def rectangle_ratios(flat, lengths):
+    """
+    :param flat: the concatenated coordinates of the contours
+    :param lengths: the number of points per contour
+    :return: a 2d array of shape (len(lengths), 2) of the area divided by the area of the minimum rotated rectangle,
+        and the short side divided by the long side of that rectangle
+    """
+    polygons = _polygons(flat, lengths)
+    rectangles = shapely.oriented_envelope(polygons)
+    corners = shapely.get_coordinates(shapely.get_exterior_ring(rectangles))
+    if not len(corners) == 5 * len(polygons):
+        raise ValueError('Every contour needs to enclose an area')
+    corners = corners.reshape(len(polygons), 5, 2)
+    sides = np.hypot(*(corners[:, 1:3] - corners[:, 0:2]).transpose(2, 0, 1))
+    return np.stack([shapely.area(polygons) / shapely.area(rectangles),
+                     np.min(sides, axis=1) / np.max(sides, axis=1)], axis=1)
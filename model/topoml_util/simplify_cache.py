@@ -0,0 +1,168 @@
+import hashlib
+import os
+from multiprocessing.util import Finalize
+import sqlite3
+from time import time
+
+import shapely
+
+from .GeoVectorizer import GeoVectorizer, SIMPLIFY_VERSION
+
+DEFAULT_MAX_BYTES = 2 ** 30  # 1 GiB
+EVICTION_INTERVAL = 1000  # Number of stored entries between size checks
+COMMIT_INTERVAL = 256  # Number of buffered writes per commit
+
+
+class SimplifyCache:
+    """
+    Persistent on-disk cache of simplified geometries in an sqlite database. Entries are keyed by a hash of the
+    geometry wkb, the point budget and SIMPLIFY_VERSION, so a changed geometry or simplification algorithm never hits a
+    stale entry. When the stored geometries exceed max_bytes, the least recently used entries are evicted.
+    New entries and the last use of hits are buffered and written in one transaction every COMMIT_INTERVAL writes, so
+    worker processes sharing the database do not wait for each other's commit on every geometry. The buffer is
+    flushed on close and when the process exits.
+    Pass the simplify method as simplify parameter to the GeoVectorizer vectorize functions to use it:
+
+        cache = SimplifyCache('simplify_cache.sqlite')
+        GeoVectorizer.vectorize_wkt(wkt, 64, simplify=cache.simplify)
+    """
+
+    def __init__(self, file, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param file: path of the sqlite database file, created if it does not exist
+        :param max_bytes: optional maximum summed size of the stored geometries in bytes
+        """
+        self.file = file
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._pid = None
+        self._stored = 0
+        self._inserts = {}  # Buffered new entries by key
+        self._last_used = {}  # Buffered last use of hits by key
+
+    def __getstate__(self):
+        # Connections cannot be shared between processes, every process opens its own. The buffered writes are left to
+        # the process that made them.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        state['_inserts'] = {}
+        state['_last_used'] = {}
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None or not self._pid == os.getpid():
+            if not self._pid == os.getpid():
+                if self._pid is not None:  # a forked process, the parent writes its own buffer
+                    self._inserts, self._last_used = {}, {}
+                Finalize(self, self.flush, exitpriority=0)
+            self._connection = sqlite3.connect(self.file, timeout=60)
+            self._pid = os.getpid()
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS simplified '
+                '(key BLOB PRIMARY KEY, wkb BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS simplified_last_used ON simplified (last_used)')
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def key(max_points, shape):
+        """
+        :param max_points: the point budget of the simplification
+        :param shape: a shapely geometry
+        :return: the cache key as bytes
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(shapely.to_wkb(shape))
+        digest.update('{}:{}'.format(max_points, SIMPLIFY_VERSION).encode())
+        return digest.digest()
+
+    def simplify(self, max_points, shape):
+        """
+        Drop-in replacement for GeoVectorizer.simplify, returning the stored simplification if there is one
+        :param max_points: the maximum number of points of the simplified geometry
+        :param shape: a shapely geometry
+        :return: the simplified shapely geometry
+        """
+        key = SimplifyCache.key(max_points, shape)
+        connection = self.connection
+        if key in self._inserts:
+            wkb, size, _ = self._inserts[key]
+            self._inserts[key] = (wkb, size, time())
+            return shapely.from_wkb(wkb)
+
+        row = connection.execute('SELECT wkb FROM simplified WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self._last_used[key] = time()
+            self._flush_every_interval()
+            return shapely.from_wkb(row[0])
+
+        simplified = GeoVectorizer.simplify(max_points, shape)
+        wkb = shapely.to_wkb(simplified)
+        self._inserts[key] = (wkb, len(wkb), time())
+        self._flush_every_interval()
+
+        self._stored += 1
+        if self._stored % EVICTION_INTERVAL == 0:
+            self.evict()
+        return simplified
+
+    def flush(self):
+        """
+        Write the buffered new entries and last uses to the database in one transaction
+        """
+        if not self._inserts and not self._last_used:
+            return
+        self.connection.executemany('INSERT OR REPLACE INTO simplified VALUES (?, ?, ?, ?)',
+                                    [(key,) + entry for key, entry in self._inserts.items()])
+        self.connection.executemany('UPDATE simplified SET last_used = ? WHERE key = ?',
+                                    [(last_used, key) for key, last_used in self._last_used.items()])
+        self.connection.commit()
+        self._inserts, self._last_used = {}, {}
+
+    def _flush_every_interval(self):
+        if len(self._inserts) + len(self._last_used) >= COMMIT_INTERVAL:
+            self.flush()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the stored geometries take up less than max_bytes
+        """
+        self.flush()
+        size = self.size()
+        if size <= self.max_bytes:
+            return
+
+        rows = self.connection.execute('SELECT key, size FROM simplified ORDER BY last_used')
+        evicted = []
+        for key, entry_size in rows:
+            if size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        self.connection.executemany('DELETE FROM simplified WHERE key = ?', evicted)
+        self.connection.commit()
+
+    def size(self):
+        """
+        :return: the summed size in bytes of the stored geometries
+        """
+        self.flush()
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM simplified').fetchone()[0]
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) FROM simplified').fetchone()[0]
+
+    def clear(self):
+        self._inserts, self._last_used = {}, {}
+        self.connection.execute('DELETE FROM simplified')
+        self.connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
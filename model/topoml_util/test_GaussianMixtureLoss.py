@@ -1,9 +1,11 @@
 import unittest
 import tensorflow as tf
 import numpy as np
+from keras import backend as K
 
 from topoml_util.test_files import gmm_output
 from topoml_util.GaussianMixtureLoss import GaussianMixtureLoss
+from topoml_util import np_gmm_loss
 
 sess = tf.InteractiveSession()
 DATA_FILE = '../files/geodata_vectorized.npz'
@@ -16,6 +18,24 @@ class TestGaussianMixtureLoss(unittest.TestCase):
         loss = GaussianMixtureLoss(num_components=5, num_points=14).geom_gaussian_mixture_loss(true, pred)
         print(loss.eval())
 
+    def test_numpy_parity(self):
+        true = np.array([gmm_output.target, gmm_output.target[::-1]])
+        pred = np.array([gmm_output.prediction, gmm_output.prediction])
+        loss = GaussianMixtureLoss(num_components=5, num_points=14).geom_gaussian_mixture_loss(true, pred)
+        expected = np_gmm_loss.GaussianMixtureLoss(num_components=5).geom_gaussian_mixture_loss(true, pred)
+        np.testing.assert_allclose(K.eval(loss), expected, rtol=1e-5)
+
+    def test_numpy_parity_far_off(self):
+        # A point far off every component, where the loss is clamped at -log(epsilon) per component
+        true = np.array([[[0., 0., 1., 0., 0.]]])
+        pred = np.array([[[1e6, 1e6, 0., 0., 0., 0., 1e6, -1e6, 0., 0., 0., 0., 1., 0., 0.]]])
+        loss = K.eval(GaussianMixtureLoss(num_components=2, num_points=1).geom_gaussian_mixture_loss(true, pred))
+        expected = np_gmm_loss.GaussianMixtureLoss(num_components=2).geom_gaussian_mixture_loss(true, pred)
+        np.testing.assert_allclose(loss, expected, rtol=1e-5)
+        pred[..., [0, 1, 6, 7]] *= 1e3
+        further_off = GaussianMixtureLoss(num_components=2, num_points=1).geom_gaussian_mixture_loss(true, pred)
+        np.testing.assert_allclose(K.eval(further_off), loss)
+
     def test_single_gaussian_loss(self):
         true = np.array([
             [1., 1., 0.],
@@ -0,0 +1,110 @@
+import io
+import unittest
+
+import numpy as np
+
+from topoml_util.GeoTensor import GeoTensor
+from topoml_util.GeoVectorizer import GeoVectorizer, FULL_STOP_INDEX, GEO_VECTOR_LEN
+
+wkts = [
+    'POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))',
+    'POINT(12 14)',
+    'GEOMETRYCOLLECTION EMPTY',
+    'POLYGON((0 0, 2 0, 2 1, 0 0))',
+    'POLYGON((5 5, 6 5, 6 6, 5 6, 5.5 5.5, 5 5))',
+]
+vectors, lengths = GeoVectorizer.vectorize_wkts(wkts, 8)
+
+
+class TestGeoTensor(unittest.TestCase):
+    def test_from_wkts(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        self.assertEqual(len(tensor), len(wkts))
+        self.assertEqual(tensor.lengths.tolist(), lengths.tolist())
+        self.assertEqual(tensor.coords.shape, (np.sum(lengths), 2))
+        self.assertEqual(tensor.actions.dtype, np.uint8)
+        self.assertEqual(tensor.offsets.dtype, np.int32)
+
+    def test_from_padded(self):
+        tensor = GeoTensor.from_padded(vectors)
+        self.assertEqual(tensor.lengths.tolist(), lengths.tolist())
+        np.testing.assert_array_equal(tensor.to_padded(8), vectors)
+
+    def test_from_geoms(self):
+        geoms = [vector[:length] for vector, length in zip(vectors, lengths)]
+        tensor = GeoTensor.from_geoms(geoms)
+        for geom, expected in zip(tensor.to_geoms(), geoms):
+            np.testing.assert_array_equal(geom, expected)
+
+    def test_getitem(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        np.testing.assert_array_equal(tensor[0], vectors[0, :lengths[0]])
+        np.testing.assert_array_equal(tensor[-1], vectors[-1, :lengths[-1]])
+        self.assertEqual(tensor[0].shape, (5, GEO_VECTOR_LEN))
+
+    def test_slice(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        sliced = tensor[1:4]
+        self.assertEqual(len(sliced), 3)
+        self.assertTrue(np.shares_memory(sliced.coords, tensor.coords))
+        np.testing.assert_array_equal(sliced.to_padded(8), vectors[1:4])
+
+    def test_fancy_index(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        np.testing.assert_array_equal(tensor[[4, 0, 1]].to_padded(8), vectors[[4, 0, 1]])
+        np.testing.assert_array_equal(tensor[lengths > 1].to_padded(8), vectors[lengths > 1])
+
+    def test_to_padded(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        self.assertEqual(tensor.to_padded().shape, (len(wkts), 6, GEO_VECTOR_LEN))
+        self.assertEqual(tensor.to_padded(dtype=np.float32).dtype, np.float32)
+        with self.assertRaises(ValueError):
+            tensor.to_padded(4)
+
+    def test_save_load(self):
+        tensor = GeoTensor.from_wkts(wkts)
+        file = io.BytesIO()
+        tensor.save(file)
+        file.seek(0)
+        loaded = GeoTensor.load(file)
+        np.testing.assert_array_equal(loaded.to_padded(8), vectors)
+
+    def test_multipolygon_round_trip(self):
+        multipolygons = ['MULTIPOLYGON(((0 0, 1 0, 1 1, 0 0)), ((5 5, 6 5, 6 6, 5 5)))', 'NOT A WKT', wkts[0]]
+        expected, expected_lengths = GeoVectorizer.vectorize_wkts(multipolygons, 12, errors='dummy')
+        self.assertTrue(np.all(expected[0, 8:, FULL_STOP_INDEX] == 1))
+
+        tensor = GeoTensor.from_padded(expected, expected_lengths)
+        self.assertEqual(tensor.full_stop_padding.tolist(), [True, True, False])
+        np.testing.assert_array_equal(tensor.to_padded(), expected)
+        np.testing.assert_array_equal(tensor[[2, 0]].to_padded(), expected[[2, 0]])
+        np.testing.assert_array_equal(GeoTensor.from_padded(expected).to_padded(), expected)
+
+        file = io.BytesIO()
+        tensor.save(file)
+        file.seek(0)
+        np.testing.assert_array_equal(GeoTensor.load(file).to_padded(), expected)
+
+        from_wkts = GeoTensor.from_wkts(multipolygons[::2], 12)
+        np.testing.assert_array_equal(from_wkts.to_padded(), expected[::2])
+
+    def test_concatenate(self):
+        tensor = GeoTensor.from_wkts(wkts, 8)
+        concatenated = GeoTensor.concatenate([tensor[:2], tensor[2:]])
+        np.testing.assert_array_equal(concatenated.to_padded(), vectors)
+
+    def test_arrays(self):
+        tensor = GeoTensor.from_wkts(wkts, 8)
+        file = io.BytesIO()
+        np.savez_compressed(file, labels=np.arange(len(wkts)), **tensor.to_arrays('geoms'))
+        file.seek(0)
+        with np.load(file, allow_pickle=False) as loaded:
+            np.testing.assert_array_equal(GeoTensor.from_arrays(loaded, 'geoms').to_padded(), vectors)
+            self.assertEqual(len(loaded['labels']), len(wkts))
+
+    def test_legacy_arrays(self):
+        geoms = np.empty(len(wkts), dtype=object)
+        geoms[:] = [vector[:length] for vector, length in zip(vectors, lengths)]
+        legacy = {'geoms': geoms, 'fixed_size_geoms': vectors}
+        np.testing.assert_array_equal(GeoTensor.from_arrays(legacy, 'geoms').to_padded(8), vectors)
+        np.testing.assert_array_equal(GeoTensor.from_arrays(legacy, 'fixed_size_geoms').to_padded(), vectors)
@@ -2,7 +2,8 @@ import unittest
 
 import numpy as np
 import pandas
-from GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN
+import shapely
+from GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN, RENDER_INDEX, STOP_INDEX, FULL_STOP_INDEX
 from shapely import wkt as wktreader
 
 TOPOLOGY_CSV = 'test_files/polygon_multipolygon.csv'
@@ -25,31 +26,6 @@ input_geom = np.array([
     [0., 0., 0., 0., 0.]
 ])
 
-output_geom = np.array([
-    [0.0, 0.00, 1., 0., 0.],
-    [0.0, 0.25, 1., 0., 0.],
-    [0.0, 0.50, 1., 0., 0.],
-    [0.0, 0.75, 1., 0., 0.],
-    [0.0, 1.00, 1., 0., 0.],
-    [0.25, 1.0, 1., 0., 0.],
-    [0.50, 1.0, 1., 0., 0.],
-    [1.0, 1.00, 1., 0., 0.],
-    [1.0, 0.50, 1., 0., 0.],
-    [1.0, 0.00, 1., 0., 0.],
-    [0.5, 0.00, 1., 0., 0.],
-    [0.0, 0.00, 0., 1., 0.],
-    [0.0, 0.00, 1., 0., 0.],
-    [0.0, -0.5, 1., 0., 0.],
-    [0.0, -1.0, 1., 0., 0.],
-    [-0.5, -1., 1., 0., 0.],
-    [-1., -1.0, 1., 0., 0.],
-    [-1., -0.5, 1., 0., 0.],
-    [-1., 0.00, 1., 0., 0.],
-    [-0.5, 0.0, 1., 0., 0.],
-    [0.00, 0.0, 0., 0., 1.],
-    [0.00, 0.0, 0., 0., 0.]
-])
-
 non_empty_geom_collection = 'GEOMETRYCOLLECTION(LINESTRING(1 1, 3 5),POLYGON((-1 -1, -1 -5, -5 -5, -5 -1, -1 -1)))'
 
 
@@ -58,12 +34,35 @@ class TestVectorizer(unittest.TestCase):
         max_points = GeoVectorizer.max_points(brt_wkt, osm_wkt)
         self.assertEqual(max_points, 159)
 
-    # def test_interpolate(self):
-    #     interpolated = GeoVectorizer.interpolate(input_geom, len(input_geom) * 2)
-    #     for index, _ in enumerate(interpolated):
-    #         result = list(interpolated[index])
-    #         expected = list(output_geom[index])
-    #         self.assertListEqual(result, expected, msg='Lists differ at index %i' % index)
+    def test_num_points(self):
+        num_points = GeoVectorizer.num_points(brt_wkt)
+        self.assertEqual(num_points.shape, (len(brt_wkt),))
+        self.assertEqual(num_points.tolist(), [GeoVectorizer.num_points_from_wkt(wkt) for wkt in brt_wkt])
+
+    def test_num_points_3d(self):
+        wkts = ['POLYGON Z ((0 0 1, 1 0 1, 1 1 2, 0 0 1))', 'POINT Z (1 2 3)', 'GEOMETRYCOLLECTION EMPTY']
+        self.assertEqual(GeoVectorizer.num_points(wkts).tolist(), [4, 1, 0])
+        self.assertEqual(GeoVectorizer.num_points_from_wkt(wkts[0]), 4)
+
+    def test_interpolate(self):
+        interpolated = GeoVectorizer.interpolate(input_geom, 9)
+        self.assertEqual(interpolated.shape, (18, GEO_VECTOR_LEN))
+        np.testing.assert_array_almost_equal(interpolated[:9, :2], [
+            [0, 0], [0, .5], [0, 1], [.5, 1], [1, 1], [1, .5], [1, 0], [.5, 0], [0, 0]])
+        np.testing.assert_array_almost_equal(interpolated[9:, :2], [
+            [0, 0], [0, -.5], [0, -1], [-.5, -1], [-1, -1], [-1, -.5], [-1, 0], [-.5, 0], [0, 0]])
+        self.assertEqual(interpolated[8, STOP_INDEX], 1)
+        self.assertEqual(interpolated[17, FULL_STOP_INDEX], 1)
+        self.assertEqual(np.sum(interpolated[:, 2:]), 18)
+
+    def test_interpolate_batch(self):
+        vectorized, _ = GeoVectorizer.vectorize_wkts(target_wkt, 200)
+        interpolated = GeoVectorizer.interpolate(vectorized, 10)
+        self.assertEqual(interpolated.shape[0], len(target_wkt))
+        for vector, result in zip(vectorized, interpolated):
+            expected = GeoVectorizer.interpolate(vector, 10)
+            np.testing.assert_array_almost_equal(result[:len(expected)], expected)
+            self.assertFalse(np.any(result[len(expected):]))
 
     def test_vectorize_one_wkt(self):
         max_points = 20
@@ -81,6 +80,167 @@ class TestVectorizer(unittest.TestCase):
         vectorized = [GeoVectorizer.vectorize_wkt(wkt, max_points, simplify=True, fixed_size=True) for wkt in input_set]
         self.assertEqual(np.array(vectorized).shape, (input_set.size, 20, GEO_VECTOR_LEN))
 
+    def test_vectorize_wkts(self):
+        max_points = 20
+        input_set = SOURCE_DATA['intersection_wkt']
+        vectorized, lengths = GeoVectorizer.vectorize_wkts(input_set, max_points, simplify=True)
+        self.assertEqual(vectorized.shape, (input_set.size, max_points, GEO_VECTOR_LEN))
+        self.assertEqual(lengths[0], 19)
+        self.assertEqual(lengths[1], 1)
+        for index, wkt in enumerate(input_set):
+            expected = GeoVectorizer.vectorize_wkt(wkt, max_points, simplify=True, fixed_size=True)
+            np.testing.assert_array_equal(vectorized[index], expected)
+
+    def test_vectorize_wkts_out(self):
+        max_points = 20
+        input_set = SOURCE_DATA['intersection_wkt']
+        out = np.ones((input_set.size, max_points, GEO_VECTOR_LEN))
+        vectorized, _ = GeoVectorizer.vectorize_wkts(input_set, max_points, simplify=True, out=out)
+        self.assertIs(vectorized, out)
+        np.testing.assert_array_equal(out, GeoVectorizer.vectorize_wkts(input_set, max_points, simplify=True)[0])
+
+    def test_vectorize_wkts_multipolygon(self):
+        with open('test_files/big_multipolygon_wkt.txt', 'r') as file:
+            wkt = file.read()
+            vectorized, lengths = GeoVectorizer.vectorize_wkts([wkt, 'POINT(12 14)'], 150)
+            np.testing.assert_array_equal(vectorized[0], GeoVectorizer.vectorize_wkt(wkt, 150))
+            self.assertEqual(lengths.tolist(), [144, 1])
+
+    def test_vectorize_wkts_dummy(self):
+        input_set = ['POLYGON((0 0, 1 0, 1 1, 0 0))', 'NOT A WKT', 'LINESTRING(0 0, 1 1)',
+                     'POLYGON((0 0, 1 0, 1 1, 0 1, 0.5 0.5, 0 0))']
+        with self.assertRaises(Exception):
+            GeoVectorizer.vectorize_wkts(input_set, 5)
+        vectorized, lengths = GeoVectorizer.vectorize_wkts(input_set, 5, errors='dummy')
+        self.assertEqual(lengths.tolist(), [4, 0, 0, 0])
+        np.testing.assert_array_equal(vectorized[0], GeoVectorizer.vectorize_wkt(input_set[0], 5, fixed_size=True))
+        self.assertTrue(np.all(vectorized[1:, :, FULL_STOP_INDEX] == 1))
+        self.assertTrue(np.all(vectorized[1:, :, :FULL_STOP_INDEX] == 0))
+
+    def test_vectorize_wkts_return_dummies(self):
+        input_set = ['POLYGON((0 0, 1 0, 1 1, 0 0))', 'NOT A WKT', 'POLYGON EMPTY']
+        _, lengths, dummies = GeoVectorizer.vectorize_wkts(input_set, 5, errors='dummy', return_dummies=True)
+        self.assertEqual(lengths.tolist(), [4, 0, 0])
+        self.assertEqual(dummies.tolist(), [False, True, False])
+        pairs = ['POLYGON((0 0, 1 0, 1 1, 0 0))', 'POLYGON EMPTY', 'NOT A WKT']
+        _, _, dummies = GeoVectorizer.vectorize_wkt_pairs(pairs, pairs, 9, errors='dummy', return_dummies=True)
+        self.assertEqual(dummies.tolist(), [False, False, True])
+
+    def test_vectorize_two_wkts(self):
+        max_points = GeoVectorizer.max_points(brt_wkt, osm_wkt)
+        brt_vector = GeoVectorizer.vectorize_wkt(brt_wkt[0], max_points)
+        osm_vector = GeoVectorizer.vectorize_wkt(osm_wkt[0], max_points)[:GeoVectorizer.num_points_from_wkt(osm_wkt[0])]
+        vectorized = GeoVectorizer.vectorize_two_wkts(brt_wkt[0], osm_wkt[0], max_points)
+        self.assertEqual(len(vectorized), len(brt_vector) + len(osm_vector))
+        self.assertEqual(vectorized[len(brt_vector) - 1, STOP_INDEX], 1)
+        self.assertEqual(vectorized[len(brt_vector) - 1, FULL_STOP_INDEX], 0)
+        np.testing.assert_array_equal(vectorized[len(brt_vector):], osm_vector)
+
+    def test_vectorize_wkt_pairs(self):
+        max_points = GeoVectorizer.max_points(brt_wkt, osm_wkt)
+        vectorized, lengths = GeoVectorizer.vectorize_wkt_pairs(brt_wkt, osm_wkt, max_points)
+        self.assertEqual(vectorized.shape, (len(brt_wkt), max_points, GEO_VECTOR_LEN))
+        for index, (brt, osm) in enumerate(zip(brt_wkt, osm_wkt)):
+            expected = GeoVectorizer.vectorize_two_wkts(brt, osm, max_points, fixed_size=True)
+            np.testing.assert_array_equal(vectorized[index], expected)
+            self.assertEqual(lengths[index], GeoVectorizer.num_points_from_wkt(brt) +
+                             GeoVectorizer.num_points_from_wkt(osm))
+
+    def test_vectorize_wkt_pairs_exceed_max_points(self):
+        pairs = ['POLYGON((0 0, 1 0, 1 1, 0 0))', 'POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))']
+        with self.assertRaises(ValueError):
+            GeoVectorizer.vectorize_wkt_pairs(pairs, pairs[::-1], 8)
+        vectorized, lengths = GeoVectorizer.vectorize_wkt_pairs(pairs, pairs, 9, errors='dummy')
+        self.assertEqual(lengths.tolist(), [8, 0])
+        self.assertTrue(np.all(vectorized[1, :, FULL_STOP_INDEX] == 1))
+
+    def test_vectorize_input_types(self):
+        wkt = 'POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))'
+        shape = wktreader.loads(wkt)
+        coords = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])  # unclosed rings are closed
+        expected = GeoVectorizer.vectorize_wkt(wkt, 5)
+        for geom in [shape, shape.wkb, coords, coords.tolist()]:
+            np.testing.assert_array_equal(GeoVectorizer.vectorize_wkt(geom, 5), expected)
+
+        vectorized, lengths = GeoVectorizer.vectorize_wkts([wkt, shape.wkb, shape, coords, [[12, 14]]], 5)
+        self.assertEqual(lengths.tolist(), [5, 5, 5, 5, 1])
+        np.testing.assert_array_equal(vectorized[4], GeoVectorizer.vectorize_wkt('POINT(12 14)', 5, fixed_size=True))
+
+    def test_to_shapes(self):
+        shapes = GeoVectorizer.to_shapes(['POINT(1 2)', 'not a geometry', [[0, 0], [1, 0], [1, 1]]],
+                                         on_invalid='ignore')
+        self.assertEqual(shapes[0].wkt, 'POINT (1 2)')
+        self.assertIsNone(shapes[1])
+        self.assertEqual(shapes[2].geom_type, 'Polygon')
+        with self.assertRaises(shapely.errors.GEOSException):
+            GeoVectorizer.to_shapes(['not a geometry'])
+
+    def test_vectorize_dtype(self):
+        vectorized, _ = GeoVectorizer.vectorize_wkts(brt_wkt, 200, dtype=np.float32)
+        self.assertEqual(vectorized.dtype, np.float32)
+        self.assertEqual(GeoVectorizer.vectorize_wkt(brt_wkt[0], 200, dtype=np.float16).dtype, np.float16)
+
+    def test_pack_actions(self):
+        vectorized, _ = GeoVectorizer.vectorize_wkts(brt_wkt, 200)
+        coords, actions = GeoVectorizer.pack_actions(vectorized, dtype=np.float32)
+        self.assertEqual(coords.shape, vectorized.shape[:-1] + (2,))
+        self.assertEqual(coords.dtype, np.float32)
+        self.assertEqual(actions.dtype, np.uint8)
+        self.assertEqual(actions[0, 0], 0)  # render
+        self.assertEqual(actions[0, -1], 3)  # padding
+        unpacked = GeoVectorizer.unpack_actions(coords, actions, dtype=np.float64)
+        np.testing.assert_array_equal(unpacked[..., 2:], vectorized[..., 2:])
+        np.testing.assert_allclose(unpacked[..., :2], vectorized[..., :2], rtol=1e-6)
+
+    def test_decypher_all(self):
+        vectorized, _ = GeoVectorizer.vectorize_wkts(target_wkt, 200)
+        decyphered = GeoVectorizer.decypher_all(vectorized)
+        for wkt, geom in zip(target_wkt, decyphered):
+            self.assertTrue(wktreader.loads(wkt).equals_exact(geom, 0), msg='{} != {}'.format(wkt, geom.wkt))
+
+        self.assertEqual(GeoVectorizer.decypher_all(vectorized[1:2], as_wkt=True)[0], 'GEOMETRYCOLLECTION EMPTY')
+        self.assertEqual(GeoVectorizer.decypher(GeoVectorizer.vectorize_wkt('POINT(12 14)', 1)), 'POINT (12 14)')
+
+    def test_simplify_holes(self):
+        exterior = [(np.cos(angle) * 10, np.sin(angle) * 10) for angle in np.linspace(0, 2 * np.pi, 60)[:-1]]
+        holes = [[(x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)] for x, y in [(-5, -5), (2, 2), (-5, 2)]]
+        shape = shapely.MultiPolygon([shapely.Polygon(exterior, holes), shapely.Polygon([(20, 0), (21, 0), (21, 1)])])
+        vectorized = GeoVectorizer.vectorize_wkt(shape, 32, simplify=True)
+        # Only the exterior rings are vectorized, they take up all of max_points
+        self.assertEqual(len(vectorized), 32)
+        self.assertTrue(np.all(vectorized[:, RENDER_INDEX:].sum(axis=1) == 1))
+        self.assertEqual(GeoVectorizer.vectorize_wkt(shapely.Polygon(exterior, holes), 64, simplify=True).shape,
+                         (60, GEO_VECTOR_LEN))
+
+    def test_decypher_soft_actions(self):
+        vectorized, _ = GeoVectorizer.vectorize_wkts(target_wkt, 200)
+        # Soft scores as from a model prediction, with the one-hot action still scoring highest
+        predicted = vectorized.copy()
+        actions = predicted[..., 2:]
+        is_padding = np.all(actions == 0, axis=-1)
+        actions[~is_padding] = actions[~is_padding] * 0.6 + 0.1
+        self.assertTrue(np.all((actions[~is_padding] > 0) & (actions[~is_padding] < 1)))
+        np.testing.assert_array_equal(GeoVectorizer.pack_actions(predicted)[1],
+                                      GeoVectorizer.pack_actions(vectorized)[1])
+        np.testing.assert_array_equal(GeoVectorizer.infer_lengths(predicted), GeoVectorizer.infer_lengths(vectorized))
+        for expected, geom in zip(GeoVectorizer.decypher_all(vectorized), GeoVectorizer.decypher_all(predicted)):
+            self.assertTrue(expected.equals_exact(geom, 0))
+        self.assertFalse(all(geom.is_empty for geom in GeoVectorizer.decypher_all(predicted)))
+
+    def test_decypher_multipolygon(self):
+        with open('test_files/multipart_multipolygon_wkt.txt', 'r') as file:
+            shape = wktreader.loads(file.read())
+            vectorized = GeoVectorizer.vectorize_wkt(shape, GeoVectorizer.num_points([shape])[0])
+            decyphered = GeoVectorizer.decypher_all([vectorized])[0]
+            self.assertEqual(decyphered.geom_type, 'MultiPolygon')
+            self.assertEqual(len(decyphered.geoms), len(shape.geoms))
+            for part, decyphered_part in zip(shape.geoms, decyphered.geoms):
+                self.assertTrue(part.exterior.equals_exact(decyphered_part.exterior, 0))
+
+    def test_decypher_stop(self):
+        decyphered = GeoVectorizer.decypher_all([input_geom])[0]
+        self.assertEqual(decyphered.wkt, 'MULTIPOLYGON (((0 0, 0 1, 1 1, 1 0, 0 0)), ((0 0, 0 -1, -1 -1, -1 0, 0 0)))')
+
     def test_non_empty_geom_coll(self):
         with self.assertRaises(ValueError):
             GeoVectorizer.vectorize_wkt(non_empty_geom_collection, 100)
@@ -109,6 +269,28 @@ class TestVectorizer(unittest.TestCase):
             vectorized = GeoVectorizer.vectorize_wkt(wkt, max_points, simplify=True)
             self.assertEqual((20, GEO_VECTOR_LEN), vectorized.shape)
 
+    def test_simplify_exact_max_points(self):
+        with open('test_files/big_multipolygon_wkt.txt', 'r') as file:
+            shape = wktreader.loads(file.read())
+            for max_points in [8, 20, 64]:
+                simplified = GeoVectorizer.simplify(max_points, shape)
+                self.assertEqual(simplified.geom_type, 'MultiPolygon')
+                self.assertEqual(GeoVectorizer.num_points([simplified])[0], max_points)
+
+                polygon = GeoVectorizer.simplify(max_points, shape.geoms[0])
+                self.assertEqual(polygon.geom_type, 'Polygon')
+                self.assertEqual(GeoVectorizer.num_points([polygon])[0], max_points)
+
+    def test_simplify_no_padding(self):
+        with open('test_files/big_multipolygon_wkt.txt', 'r') as file:
+            wkt = file.read()
+            _, lengths = GeoVectorizer.vectorize_wkts([wkt], 64, simplify=True)
+            self.assertEqual(lengths[0], 64)
+
+    def test_simplify_below_polygon_minimum(self):
+        with self.assertRaises(ValueError):
+            GeoVectorizer.simplify(3, wktreader.loads('POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))'))
+
     def test_multipolygon_exceed_max_points(self):
         with open('test_files/multipart_multipolygon_wkt.txt', 'r') as file:
             wkt = file.read()
@@ -1,4 +1,6 @@
 import unittest
+
+import numpy as np
 import pandas
 from Tokenizer import Tokenize
 
@@ -63,3 +65,50 @@ class TestUtil(unittest.TestCase):
         tokenized = tokenizer.char_level_tokenize(test_strings)
         detokenized = tokenizer.decypher(tokenized)
         self.assertEqual(detokenized, test_strings)
+
+    def test_one_hot_indices(self):
+        test_strings = ['A test string', 'string']
+        tokenizer = Tokenize(test_strings[:1])
+        indices = tokenizer.one_hot_indices(test_strings, 15)
+        self.assertEqual(indices[1].tolist(), [3, 1, 6, 7, 8, 9] + [0] * 9)
+        one_hot = tokenizer.one_hot(test_strings, 15)
+        self.assertTrue(((np.arange(10) == indices[..., np.newaxis]) & (indices[..., np.newaxis] > 0) == one_hot).all())
+
+    def test_one_hot_unknown_character(self):
+        tokenizer = Tokenize(['A test string'])
+        with self.assertRaises(KeyError):
+            tokenizer.one_hot(['A test strong'], 15)
+
+    def test_detokenize_unknown_index(self):
+        tokenizer = Tokenize(['A test string'])
+        # Keras may lowercase the characters, so take them from the word index
+        index_chars = {index: char for char, index in tokenizer.word_index.items()}
+        first, second = tokenizer.char_level_tokenize(['At'])[0]
+        self.assertEqual(tokenizer.decypher([[first, 0, second, 99], []]),
+                         [index_chars[first] + ' ' + index_chars[second] + ' ', ''])
+        self.assertEqual(tokenizer.decypher(np.array(tokenizer.char_level_tokenize(['test']))), ['test'])
+
+    def test_flat_tokenize(self):
+        test_strings = ['A test string', '', 'string\t']
+        tokenizer = Tokenize(test_strings[:1])
+        sequences, offsets = tokenizer.flat_tokenize(test_strings)
+        self.assertEqual(sequences.dtype, np.uint8)
+        self.assertEqual(offsets.tolist(), [0, 13, 13, 19])
+        self.assertEqual([sequences[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])],
+                         tokenizer.char_level_tokenize(test_strings))
+
+    def test_truncate_masks(self):
+        lengths = np.array([3, 8, 5, 2, 9, 4, 1])
+        self.assertEqual(Tokenize.truncate_mask(lengths, 4).tolist(), [True, False, False, True, False, True, True])
+        mask = Tokenize.batch_truncate_mask(lengths, 1, 5, 0.5)
+        self.assertEqual(mask.tolist(), [True, False, True, True, False, True, False])
+        sequences, offsets = Tokenize.select(np.arange(32), np.concatenate([[0], np.cumsum(lengths)]), mask)
+        self.assertEqual(offsets.tolist(), [0, 3, 8, 10, 14])
+        self.assertEqual(sequences.tolist(), [0, 1, 2, 11, 12, 13, 14, 15, 16, 17, 27, 28, 29, 30])
+
+    def test_flat_tokenize_mixed_case(self):
+        test_strings = ['POLYGON ((0 0, 1 0, 1 1, 0 0))', 'Polygon ((2 2, 3 2, 3 3, 2 2))', 'MultiPolygon EMPTY']
+        tokenizer = Tokenize(test_strings)
+        sequences, offsets = tokenizer.flat_tokenize(test_strings)
+        self.assertEqual([sequences[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])],
+                         tokenizer.texts_to_sequences(test_strings))
@@ -0,0 +1,44 @@
+import os
+import unittest
+
+import numpy as np
+import pandas
+from shapely import wkt as wktreader
+
+from topoml_util.GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN
+from topoml_util.featurizer import RecordFeaturizer
+from topoml_util.geom_fourier_descriptors import create_geom_fourier_descriptor
+
+TOPOLOGY_CSV = os.path.join(os.path.dirname(__file__), 'test_files/polygon_multipolygon.csv')
+SOURCE_DATA = pandas.read_csv(TOPOLOGY_CSV)
+osm_wkt = SOURCE_DATA['osm_wkt'].values
+
+
+class TestFeaturizer(unittest.TestCase):
+    def test_featurize(self):
+        featurizer = RecordFeaturizer(16, 32, 8)
+        for wkt in osm_wkt:
+            geom, fixed_size_geom, efds, simplified = featurizer.featurize(wkt)
+            shape = wktreader.loads(wkt)
+            geom_len = min(GeoVectorizer.num_points_from_wkt(wkt), 32)
+            np.testing.assert_array_equal(geom, GeoVectorizer.vectorize_wkt(wkt, geom_len, simplify=True))
+            np.testing.assert_array_equal(fixed_size_geom, GeoVectorizer.vectorize_wkt(wkt, 16, simplify=True,
+                                                                                       fixed_size=True))
+            largest = sorted(shape.geoms, key=lambda x: x.area)[-1]
+            np.testing.assert_array_equal(efds, create_geom_fourier_descriptor(largest, 8))
+            self.assertEqual(simplified, geom_len == 32)
+
+    def test_featurize_all(self):
+        featurizer = RecordFeaturizer(16, 32, 8)
+        wkts = list(osm_wkt) + ['POINT(1 2)', 'POLYGON((0 0, 0 0, 0 0, 0 0))']
+        columns, errors = featurizer.featurize_all(wkts, workers=2)
+        self.assertEqual([index for index, _ in errors], [len(osm_wkt), len(osm_wkt) + 1])
+        self.assertEqual(columns['valid'].tolist(), [True] * len(osm_wkt) + [False, False])
+        self.assertEqual(columns['elliptic_fourier_descriptors'].shape, (len(wkts), 3 + 8 * 8))
+        self.assertEqual(columns['geoms'].lengths[-2], 0)
+        self.assertEqual(columns['fixed_size_geoms'].to_padded().shape, (len(wkts), 16, GEO_VECTOR_LEN))
+        for index, wkt in enumerate(osm_wkt):
+            geom, fixed_size_geom, efds, _ = featurizer.featurize(wkt)
+            np.testing.assert_array_equal(columns['geoms'][index], geom)
+            np.testing.assert_array_equal(columns['fixed_size_geoms'].to_padded()[index], fixed_size_geom)
+            np.testing.assert_array_equal(columns['elliptic_fourier_descriptors'][index], efds)
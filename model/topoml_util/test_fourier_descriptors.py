@@ -1,6 +1,18 @@
+import os
 import unittest
+
 import numpy as np
+import pandas
 from pyefd import elliptic_fourier_descriptors
+from shapely import wkt as wktreader
+
+from topoml_util.GeoVectorizer import GeoVectorizer
+from topoml_util.geom_fourier_descriptors import centroid_distance_descriptors, descriptor_columns, \
+    efd_coefficients, fft_efd_coefficients, geom_centroid_distance_descriptors, geom_fourier_descriptors, \
+    normalize_efd_coefficients
+
+TOPOLOGY_CSV = os.path.join(os.path.dirname(__file__), 'test_files/polygon_multipolygon.csv')
+SOURCE_DATA = pandas.read_csv(TOPOLOGY_CSV)
 
 
 class TestFourierDescriptors(unittest.TestCase):
@@ -30,3 +42,106 @@ class TestFourierDescriptors(unittest.TestCase):
             np.testing.assert_array_almost_equal(descriptors1, descriptors2)
         except Exception as e:
             self.assertEqual('Arrays are not almost equal to 6 decimals', e.args[0][1:42])
+
+    def test_batch_descriptors(self):
+        contours = [
+            np.array([[0, 0], [1, 0], [1, 0.5], [1, 1], [0, 1], [0, 0]]),
+            np.array([[0, 0], [0.5, 0], [1, 0], [200, 300], [0, 1]]),
+            np.array([[0, 0], [0, 0], [2, 0], [2, 1], [2, 1], [0, 0]]),
+        ]
+        coeffs = efd_coefficients(contours, 16, chunk_size=8)
+        normalized = normalize_efd_coefficients(coeffs.copy())
+        for contour, contour_coeffs, normalized_coeffs in zip(contours, coeffs, normalized):
+            np.testing.assert_array_almost_equal(contour_coeffs, elliptic_fourier_descriptors(contour, order=16))
+            np.testing.assert_array_almost_equal(
+                normalized_coeffs, elliptic_fourier_descriptors(contour, order=16, normalize=True))
+
+    def test_geom_fourier_descriptors(self):
+        shapes = [wktreader.loads(wkt) for wkt in SOURCE_DATA['brt_wkt'].values]
+        descriptors = geom_fourier_descriptors(shapes, 8)
+        self.assertEqual(descriptors.shape, (len(shapes), 3 + 8 * 8))
+        for shape, descriptor in zip(shapes, descriptors):
+            boundary = shape.boundary
+            while boundary.geom_type == "MultiLineString":
+                boundary = boundary.geoms[0]
+            self.assertEqual(descriptor[0], shape.area)
+            self.assertEqual(descriptor[1:3].tolist(), [boundary.length, len(boundary.coords)])
+            harmonics = descriptor[3:].reshape(8, 8)
+            np.testing.assert_array_almost_equal(
+                harmonics[:, :4], elliptic_fourier_descriptors(boundary.coords, order=8))
+            np.testing.assert_array_almost_equal(
+                harmonics[:, 4:], elliptic_fourier_descriptors(boundary.coords, order=8, normalize=True))
+
+    def test_degenerate_contour(self):
+        with self.assertRaises(ValueError):
+            efd_coefficients([np.array([[0, 0], [1, 0]]), np.array([[1, 1], [1, 1]])], 4)
+
+    def test_fft_descriptors_error_bound(self):
+        random = np.random.RandomState(42)
+        samples = 1024
+        for _ in range(20):
+            # Jagged star shapes with random vertex counts, noise and aspect ratios
+            num_points = random.randint(200, 3000)
+            angles = np.sort(random.rand(num_points)) * 2 * np.pi
+            radii = 100 + 20 * np.sin(random.randint(2, 9) * angles) + random.choice([1, 10, 40]) * random.rand(
+                num_points)
+            contour = np.stack([random.uniform(0.3, 3) * radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+            exact = efd_coefficients([contour], 16)[0]
+            approximated = fft_efd_coefficients([contour], 16, samples=samples)[0]
+
+            # The summed absolute change in direction cosines over the corners bounds the aliasing error
+            segments = np.roll(contour, -1, axis=0) - contour
+            lengths = np.hypot(*segments.T)
+            derivatives = segments / lengths[:, None]
+            variation = np.sum(np.abs(derivatives - np.roll(derivatives, 1, axis=0)), axis=0)
+            bound = variation * np.sum(lengths) / (3 * samples ** 2)
+            errors = np.abs(approximated - exact)
+            self.assertTrue(np.all(errors[:, :2] <= bound[0]))
+            self.assertTrue(np.all(errors[:, 2:] <= bound[1]))
+            self.assertGreater(np.max(errors), 0)
+            # Which is at most twice the number of points
+            self.assertTrue(np.all(variation <= 2 * num_points))
+
+    def test_fft_descriptors_small_contours(self):
+        square = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+        np.testing.assert_array_equal(fft_efd_coefficients([square], 8), efd_coefficients([square], 8))
+        with self.assertRaises(ValueError):
+            fft_efd_coefficients([square], 8, samples=100)
+
+    def test_centroid_distance_descriptors(self):
+        shape = wktreader.loads(SOURCE_DATA['brt_wkt'].values[0])
+        contour = np.array(shape.exterior.coords)
+        descriptors = centroid_distance_descriptors([contour], 8, samples=64)[0]
+
+        boundary = shape.exterior
+        points = [boundary.interpolate(boundary.length * index / 64) for index in range(64)]
+        distances = np.array([boundary.centroid.distance(point) for point in points])
+        harmonics = np.abs(np.fft.fft(distances))
+        np.testing.assert_array_almost_equal(descriptors, harmonics[1:9] / harmonics[0])
+
+    def test_centroid_distance_descriptors_invariance(self):
+        contour = np.array([[0, 0], [4, 0], [4, 1], [1, 1], [1, 3], [0, 3], [0, 0]], dtype=float)
+        rotation = np.array([[np.cos(1), -np.sin(1)], [np.sin(1), np.cos(1)]])
+        transformed = contour @ rotation.T * 3 + [100, -20]
+        descriptors = centroid_distance_descriptors([contour, transformed, contour[::-1]], 6)
+        np.testing.assert_array_almost_equal(descriptors[0], descriptors[1])
+        np.testing.assert_array_almost_equal(descriptors[0], descriptors[2])
+
+    def test_geom_centroid_distance_descriptors(self):
+        wkts = SOURCE_DATA['brt_wkt'].values
+        vectors, lengths = GeoVectorizer.vectorize_wkts(wkts, 256)
+        contours = [np.array(shape.exterior.coords if shape.geom_type == 'Polygon' else shape.geoms[0].exterior.coords)
+                    for shape in [wktreader.loads(wkt) for wkt in wkts]]
+        expected = centroid_distance_descriptors(contours, 8)
+        np.testing.assert_array_equal(geom_centroid_distance_descriptors(vectors, 8), expected)
+        ragged = np.empty(len(vectors), dtype=object)
+        for index, (data_point, length) in enumerate(zip(vectors, lengths)):
+            ragged[index] = data_point[:length]
+        np.testing.assert_array_equal(geom_centroid_distance_descriptors(ragged, 8), expected)
+        with self.assertRaises(ValueError):
+            geom_centroid_distance_descriptors(np.zeros((1, 4, 5)), 8)
+
+    def test_descriptor_columns(self):
+        descriptors = np.zeros((2, 3 + 8 * 4 + 5))
+        self.assertEqual(descriptor_columns(descriptors, 1).tolist(), list(range(11)))
+        self.assertEqual(descriptor_columns(descriptors, 1, 5).tolist(), list(range(11)) + list(range(35, 40)))
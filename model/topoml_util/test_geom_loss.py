@@ -3,7 +3,8 @@ import numpy as np
 import tensorflow as tf
 from keras import backend as K
 
-from .gaussian_loss import geom_gaussian_loss, bivariate_gaussian_loss, univariate_gaussian_loss
+from .gaussian_loss import geom_gaussian_loss, bivariate_gaussian, bivariate_gaussian_loss, bivariate_gaussian_nll, \
+    univariate_gaussian_loss
 
 PRECISION = 6
 sess = tf.InteractiveSession()
@@ -43,6 +44,15 @@ class TestGeomLossFunction(unittest.TestCase):
 
 
 class TestGaussian2dLoss(unittest.TestCase):
+    def test_2d_gaussian_nll(self):
+        target = np.array([[[5, 52], [5, 52]]], dtype=float)
+        prediction = np.array([[[1, 2, 3, 4, 5], [4, 50, -1, 0.5, 0]]], dtype=float)
+        nll = K.eval(bivariate_gaussian_nll(target, prediction))
+        np.testing.assert_allclose(nll, -np.log(K.eval(bivariate_gaussian(target, prediction))), rtol=1e-5)
+        # Far off, where it is clamped at -log(epsilon)
+        prediction = np.array([[[1e6, 1e6, 0, 0, 0]]], dtype=float)
+        self.assertAlmostEqual(K.eval(bivariate_gaussian_loss(target[:, :1], prediction)), -np.log(K.epsilon()))
+
     def test_2d_gaussian_zeros(self):
         target = np.array([[[0, 0]]], dtype=float)
         prediction = np.array([[[0, 0, 0, 0, 0]]], dtype=float)
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 import numpy as np
@@ -89,3 +90,127 @@ class TestGeomScaler(unittest.TestCase):
         coords = [item for sublist in coords for item in sublist]
         std = np.std(coords)
         self.assertAlmostEqual(std, 1., 1)
+
+    def test_transform_dtype(self):
+        scale = gs.scale(square)
+        n_square = gs.transform(square, scale=scale, dtype=np.float32)
+        self.assertEqual(n_square.dtype, np.float32)
+        self.assertTrue((n_square == normalized_square).all())
+
+    def test_padded_equals_ragged(self):
+        padded = np.concatenate([square, rectangle, np.zeros((1, 5, 5))])
+        ragged = np.empty(len(padded), dtype=object)
+        for index, data_point in enumerate(padded):
+            ragged[index] = data_point.copy()
+        np.testing.assert_array_equal(gs.localized_mean(padded), gs.localized_mean(ragged))
+        self.assertEqual(gs.scale(padded), gs.scale(ragged))
+        transformed = gs.transform(padded, scale=0.5)
+        for expected, data_point in zip(gs.transform(ragged, scale=0.5), transformed):
+            np.testing.assert_array_equal(data_point, expected)
+
+    def test_geom_scaler_partial_fit(self):
+        vectors = np.concatenate([square, rectangle, square_duplicate_nodes[:, :5] * 3, dummy_geom.repeat(5, axis=1)])
+        scaler = gs.GeomScaler()
+        for chunk in np.array_split(vectors, 3):
+            scaler.partial_fit(chunk)
+        self.assertAlmostEqual(scaler.scale, gs.scale(vectors))
+        self.assertAlmostEqual(gs.GeomScaler().fit(vectors).scale, gs.scale(vectors))
+        np.testing.assert_array_almost_equal(scaler.transform(vectors), gs.transform(vectors, gs.scale(vectors)))
+
+    def test_geom_scaler_save_load(self):
+        file = io.BytesIO()
+        gs.GeomScaler().fit(rectangle).save(file)
+        file.seek(0)
+        loaded = gs.GeomScaler.load(file)
+        self.assertEqual(loaded.scale, gs.scale(rectangle))
+        loaded.partial_fit(square)
+        self.assertAlmostEqual(loaded.scale, gs.scale(np.concatenate([rectangle, square])))
+
+    def test_geom_scaler_not_fitted(self):
+        with self.assertRaises(ValueError):
+            gs.GeomScaler().transform(square)
+
+    def test_transform_inplace(self):
+        vectors = np.concatenate([square, rectangle, dummy_geom.repeat(5, axis=1)])
+        expected = gs.transform(vectors, scale=0.5)
+        transformed = gs.transform(vectors, scale=0.5, inplace=True, chunk_size=2)
+        self.assertIs(transformed, vectors)
+        np.testing.assert_array_equal(vectors, expected)
+
+    def test_transform_out(self):
+        vectors = np.concatenate([square, rectangle])
+        out = np.ones(vectors.shape, dtype=np.float32)
+        transformed = gs.transform(vectors, scale=0.5, out=out, chunk_size=1)
+        self.assertIs(transformed, out)
+        np.testing.assert_array_equal(out, gs.transform(vectors, scale=0.5, dtype=np.float32))
+
+    def test_transform_ragged_copy(self):
+        ragged = np.empty(2, dtype=object)
+        ragged[0], ragged[1] = square[0].copy(), rectangle[0].copy()
+        transformed = gs.transform(ragged, scale=0.5)
+        np.testing.assert_array_equal(ragged[0], square[0])
+        np.testing.assert_array_equal(transformed[0], normalized_square[0])
+        gs.transform(ragged, scale=0.5, inplace=True)
+        np.testing.assert_array_equal(ragged[0], normalized_square[0])
+
+    def test_ragged_segments(self):
+        shapes = [square[0], square_duplicate_nodes[0], rectangle[0] * 3, np.zeros((0, 5)), np.zeros((3, 5))]
+        ragged = np.empty(len(shapes), dtype=object)
+        for index, data_point in enumerate(shapes):
+            ragged[index] = data_point.copy()
+        means = gs.localized_mean(ragged)
+        for data_point, mean in zip(shapes, means):
+            expected = gs.localized_mean(data_point[None]) if len(data_point) else np.zeros((1, 1, 2))
+            np.testing.assert_array_almost_equal(mean, expected[0])
+        min_maxs = [gs._min_maxs(data_point[None])[0] for data_point in shapes if len(data_point)]
+        self.assertAlmostEqual(gs.scale(ragged), np.std(min_maxs[:2] + [np.zeros(2)] + min_maxs[2:]))
+
+        transformed = gs.transform(ragged, scale=0.5)
+        self.assertEqual([len(data_point) for data_point in transformed], [len(shape) for shape in shapes])
+        self.assertIs(transformed[0].base, transformed[1].base)
+        np.testing.assert_array_equal(transformed[0], normalized_square[0])
+        np.testing.assert_array_equal(transformed[4], shapes[4])
+
+    def test_empty_records(self):
+        empty = np.zeros((1, 5, 5))
+        empty[..., 4] = 1  # a dummy record, or GEOMETRYCOLLECTION EMPTY
+        padded = np.concatenate([square, rectangle, empty])
+        np.testing.assert_array_equal(gs.localized_mean(padded)[2], [[0, 0]])
+        np.testing.assert_array_equal(gs._min_maxs(padded), gs._min_maxs(padded[:2]))
+        self.assertEqual(gs.scale(padded), gs.scale(padded[:2]))
+        transformed = gs.transform(padded, gs.scale(padded))
+        self.assertFalse(np.any(np.isnan(transformed)))
+        np.testing.assert_array_equal(transformed[2], empty[0])
+
+        ragged = np.empty(3, dtype=object)
+        for index, data_point in enumerate(padded):
+            ragged[index] = data_point.copy()
+        np.testing.assert_array_equal(gs.localized_mean(ragged), gs.localized_mean(padded))
+        self.assertEqual(gs.scale(ragged), gs.scale(padded))
+        self.assertFalse(np.any(np.isnan(gs.transform(ragged, gs.scale(ragged))[2])))
+
+    def test_transform_means(self):
+        padded = np.concatenate([square, rectangle])
+        means = gs.localized_mean(padded[::-1])
+        transformed = gs.transform(padded, 2, means=means, chunk_size=1)
+        np.testing.assert_array_equal(transformed[:, :4, :2], (padded[:, :4, :2] - means) / 2)
+        ragged = np.empty(2, dtype=object)
+        ragged[0], ragged[1] = square[0].copy(), rectangle[0].copy()
+        for expected, data_point in zip(transformed, gs.transform(ragged, 2, means=means, chunk_size=1)):
+            np.testing.assert_array_equal(data_point, expected)
+
+    def test_ragged_chunks(self):
+        shapes = [square[0], square_duplicate_nodes[0], rectangle[0] * 3, np.zeros((0, 5)), np.zeros((3, 5))]
+        ragged = np.empty(len(shapes), dtype=object)
+        for index, data_point in enumerate(shapes):
+            ragged[index] = data_point.copy()
+        np.testing.assert_array_equal(gs._ragged_localized_mean(ragged, chunk_size=2), gs.localized_mean(ragged))
+        np.testing.assert_array_equal(gs._ragged_min_maxs(ragged, chunk_size=2), gs._min_maxs(ragged))
+        expected = gs.transform(ragged, scale=0.5)
+        for chunk_size in [1, 2, 3]:
+            for data_point, transformed in zip(expected, gs.transform(ragged, scale=0.5, chunk_size=chunk_size)):
+                np.testing.assert_array_equal(data_point, transformed)
+        inplace = gs.transform(ragged, scale=0.5, inplace=True, chunk_size=2)
+        self.assertIs(inplace, ragged)
+        for data_point, transformed in zip(expected, ragged):
+            np.testing.assert_array_equal(data_point, transformed)
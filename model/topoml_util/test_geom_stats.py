@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas
+
+from topoml_util import geom_stats
+from topoml_util.GeoVectorizer import GeoVectorizer
+
+TOPOLOGY_CSV = os.path.join(os.path.dirname(__file__), 'test_files/polygon_multipolygon.csv')
+SOURCE_DATA = pandas.read_csv(TOPOLOGY_CSV)
+brt_wkt = SOURCE_DATA['brt_wkt']
+
+
+class TestGeomStats(unittest.TestCase):
+    def test_geom_stats(self):
+        stats = geom_stats.geom_stats(brt_wkt, quantiles=[0.5, 1.0])
+        num_points = GeoVectorizer.num_points(brt_wkt)
+        np.testing.assert_array_equal(stats['num_points'], num_points)
+        self.assertEqual(stats['max'], GeoVectorizer.max_points(brt_wkt))
+        self.assertEqual(stats['quantiles'][1.0], np.max(num_points))
+        self.assertEqual(np.sum(stats['histogram']), len(brt_wkt))
+
+    def test_parallel(self):
+        wkts = np.repeat(brt_wkt.values, geom_stats.CHUNK_SIZE // len(brt_wkt) + 1)
+        num_points = geom_stats.num_points_parallel(wkts, workers=4)
+        np.testing.assert_array_equal(num_points, GeoVectorizer.num_points(wkts))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source_file = os.path.join(directory, 'source.csv')
+            SOURCE_DATA.to_csv(source_file)
+            stats = geom_stats.geom_stats(brt_wkt, source_file=source_file, column='brt_wkt')
+            self.assertTrue(os.path.isfile(geom_stats.stats_cache_file(source_file, 'brt_wkt')))
+
+            # The cached counts are used instead of the geometries
+            cached = geom_stats.geom_stats([None] * len(brt_wkt), source_file=source_file, column='brt_wkt')
+            np.testing.assert_array_equal(cached['num_points'], stats['num_points'])
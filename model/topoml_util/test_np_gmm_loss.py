@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from topoml_util.np_gmm_loss import GaussianMixtureLoss
+from topoml_util.test_files import gmm_output
+
+EPSILON = 1e-7
+
+
+def softmax(x):
+    return np.exp(x) / np.sum(np.exp(x), axis=-1, keepdims=True)
+
+
+def crossentropy(true, pred):
+    return -np.sum(softmax(true) * np.log(np.clip(softmax(pred), EPSILON, 1 - EPSILON)), axis=-1)
+
+
+def reference_loss(y_true, y_pred, num_components):
+    """Line by line numpy transcription of the keras GaussianMixtureLoss.geom_gaussian_mixture_loss"""
+    true_coordinates = y_true[:, :, np.newaxis, :2]
+    components = np.reshape(y_pred[..., :num_components * 6], y_pred.shape[:-1] + (num_components, 6))
+    sigma_x = np.exp(np.abs(components[..., 2])) + EPSILON
+    sigma_y = np.exp(np.abs(components[..., 3])) + EPSILON
+    norm1 = np.log(1 + np.abs(true_coordinates[..., 0] - components[..., 0]))
+    norm2 = np.log(1 + np.abs(true_coordinates[..., 1] - components[..., 1]))
+    z = np.square(norm1) / np.square(sigma_x) + np.square(norm2) / np.square(sigma_y)
+    pdf = np.exp(-z / 2) / (2 * np.pi * sigma_x * sigma_y)
+    gmm_loss = np.sum(np.minimum(-np.log(pdf * softmax(components[..., 5])), -np.log(EPSILON)))
+    gmm_loss = gmm_loss * (1 - softmax(y_true[..., -3:])[..., 2])
+    start = num_components * 6
+    return gmm_loss + crossentropy(y_true[..., start:-3], y_pred[..., start:-3]) + \
+        crossentropy(y_true[..., -3:], y_pred[..., -3:])
+
+
+class TestNumpyGaussianMixtureLoss(unittest.TestCase):
+    def test_geom_gaussian_mixture_loss(self):
+        true = np.array([gmm_output.target, gmm_output.target[::-1]])
+        pred = np.array([gmm_output.prediction, gmm_output.prediction])
+        loss = GaussianMixtureLoss(num_components=5).geom_gaussian_mixture_loss(true, pred)
+        self.assertEqual(loss.shape, (2, 14))
+        np.testing.assert_allclose(loss, reference_loss(true, pred, 5))
+
+    def test_record_losses(self):
+        true = np.repeat([gmm_output.target], 5, axis=0)
+        pred = np.repeat([gmm_output.prediction], 5, axis=0)
+        pred[:, :, 0] += np.arange(5)[:, np.newaxis]
+        gmm = GaussianMixtureLoss(num_components=5)
+        losses = gmm.record_losses(true, pred, chunk_size=2)
+        expected = [np.mean(reference_loss(true[[index]], pred[[index]], 5)) for index in range(5)]
+        np.testing.assert_allclose(losses, expected)
+
+    def test_mixture_negative_log_likelihood(self):
+        true = np.array([[[1., 2.]]])
+        pred = np.array([[[1., 2., 0., 0., 0., 0., 1., 2., 0., 0., 0., 0.]]])
+        nll = GaussianMixtureLoss(num_components=2).mixture_negative_log_likelihood(true, pred)
+        # Two identical components at the true coordinates with unit sigmas
+        np.testing.assert_allclose(nll, [[np.log(2 * np.pi * (1 + EPSILON) ** 2)]])
+        # Stays finite where the component densities underflow
+        pred[..., [0, 6]] = 1e6
+        pred[..., [2, 8]] = -3
+        self.assertTrue(np.isfinite(GaussianMixtureLoss(num_components=2).mixture_negative_log_likelihood(true, pred)))
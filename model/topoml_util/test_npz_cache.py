@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from topoml_util.npz_cache import load_cache, save_cache
+
+
+class TestNpzCache(unittest.TestCase):
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source_file = os.path.join(directory, 'source.csv')
+            cache_file = source_file + '.values.npz'
+            with open(source_file, 'w') as file:
+                file.write('a,b\n1,2\n')
+            self.assertIsNone(load_cache(cache_file, source_file, 3, key='values'))
+
+            save_cache(cache_file, source_file, np.arange(3), key='values')
+            np.testing.assert_array_equal(load_cache(cache_file, source_file, 3, key='values'), np.arange(3))
+            # A different number of records or a changed source file invalidates the cache
+            self.assertIsNone(load_cache(cache_file, source_file, 4, key='values'))
+            with open(source_file, 'a') as file:
+                file.write('3,4\n')
+            self.assertIsNone(load_cache(cache_file, source_file, 3, key='values'))
@@ -0,0 +1,40 @@
+import os
+import unittest
+
+import numpy as np
+import pandas
+
+from topoml_util.GeoVectorizer import GeoVectorizer
+from topoml_util.parallel import parallel_map
+
+TOPOLOGY_CSV = os.path.join(os.path.dirname(__file__), 'test_files/polygon_multipolygon.csv')
+
+
+def vectorize(wkt):
+    return GeoVectorizer.vectorize_wkt(wkt, 64, simplify=True, fixed_size=True)
+
+
+def reciprocal(number):
+    return 1 / number
+
+
+class TestParallel(unittest.TestCase):
+    def test_order(self):
+        wkts = pandas.read_csv(TOPOLOGY_CSV)['brt_wkt'].values
+        serial, _ = parallel_map(vectorize, wkts, workers=1)
+        for threads in [False, True]:
+            results, errors = parallel_map(vectorize, wkts, workers=4, chunk_size=3, threads=threads)
+            self.assertEqual(errors, [])
+            np.testing.assert_array_equal(results, serial)
+
+    def test_errors(self):
+        results, errors = parallel_map(reciprocal, [1, 0, 2, 0], workers=2, chunk_size=1)
+        self.assertEqual(results, [1, None, 0.5, None])
+        self.assertEqual([index for index, _ in errors], [1, 3])
+        self.assertIsInstance(errors[0][1], ZeroDivisionError)
+
+    def test_progress(self):
+        progress = []
+        parallel_map(reciprocal, range(1, 11), workers=1, chunk_size=4, progress=lambda done, total: progress.append(
+            (done, total)))
+        self.assertEqual(progress, [(4, 10), (8, 10), (10, 10)])
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas
+import shapely
+
+from topoml_util.GeoTensor import GeoTensor
+from topoml_util.GeoVectorizer import GeoVectorizer
+from topoml_util.geom_fourier_descriptors import geom_centroid_distance_descriptors
+from topoml_util.shape_descriptors import DESCRIPTOR_FAMILIES, cached_shape_descriptors, compactness, convexity, \
+    descriptor_cache_file, hu_moments, rectangle_ratios, select_descriptors, shape_descriptors, turning_function
+
+TOPOLOGY_CSV = os.path.join(os.path.dirname(__file__), 'test_files/polygon_multipolygon.csv')
+SOURCE_DATA = pandas.read_csv(TOPOLOGY_CSV)
+
+square = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]], dtype=float)
+l_shape = np.array([[0, 0], [4, 0], [4, 1], [1, 1], [1, 3], [0, 3], [0, 0]], dtype=float)
+
+
+def flatten(contours):
+    return np.concatenate(contours), np.array([len(contour) for contour in contours])
+
+
+class TestShapeDescriptors(unittest.TestCase):
+    def test_hu_moments_rectangle(self):
+        rectangle = square * [3, 1]
+        moments = hu_moments(*flatten([rectangle]))[0]
+        self.assertAlmostEqual(moments[0], (3 + 1 / 3) / 12)
+        self.assertAlmostEqual(moments[1], (3 - 1 / 3) ** 2 / 144)
+        np.testing.assert_array_almost_equal(moments[2:], 0)
+
+    def test_hu_moments_invariance(self):
+        rotation = np.array([[np.cos(0.7), -np.sin(0.7)], [np.sin(0.7), np.cos(0.7)]])
+        transformed = l_shape @ rotation.T * 5 + [1e5, 4e5]
+        moments = hu_moments(*flatten([l_shape, transformed, transformed[::-1]]))
+        np.testing.assert_allclose(moments[1:], moments[[0, 0]], rtol=1e-6)
+
+    def test_turning_function(self):
+        turning = turning_function(*flatten([square, square[::-1]]), samples=8)
+        expected = np.repeat([0, np.pi / 2, np.pi, np.pi * 3 / 2], 2)
+        np.testing.assert_array_almost_equal(turning, [expected, expected])
+
+    def test_ratios(self):
+        flat, lengths = flatten([square, l_shape])
+        polygon, hull = shapely.Polygon(l_shape), shapely.Polygon(l_shape).convex_hull
+        np.testing.assert_array_almost_equal(convexity(flat, lengths), [
+            [1, 1], [polygon.area / hull.area, hull.length / polygon.length]])
+        np.testing.assert_array_almost_equal(compactness(flat, lengths)[0], [np.pi / 4, 2 / np.pi])
+        np.testing.assert_array_almost_equal(rectangle_ratios(flat, lengths), [[1, 1], [6 / 12, 3 / 4]])
+
+    def test_shape_descriptors(self):
+        vectors = GeoVectorizer.vectorize_wkts(SOURCE_DATA['brt_wkt'].values, 256)[0]
+        shapes = [shapely.from_wkt(wkt) for wkt in SOURCE_DATA['brt_wkt'].values]
+        contours = [shapely.get_coordinates(shapely.get_exterior_ring(shapely.get_geometry(shape, 0)))
+                    for shape in shapes]
+        descriptors = shape_descriptors(vectors, ['convexity', 'hu_moments'])
+        self.assertEqual(descriptors.shape, (len(shapes), 9))
+        np.testing.assert_array_equal(descriptors[:, :2], convexity(*flatten(contours)))
+        np.testing.assert_array_equal(descriptors[:, 2:], hu_moments(*flatten(contours)))
+
+    def test_cached_shape_descriptors(self):
+        vectors = GeoVectorizer.vectorize_wkts(SOURCE_DATA['brt_wkt'].values, 256)[0]
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, 'data.npz')
+            np.savez(data_file, fixed_size_geoms=vectors)
+            families = list(DESCRIPTOR_FAMILIES)
+            descriptors = cached_shape_descriptors(vectors, families, data_file)
+            np.testing.assert_array_equal(descriptors, shape_descriptors(vectors, families))
+            for name in families:
+                cache_file = descriptor_cache_file(data_file, 'fixed_size_geoms', name, DESCRIPTOR_FAMILIES[name][1])
+                self.assertTrue(os.path.isfile(cache_file))
+            # Cached blocks are used instead of the vectors
+            np.testing.assert_array_equal(cached_shape_descriptors(vectors * 2, families, data_file), descriptors)
+
+    def test_select_descriptors(self):
+        vectors = GeoVectorizer.vectorize_wkts(SOURCE_DATA['brt_wkt'].values, 256)[0]
+        efds = np.random.RandomState(42).rand(len(vectors), 3 + 8 * 4)
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, 'data.npz')
+            np.savez(data_file, elliptic_fourier_descriptors=efds, **GeoTensor.from_padded(vectors).to_arrays(
+                'fixed_size_geoms'))
+            with np.load(data_file) as loaded:
+                descriptors, columns = select_descriptors(loaded, {}, data_file)
+                np.testing.assert_array_equal(descriptors, efds)
+                np.testing.assert_array_equal(columns(1), np.arange(11))
+
+                hp = {'CENTROID_DISTANCE_ORDER': 3, 'SHAPE_DESCRIPTORS': 'convexity, compactness'}
+                descriptors, columns = select_descriptors(loaded, hp, data_file)
+            np.testing.assert_array_equal(descriptors[:, :efds.shape[1]], efds)
+            np.testing.assert_array_equal(descriptors[:, efds.shape[1]:efds.shape[1] + 3],
+                                          geom_centroid_distance_descriptors(vectors, 3))
+            np.testing.assert_array_equal(descriptors[:, efds.shape[1] + 3:],
+                                          shape_descriptors(vectors, ['convexity', 'compactness']))
+            np.testing.assert_array_equal(columns(0), np.r_[:3, efds.shape[1]:descriptors.shape[1]])
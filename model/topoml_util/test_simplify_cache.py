@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from functools import partial
+
+import numpy as np
+import shapely
+from shapely import affinity
+
+from topoml_util.GeoVectorizer import GeoVectorizer
+from topoml_util.parallel import parallel_map
+from topoml_util.simplify_cache import SimplifyCache
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), 'test_files/big_multipolygon_wkt.txt')
+
+
+class TestSimplifyCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SimplifyCache(os.path.join(self.directory.name, 'cache.sqlite'))
+        with open(TEST_FILE, 'r') as file:
+            self.shape = shapely.from_wkt(file.read())
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_simplify(self):
+        expected = GeoVectorizer.simplify(64, self.shape)
+        self.assertTrue(self.cache.simplify(64, self.shape).equals_exact(expected, 0))
+        self.assertEqual(len(self.cache), 1)
+        self.assertTrue(self.cache.simplify(64, self.shape).equals_exact(expected, 0))
+        self.assertEqual(len(self.cache), 1)
+        self.cache.simplify(32, self.shape)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_persistent(self):
+        self.cache.simplify(64, self.shape)
+        self.cache.close()
+        reopened = SimplifyCache(self.cache.file)
+        self.assertEqual(len(reopened), 1)
+        reopened.close()
+
+    def test_vectorize(self):
+        vectorized = GeoVectorizer.vectorize_wkt(self.shape, 64, simplify=self.cache.simplify, fixed_size=True)
+        np.testing.assert_array_equal(vectorized, GeoVectorizer.vectorize_wkt(self.shape, 64, simplify=True,
+                                                                              fixed_size=True))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_evict(self):
+        for max_points in range(20, 30):
+            self.cache.simplify(max_points, self.shape)
+        self.cache.max_bytes = self.cache.size() // 2
+        self.cache.simplify(64, self.shape)
+        self.cache.evict()
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+        self.assertEqual(self.cache.key(64, self.shape), self.cache.connection.execute(
+            'SELECT key FROM simplified ORDER BY last_used DESC').fetchone()[0])
+
+    def test_buffered_writes(self):
+        self.cache.simplify(64, self.shape)
+        other = sqlite3.connect(self.cache.file)
+        self.assertEqual(other.execute('SELECT COUNT(*) FROM simplified').fetchone()[0], 0)
+        self.cache.flush()
+        self.assertEqual(other.execute('SELECT COUNT(*) FROM simplified').fetchone()[0], 1)
+
+        # A hit only records its last use in the next flush
+        last_used = other.execute('SELECT last_used FROM simplified').fetchone()[0]
+        self.assertTrue(self.cache.simplify(64, self.shape).equals_exact(GeoVectorizer.simplify(64, self.shape), 0))
+        self.assertEqual(other.execute('SELECT last_used FROM simplified').fetchone()[0], last_used)
+        self.cache.close()
+        self.assertGreater(other.execute('SELECT last_used FROM simplified').fetchone()[0], last_used)
+        other.close()
+
+    def test_worker_processes(self):
+        shapes = [affinity.translate(self.shape, offset) for offset in range(8)]
+        vectorize = partial(GeoVectorizer.vectorize_wkt, max_points=64, simplify=self.cache.simplify)
+        results, errors = parallel_map(vectorize, shapes, workers=2, chunk_size=2)
+        self.assertEqual(errors, [])
+        # The workers flush their buffered entries when they exit
+        self.assertEqual(len(self.cache), len(shapes))
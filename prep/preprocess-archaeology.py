@@ -12,11 +12,12 @@ from zipfile import ZipFile
 import matplotlib.pyplot as plt
 import numpy as np
 from pandas import read_csv
-from shapely import wkt
+import shapely
 from sklearn.model_selection import train_test_split
 
-from model.topoml_util.GeoVectorizer import GeoVectorizer
-from model.topoml_util.geom_fourier_descriptors import create_geom_fourier_descriptor
+from model.topoml_util.featurizer import RecordFeaturizer
+from model.topoml_util.geom_stats import geom_stats
+from model.topoml_util.simplify_cache import SimplifyCache
 from prep.ProgressBar import ProgressBar
 
 SCRIPT_VERSION = '7'
@@ -26,10 +27,12 @@ SOURCE_CSV = 'archaeology.csv'
 LOG_FILE = 'archaeology_preprocessing.log'
 TRAIN_DATA_FILE = DATA_FOLDER + 'archaeology_train_v' + SCRIPT_VERSION
 TEST_DATA_FILE = DATA_FOLDER + 'archaeology_test_v' + SCRIPT_VERSION
+SIMPLIFY_CACHE_FILE = DATA_FOLDER + 'simplify_cache.sqlite'
 SANE_NUMBER_OF_POINTS = 2048
 REDUCED_POINTS = 256
 TRAIN_TEST_SPLIT = 0.1
 FOURIER_DESCRIPTOR_ORDER = 32  # The axis 0 size
+FOURIER_DESCRIPTOR_SAMPLES = 2 ** 14  # Points to resample large polygons to for fast approximate descriptors
 MINIMUM_CLASS_OCCURRENCE = 1000
 SCRIPT_START = time()
 
@@ -49,74 +52,40 @@ print('Included classes:', included_classes)
 
 # geometry vectors
 print('Creating geometry vectors and descriptors...')
-feature_types = []
-wkt_vectors = []
-fourier_descriptors = []
-shapes = []
-
-for wkt_string in df.WKT.values:
-    try:
-        shapes.append(wkt.loads(wkt_string))
-    except Exception as e:
-        print('Skipping unreadable wkt geom.')
-number_of_vertices = [GeoVectorizer.num_points_from_wkt(shape.wkt) for shape in shapes]
+shapes = shapely.from_wkt(wkt__as_matrix.astype(str), on_invalid='ignore')
+readable = shapes[~shapely.is_missing(shapes)]
+print('Skipping {} unreadable wkt geoms.'.format(len(shapes) - len(readable)))
+vertex_stats = geom_stats(readable, source_file=SOURCE_ZIP, column='WKT')
+number_of_vertices = vertex_stats['num_points']
+print('Vertices per geometry: max {}, quantiles {}'.format(vertex_stats['max'], vertex_stats['quantiles']))
 
 plt.hist(number_of_vertices, bins=20, log=True)
 plt.savefig('archaeology_geom_vertices_distr.png')
 geoms_above_threshold = len([v for v in number_of_vertices if v > SANE_NUMBER_OF_POINTS])
 print('{} of the {} geometries are over the max {} vertices threshold and will be simplified.\n'.format(
-    geoms_above_threshold, len(shapes), SANE_NUMBER_OF_POINTS))
-
+    geoms_above_threshold, len(readable), SANE_NUMBER_OF_POINTS))
+
+# Only the records of the included classes, with their line numbers in the source file
+included = np.array([index for index, feature in enumerate(aardspoor__as_matrix) if feature in included_classes],
+                    dtype=int)
+featurizer = RecordFeaturizer(REDUCED_POINTS, SANE_NUMBER_OF_POINTS, FOURIER_DESCRIPTOR_ORDER,
+                              simplify=SimplifyCache(SIMPLIFY_CACHE_FILE).simplify,
+                              efd_samples=FOURIER_DESCRIPTOR_SAMPLES)
 pgb = ProgressBar()
-logfile = open(LOG_FILE, 'w')
-selected_data = []
-simplified_geometries = 0
-errors = 0
-
-for index, (feature, geom) in enumerate(zip(aardspoor__as_matrix, wkt__as_matrix)):
-    pgb.update_progress(index/len(aardspoor__as_matrix), '{} geometries, {} errors in logfile'.format(index, errors))
-    if feature in included_classes:
-        try:
-            shape = wkt.loads(geom)
-            fixed_size_wkt_vector = GeoVectorizer.vectorize_wkt(geom, REDUCED_POINTS, simplify=True,
-                                                                fixed_size=True)
-            geom_len = min(GeoVectorizer.num_points_from_wkt(shape.wkt), SANE_NUMBER_OF_POINTS)
-            if geom_len == SANE_NUMBER_OF_POINTS:
-                simplified_geometries += 1
-            wkt_vector = GeoVectorizer.vectorize_wkt(geom, geom_len, simplify=True)
-
-            # If multipart multipolygon: select the largest, but it will throw off the accuracy a bit.
-            if shape.geom_type == 'MultiPolygon':
-                if len(shape.geoms) > 1:
-                    geometries = sorted(shape.geoms, key=lambda x: x.area)
-                    shape = geometries[-1]
-                else:
-                    shape = shape.geoms[0]
-            elif shape.geom_type == 'Polygon':
-                pass
-            else:
-                print('skipping record: no (multi)polygon entry in {} on line {}'.format(
-                    SOURCE_CSV, index + 2))
-                errors += 1
-                continue
-
-            efds = create_geom_fourier_descriptor(shape, FOURIER_DESCRIPTOR_ORDER)
-
-        except Exception as e:
-            logfile.write('Skipping record on account of geometry entry in {0} on line {1} with error: {2}\n'.format(
-                SOURCE_CSV, index + 2, e))
-            errors += 1
-            continue
-
-        # Append the converted values if all went well
-        selected_data.append({
-            'geom': wkt_vector,
-            'fixed_size_geom': fixed_size_wkt_vector,
-            'elliptic_fourier_descriptors': efds,
-            'feature_type': included_classes.index(feature),  # Convert types to numerical index
-        })
-
-logfile.close()
+features, record_errors = featurizer.featurize_all(
+    shapes[included],
+    progress=lambda done, total: pgb.update_progress(done / total, '{} geometries'.format(done)))
+
+with open(LOG_FILE, 'w') as logfile:
+    for index, e in record_errors:
+        logfile.write('Skipping record on account of geometry entry in {0} on line {1} with error: {2}\n'.format(
+            SOURCE_CSV, included[index] + 2, e))
+errors = len(record_errors)
+
+selected_data = np.flatnonzero(features['valid'])
+# Convert types to numerical index
+feature_type = np.array([included_classes.index(feature) for feature in aardspoor__as_matrix[included]], dtype=int)
+simplified_geometries = np.sum(features['simplified'][selected_data])
 print('\ncreated {} data points with {} simplified geometries and {} errors'.format(
     len(selected_data), simplified_geometries, errors))
 
@@ -127,19 +96,19 @@ print('Saving test data...')
 # Test data is small enough to put in one archive
 np.savez_compressed(
     TEST_DATA_FILE,
-    geoms=[record['geom'] for record in test],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in test],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in test],
-    feature_type=[record['feature_type'] for record in test],
+    **features['geoms'][test].to_arrays('geoms'),
+    **features['fixed_size_geoms'][test].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][test],
+    feature_type=feature_type[test],
     feature_type_index=included_classes)
 
 print('Saving training data...')
 np.savez_compressed(
     TRAIN_DATA_FILE,
-    geoms=[record['geom'] for record in train],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in train],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in train],
-    feature_type=[record['feature_type'] for record in train],
+    **features['geoms'][train].to_arrays('geoms'),
+    **features['fixed_size_geoms'][train].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][train],
+    feature_type=feature_type[train],
     feature_type_index=included_classes)
 
 runtime = time() - SCRIPT_START
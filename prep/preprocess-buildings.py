@@ -16,11 +16,11 @@ from zipfile import ZipFile
 import matplotlib.pyplot as plt
 import numpy as np
 from pandas import read_csv, concat
-from shapely import wkt
 from sklearn.model_selection import train_test_split
 
-from model.topoml_util.GeoVectorizer import GeoVectorizer
-from model.topoml_util.geom_fourier_descriptors import create_geom_fourier_descriptor
+from model.topoml_util.featurizer import RecordFeaturizer
+from model.topoml_util.geom_stats import geom_stats
+from model.topoml_util.simplify_cache import SimplifyCache
 from prep.ProgressBar import ProgressBar
 
 SCRIPT_VERSION = '7'
@@ -33,6 +33,7 @@ LOG_FILE = '{}_preprocessing.log'.format(DATA_TYPE)
 SOURCE_ZIP = '../files/{}/{}.csv.zip'.format(DATA_TYPE, DATA_TYPE)
 TRAIN_DATA_FILE = '../files/{}/{}_train_v{}'.format(DATA_TYPE, DATA_TYPE, SCRIPT_VERSION)
 TEST_DATA_FILE = '../files/{}/{}_test_v{}'.format(DATA_TYPE, DATA_TYPE, SCRIPT_VERSION)
+SIMPLIFY_CACHE_FILE = '../files/{}/simplify_cache.sqlite'.format(DATA_TYPE)
 SCRIPT_START = time()
 
 building_types = [
@@ -61,66 +62,37 @@ for f_index, function_type in enumerate(building_types):
     else:
         df = concat([df, (read_csv(zip_file.open(file)))])
 
-shapes = [wkt.loads(wkt_string) for wkt_string in df.geometrie.values]
-number_of_vertices = [GeoVectorizer.num_points_from_wkt(shape.wkt) for shape in shapes]
+vertex_stats = geom_stats(df.geometrie.values, source_file=SOURCE_ZIP, column='geometrie')
+number_of_vertices = vertex_stats['num_points']
+print('Vertices per geometry: max {}, quantiles {}'.format(vertex_stats['max'], vertex_stats['quantiles']))
 
 # vertices_distr_png = 'buildings_geom_vertices_distr.png'
 # print('Saving histogram of vertices per geometry {}'.format(vertices_distr_png))
 # plt.hist(number_of_vertices, bins=20, log=True)
 # plt.savefig(vertices_distr_png)
 
-logfile = open(LOG_FILE, 'w')
-selected_data = []
-simplified_geometries = 0
-errors = 0
-
 print('Processing data...')
+featurizer = RecordFeaturizer(REDUCED_POINTS, SANE_NUMBER_OF_POINTS, FOURIER_DESCRIPTOR_ORDER,
+                              simplify=SimplifyCache(SIMPLIFY_CACHE_FILE).simplify)
 pgb = ProgressBar()
-
-for index, (wkt_string, building_type) in enumerate(zip(df.geometrie.values, df.gebruiksdoel.values)):
-    pgb.update_progress(index/len(df.geometrie.values), '{} geometries, {} errors in logfile'.format(index, errors))
-    try:
-        shape = wkt.loads(wkt_string)
-        fixed_size_wkt_vector = GeoVectorizer.vectorize_wkt(wkt_string, REDUCED_POINTS, simplify=True, fixed_size=True)
-
-        geom_len = min(GeoVectorizer.num_points_from_wkt(shape.wkt), SANE_NUMBER_OF_POINTS)
-        if geom_len == SANE_NUMBER_OF_POINTS:
-            simplified_geometries += 1
-        wkt_vector = GeoVectorizer.vectorize_wkt(wkt_string, geom_len, simplify=True)
-
-        # If multipart multipolygon: select the largest, but it will throw off the accuracy a bit.
-        if shape.geom_type == 'MultiPolygon':
-            if len(shape.geoms) > 1:
-                geometries = sorted(shape.geoms, key=lambda x: x.area)
-                shape = geometries[-1]
-            else:
-                shape = shape.geoms[0]
-        elif shape.geom_type == 'Polygon':
-            pass
-        else:
-            logfile.write('Skipping record: no (multi)polygon on line {}'.format(index + 2))
-            errors += 1
-            continue
-
-        efds = create_geom_fourier_descriptor(shape, FOURIER_DESCRIPTOR_ORDER)
-
-        # Label as numerical index
-        type_int = building_types.index(building_type)
-
-    except Exception as e:
+features, record_errors = featurizer.featurize_all(
+    df.geometrie.values,
+    progress=lambda done, total: pgb.update_progress(done / total, '{} geometries'.format(done)))
+
+# Label as numerical index
+type_indices = {building_type: index for index, building_type in enumerate(building_types)}
+building_type = np.array([type_indices.get(building_type, -1) for building_type in df.gebruiksdoel.values])
+record_errors += [(index, ValueError('unknown building type {}'.format(df.gebruiksdoel.values[index])))
+                  for index in np.flatnonzero(features['valid'] & (building_type < 0))]
+features['valid'] &= building_type >= 0
+
+with open(LOG_FILE, 'w') as logfile:
+    for index, e in sorted(record_errors, key=lambda error: error[0]):
         logfile.write('Skipping record on account of faulty geometry entry {} with error: {}\n'.format(index + 2, e))
-        errors += 1
-        continue
-
-    # Append the converted values if all went well
-    selected_data.append({
-        'geom': wkt_vector,
-        'fixed_size_geom': fixed_size_wkt_vector,
-        'elliptic_fourier_descriptors': efds,
-        'building_type': type_int
-    })
-
-logfile.close()
+errors = len(record_errors)
+
+selected_data = np.flatnonzero(features['valid'])
+simplified_geometries = np.sum(features['simplified'][selected_data])
 print('\ncreated {} data points with {} simplified geometries and {} errors'.format(
     len(selected_data), simplified_geometries, errors))
 
@@ -130,18 +102,18 @@ train, test = train_test_split(selected_data, test_size=0.1, random_state=42)
 print('Saving test data...')
 np.savez_compressed(
     TEST_DATA_FILE,
-    geoms=[record['geom'] for record in test],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in test],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in test],
-    building_type=[record['building_type'] for record in test])
+    **features['geoms'][test].to_arrays('geoms'),
+    **features['fixed_size_geoms'][test].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][test],
+    building_type=building_type[test])
 
 print('Saving training data...')
 np.savez_compressed(
     TRAIN_DATA_FILE,
-    geoms=[record['geom'] for record in train],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in train],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in train],
-    building_type=[record['building_type'] for record in train])
+    **features['geoms'][train].to_arrays('geoms'),
+    **features['fixed_size_geoms'][train].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][train],
+    building_type=building_type[train])
 
 runtime = time() - SCRIPT_START
 print('Done in {}'.format(timedelta(seconds=runtime)))
@@ -11,11 +11,11 @@ from zipfile import ZipFile
 import matplotlib.pyplot as plt
 import numpy as np
 from pandas import read_csv
-from shapely import wkt
 from sklearn.model_selection import train_test_split
 
-from model.topoml_util.GeoVectorizer import GeoVectorizer
-from model.topoml_util.geom_fourier_descriptors import create_geom_fourier_descriptor
+from model.topoml_util.featurizer import RecordFeaturizer
+from model.topoml_util.geom_stats import geom_stats
+from model.topoml_util.simplify_cache import SimplifyCache
 from prep.ProgressBar import ProgressBar
 
 SCRIPT_VERSION = '7'
@@ -25,10 +25,12 @@ SOURCE_CSV = 'neighborhoods.csv'
 LOG_FILE = 'neighborhoods_preprocessing.log'
 TRAIN_DATA_FILE = SOURCE_DIR + 'neighborhoods_train_v' + SCRIPT_VERSION
 TEST_DATA_FILE = SOURCE_DIR + 'neighborhoods_test_v' + SCRIPT_VERSION
+SIMPLIFY_CACHE_FILE = SOURCE_DIR + 'simplify_cache.sqlite'
 SANE_NUMBER_OF_POINTS = 2048
 REDUCED_POINTS = 256
 TRAIN_TEST_SPLIT = 0.1
 FOURIER_DESCRIPTOR_ORDER = 32  # The axis 0 size
+FOURIER_DESCRIPTOR_SAMPLES = 2 ** 14  # Points to resample large polygons to for fast approximate descriptors
 SCRIPT_START = time()
 
 if not os.path.isfile(SOURCE_ZIP):
@@ -40,69 +42,37 @@ df = read_csv(zip_file.open(SOURCE_CSV))
 df = df[df.aantal_inwoners >= 0]  # Filter out negative placeholder values for unknowns
 
 print('Creating geometry vectors and descriptors...')
-wkt_vectors = []
-shapes = [wkt.loads(wkt_string) for wkt_string in df.geom.values]
-number_of_vertices = [GeoVectorizer.num_points_from_wkt(shape.wkt) for shape in shapes]
+vertex_stats = geom_stats(df.geom.values, source_file=SOURCE_ZIP, column='geom')
+number_of_vertices = vertex_stats['num_points']
+print('Vertices per geometry: max {}, quantiles {}'.format(vertex_stats['max'], vertex_stats['quantiles']))
 
 plt.hist(number_of_vertices, bins=20, log=True)
 plt.savefig('neighborhood_geom_vertices_distr.png')
 geoms_above_threshold = len([v for v in number_of_vertices if v > SANE_NUMBER_OF_POINTS])
 print('{} of the {} geometries are over the max {} vertices threshold and will be simplified.\n'.format(
-    geoms_above_threshold, len(shapes), SANE_NUMBER_OF_POINTS))
+    geoms_above_threshold, len(df.geom.values), SANE_NUMBER_OF_POINTS))
 
+featurizer = RecordFeaturizer(REDUCED_POINTS, SANE_NUMBER_OF_POINTS, FOURIER_DESCRIPTOR_ORDER,
+                              simplify=SimplifyCache(SIMPLIFY_CACHE_FILE).simplify,
+                              efd_samples=FOURIER_DESCRIPTOR_SAMPLES)
 pgb = ProgressBar()
-logfile = open(LOG_FILE, 'w')
-selected_data = []
-simplified_geometries = 0
-errors = 0
-
-for index, (inhabitants, wkt_string) in enumerate(zip(df.aantal_inwoners.values, df.geom.values)):
-    pgb.update_progress(index/len(df.geom.values), '{} geometries, {} errors in logfile'.format(index, errors))
-    try:
-        shape = wkt.loads(wkt_string)
-        fixed_size_wkt_vector = GeoVectorizer.vectorize_wkt(wkt_string, REDUCED_POINTS, simplify=True, fixed_size=True)
-
-        geom_len = min(GeoVectorizer.num_points_from_wkt(shape.wkt), SANE_NUMBER_OF_POINTS)
-        if geom_len == SANE_NUMBER_OF_POINTS:
-            simplified_geometries += 1
-        wkt_vector = GeoVectorizer.vectorize_wkt(wkt_string, geom_len, simplify=True)
-
-        # If multipart multipolygon: select the largest, but it will throw off the accuracy a bit.
-        if shape.geom_type == 'MultiPolygon':
-            if len(shape.geoms) > 1:
-                geometries = sorted(shape.geoms, key=lambda x: x.area)
-                shape = geometries[-1]
-            else:
-                shape = shape.geoms[0]
-        elif shape.geom_type == 'Polygon':
-            pass
-        else:
-            logfile.write('skipping record: no (multi)polygon entry in {} on line {}'.format(
-                SOURCE_CSV, index + 2))
-            errors += 1
-            continue
-
-        efds = create_geom_fourier_descriptor(shape, FOURIER_DESCRIPTOR_ORDER)
-
-    except Exception as e:
+features, record_errors = featurizer.featurize_all(
+    df.geom.values,
+    progress=lambda done, total: pgb.update_progress(done / total, '{} geometries'.format(done)))
+
+with open(LOG_FILE, 'w') as logfile:
+    for index, e in record_errors:
         logfile.write('Skipping record on account of geometry entry in {} on line {} with error: {}\n'.format(
             SOURCE_CSV, index + 2, e))
-        errors += 1
-        continue
-
-    # Append the converted values if all went well
-    selected_data.append({
-        'geom': wkt_vector,
-        'fixed_size_geom': fixed_size_wkt_vector,
-        'elliptic_fourier_descriptors': efds,
-        'inhabitants': inhabitants,
-    })
-
-logfile.close()
+errors = len(record_errors)
+
+selected_data = np.flatnonzero(features['valid'])
+inhabitants = df.aantal_inwoners.values
+simplified_geometries = np.sum(features['simplified'][selected_data])
 print('\ncreated {} data points with {} simplified geometries and {} errors'.format(
     len(selected_data), simplified_geometries, errors))
 
-median = np.median([p['inhabitants'] for p in selected_data])
+median = np.median(inhabitants[selected_data])
 print('Median:', median, 'inhabitants')
 
 # Split and save data
@@ -112,23 +82,23 @@ print('Saving test data...')
 # Test data is small enough to put in one archive
 np.savez_compressed(
     TEST_DATA_FILE,
-    geoms=[record['geom'] for record in test],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in test],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in test],
-    inhabitants=[record['inhabitants'] for record in test],
-    above_or_below_median=[int(record['inhabitants'] > median) for record in test],
-    type_index={0: 'less than median', 1: 'greater than or equal to median'},
+    **features['geoms'][test].to_arrays('geoms'),
+    **features['fixed_size_geoms'][test].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][test],
+    inhabitants=inhabitants[test],
+    above_or_below_median=(inhabitants[test] > median).astype(int),
+    type_index=['less than median', 'greater than or equal to median'],
 )
 
 print('Saving training data...')
 np.savez_compressed(
     TRAIN_DATA_FILE,
-    geoms=[record['geom'] for record in train],
-    fixed_size_geoms=[record['fixed_size_geom'] for record in train],
-    elliptic_fourier_descriptors=[record['elliptic_fourier_descriptors'] for record in train],
-    inhabitants=[record['inhabitants'] for record in test],
-    above_or_below_median=[int(record['inhabitants'] > median) for record in train],
-    type_index={0: 'less than median', 1: 'greater than or equal to median'},
+    **features['geoms'][train].to_arrays('geoms'),
+    **features['fixed_size_geoms'][train].to_arrays('fixed_size_geoms'),
+    elliptic_fourier_descriptors=features['elliptic_fourier_descriptors'][train],
+    inhabitants=inhabitants[train],
+    above_or_below_median=(inhabitants[train] > median).astype(int),
+    type_index=['less than median', 'greater than or equal to median'],
 )
 
 runtime = time() - SCRIPT_START
@@ -1,7 +1,7 @@
 import numpy as np
 import pandas
 
-from model.topoml_util.GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN, RENDER_INDEX, FULL_STOP_INDEX, STOP_INDEX
+from model.topoml_util.GeoVectorizer import GeoVectorizer, GEO_VECTOR_LEN, FULL_STOP_INDEX, STOP_INDEX
 
 TOPOLOGY_TRAINING_CSV = '../files/brt_osm/brt_osm.csv'
 GEODATA_VECTORIZED = '../files/brt_osm/brt_osm_vectorized.npz'
@@ -21,10 +21,10 @@ osm_wkt = truncated_data[:, 1]
 intersection_set = truncated_data[:, 2]
 centroid_distance = truncated_data[:, 3]
 geom_distance = truncated_data[:, 4]
-brt_centroid = [GeoVectorizer.vectorize_wkt(point, 1) for point in truncated_data[:, 5]]
-osm_centroid = [GeoVectorizer.vectorize_wkt(point, 1) for point in truncated_data[:, 6]]
-brt_centroid_rd = [GeoVectorizer.vectorize_wkt(point, 1) for point in truncated_data[:, 7]]
-osm_centroid_rd = [GeoVectorizer.vectorize_wkt(point, 1) for point in truncated_data[:, 8]]
+brt_centroid, _ = GeoVectorizer.vectorize_wkts(truncated_data[:, 5], 1)
+osm_centroid, _ = GeoVectorizer.vectorize_wkts(truncated_data[:, 6], 1)
+brt_centroid_rd, _ = GeoVectorizer.vectorize_wkts(truncated_data[:, 7], 1)
+osm_centroid_rd, _ = GeoVectorizer.vectorize_wkts(truncated_data[:, 8], 1)
 intersection_surface = truncated_data[:, 9]
 
 training_set = brt_wkt + ';' + osm_wkt
@@ -39,39 +39,23 @@ brt_vectors = np.zeros((len(brt_wkt), brt_max_points, GEO_VECTOR_LEN))
 osm_max_points = GeoVectorizer.max_points(osm_wkt)
 osm_vectors = np.zeros((len(osm_wkt), osm_max_points, GEO_VECTOR_LEN))
 
-broken_records = []
-for record_index in range(len(brt_wkt)):
-    try:
-        training_vector = GeoVectorizer.vectorize_two_wkts(brt_wkt[record_index], osm_wkt[record_index], max_points)
-        target_vector = GeoVectorizer.vectorize_wkt(intersection_set[record_index], max_points)
-        brt_vector = GeoVectorizer.vectorize_wkt(brt_wkt[record_index], brt_max_points)
-        osm_vector = GeoVectorizer.vectorize_wkt(osm_wkt[record_index], osm_max_points)
-    except Exception as e:
-        print('Creating dummy record', record_index, ':', e)
-        training_vectors[record_index, 0:, FULL_STOP_INDEX] = 1
-        intersection_vectors[record_index, 0:, FULL_STOP_INDEX] = 1
-        brt_vectors[record_index, 0:, FULL_STOP_INDEX] = 1
-        osm_vectors[record_index, 0:, FULL_STOP_INDEX] = 1
-
-        broken_records.append(record_index)
-        continue
-
-    # Fill in the numpy zeros tensor value by value
-    for point_index, point in enumerate(training_vector):
-        for feature_index, value in enumerate(point):
-            training_vectors[record_index, point_index, feature_index] = value
-
-    for point_index, point in enumerate(target_vector):
-        for feature_index, value in enumerate(point):
-            intersection_vectors[record_index, point_index, feature_index] = value
-
-    for point_index, point in enumerate(brt_vector):
-        for feature_index, value in enumerate(point):
-            brt_vectors[record_index, point_index, feature_index] = value
-
-    for point_index, point in enumerate(osm_vector):
-        for feature_index, value in enumerate(point):
-            osm_vectors[record_index, point_index, feature_index] = value
+# Vectorize straight into the preallocated tensors, records that fail to vectorize become dummy records
+_, _, training_dummies = GeoVectorizer.vectorize_wkt_pairs(
+    brt_wkt, osm_wkt, max_points, out=training_vectors, errors='dummy', return_dummies=True)
+_, _, intersection_dummies = GeoVectorizer.vectorize_wkts(
+    intersection_set, max_points, out=intersection_vectors, errors='dummy', return_dummies=True)
+_, _, brt_dummies = GeoVectorizer.vectorize_wkts(
+    brt_wkt, brt_max_points, out=brt_vectors, errors='dummy', return_dummies=True)
+_, _, osm_dummies = GeoVectorizer.vectorize_wkts(
+    osm_wkt, osm_max_points, out=osm_vectors, errors='dummy', return_dummies=True)
+
+# A record broken in any of the tensors is a dummy record in all of them. Empty geometries, like the intersection of
+# non-intersecting geometries, are valid records.
+broken_records = np.flatnonzero(training_dummies | intersection_dummies | brt_dummies | osm_dummies)
+for vectors in [training_vectors, intersection_vectors, brt_vectors, osm_vectors]:
+    vectors[broken_records] = 0
+    vectors[broken_records, :, FULL_STOP_INDEX] = 1
+print('Created', len(broken_records), 'dummy records')
 
 # Concatenate centroids
 centroids = np.append(brt_centroid, osm_centroid, axis=1)